@@ -11,7 +11,7 @@ sudo apt-get install --no-install-recommends -y \
     $ADDITIONAL_PACKAGES
 
 pip$PYTHON_SUFFIX install --upgrade pip$PYTHON_SUFFIX
-pip$PYTHON_SUFFIX install -r $SCRIPT_DIR/requirements.txt
+pip$PYTHON_SUFFIX install -r $SCRIPT_DIR/requirements-dev.txt
 
 chmod +x $SCRIPT_DIR/.hooks/install_hooks.sh
 $SCRIPT_DIR/.hooks/install_hooks.sh
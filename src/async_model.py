@@ -0,0 +1,526 @@
+"""
+This module connects to the FTP server over asyncio streams, so many sessions and transfers
+are driven by a single event loop instead of one thread per connection.
+"""
+import asyncio
+import collections.abc
+import inspect
+import os
+import posixpath
+import re
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+    cast,
+)
+
+from src.cipher.engine import StreamTransform
+from .model import FTPError, UnableToConnect, NotAuthorized
+
+BLOCK_SIZE = 64 * 1024
+
+_PASV_RESPONSE = re.compile(r"(\d+),(\d+),(\d+),(\d+),(\d+),(\d+)")
+_EPSV_RESPONSE = re.compile(r"\(([^\d\s])\1\1(\d+)\1\)")
+
+Chunks = Union[Iterable[bytes], AsyncIterator[bytes]]
+
+
+class AsyncFTPConnectionModel:
+    """
+    Asyncio FTP Connection class, the asyncio counterpart of FTPConnectionModel.
+    Transfers use passive mode and can stream the data through a StreamTransform,
+    to encrypt or decrypt it on the way.
+
+    A session runs one command at a time, concurrent transfers use one session each. Local
+    files are opened, read and written in the default executor so the event loop never
+    blocks on the disk, and every read or write of a connection times out after timeout
+    seconds.
+    """
+
+    # pylint: disable=R0902
+
+    def __init__(self, timeout: float = 30.0) -> None:
+        self.timeout = timeout
+        self.host = ""
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.controlLock: Optional[asyncio.Lock] = None
+        self.transferType = ""
+        self.workingDirectory = "/"
+
+    @property
+    def lock(self) -> asyncio.Lock:
+        """
+        Lock of the control connection, created in the event loop of the session.
+
+        Returns
+        -------
+        asyncio.Lock
+            the lock
+        """
+
+        if self.controlLock is None:
+            self.controlLock = asyncio.Lock()
+        return self.controlLock
+
+    async def connect(self, ipAddress: str, port: int) -> str:
+        """
+        Connect to the FTP server.
+
+        Parameters
+        ----------
+        ipAddress : str
+            ip address of the ftp server
+        port : int
+            port number of the ftp server
+        Returns
+        -------
+        str
+            server response
+        """
+
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(ipAddress, port), self.timeout
+            )
+            self.host = ipAddress
+            self.transferType = ""
+            return await self._expect(self._readResponse(), "2")
+        except (OSError, asyncio.TimeoutError, FTPError) as exp:
+            errMsg = f"Unable to connect to {ipAddress}:{port}"
+            raise UnableToConnect(errMsg) from exp
+
+    async def login(self, username: str, password: str) -> str:
+        """
+        login to the FTP server.
+
+        Parameters
+        ----------
+        username : str
+            username to login with to the ftp server
+        password : str
+            password to login with to the ftp server
+        Returns
+        -------
+        str
+            server response
+        """
+
+        try:
+            async with self.lock:
+                response = await self._command("USER " + username)
+                if response.startswith("3"):
+                    response = await self._command("PASS " + password)
+                if not response.startswith("2"):
+                    raise FTPError(response)
+                self.workingDirectory = _quotedPath(await self._expect(self._command("PWD"), "2"))
+                return response
+        except FTPError as exp:
+            errMsg = f"Unable to login with {username}:{password}"
+            raise NotAuthorized(errMsg) from exp
+
+    async def displayDirectory(self, directoryName: str = "") -> List[str]:
+        """
+        Display the directory on the FTP client.
+
+        Parameters
+        ----------
+        directoryName : str
+            directory to list, the working directory if empty
+        Returns
+        -------
+        List[str]
+            list of files in the directory
+        """
+
+        lines: List[bytes] = []
+        command = "NLST " + directoryName if directoryName else "NLST"
+        await self._transfer(command, "A", receive=lines.append)
+        return [line for line in b"".join(lines).decode("utf-8").splitlines() if line]
+
+    async def changeDirectory(self, directoryName: str) -> str:
+        """
+        Change directory on the FTP client.
+
+        Parameters
+        ----------
+        directoryName : str
+            directoryName to change to
+        Returns
+        -------
+        str
+            server response
+        """
+
+        async with self.lock:
+            response = await self._expect(self._command("CWD " + directoryName), "2")
+            self.workingDirectory = self.remotePath(directoryName)
+            return response
+
+    def remotePath(self, fileName: str) -> str:
+        """
+        Absolute path on the FTP server of a path relative to the working directory.
+
+        Parameters
+        ----------
+        fileName : str
+            absolute path or path relative to the working directory
+        Returns
+        -------
+        str
+            absolute path
+        """
+
+        return posixpath.normpath(posixpath.join(self.workingDirectory, fileName))
+
+    async def deleteDirectory(self, directoryName: str) -> str:
+        """
+        Delete a directory on the FTP client.
+
+        Parameters
+        ----------
+        directoryName : str
+            directoryName to delete
+        Returns
+        -------
+        str
+            server response
+        """
+
+        async with self.lock:
+            return await self._expect(self._command("RMD " + directoryName), "2")
+
+    async def createDirectory(self, directoryName: str) -> str:
+        """
+        Create a directory on the FTP client.
+
+        Parameters
+        ----------
+        directoryName : str
+            directoryName to create
+        Returns
+        -------
+        str
+            server response
+        """
+
+        async with self.lock:
+            return await self._expect(self._command("MKD " + directoryName), "2")
+
+    async def deleteFile(self, fileName: str) -> str:
+        """
+        delete a file on the FTP client.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to delete
+        Returns
+        -------
+        str
+            server response
+        """
+
+        async with self.lock:
+            return await self._expect(self._command("DELE " + fileName), "2")
+
+    async def retrieve(
+        self,
+        fileName: str,
+        receive: Callable[[bytes], Any],
+        transform: Optional[StreamTransform] = None,
+    ) -> str:
+        """
+        Retrieve a file from the FTP server, streaming it to a callback.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to retrieve
+        receive : Callable[[bytes], Any]
+            called with each received block, after the transform if given; an awaitable it
+            returns is awaited before the next block is read
+        transform : Optional[StreamTransform]
+            transform applied to the stream, for instance a decryptor
+        Returns
+        -------
+        str
+            server response
+        """
+
+        if transform is None:
+            return await self._transfer("RETR " + fileName, "I", receive=receive)
+
+        decryptor = transform
+
+        def receiveTransformed(block: bytes) -> Any:
+            processed = decryptor.update(block)
+            return receive(processed) if processed else None
+
+        response = await self._transfer("RETR " + fileName, "I", receive=receiveTransformed)
+        processed = transform.finalize()
+        if processed:
+            await _awaited(receive(processed))
+        return response
+
+    async def store(
+        self, fileName: str, chunks: Chunks, transform: Optional[StreamTransform] = None
+    ) -> str:
+        """
+        Store a stream of chunks as a file on the FTP server.
+
+        Parameters
+        ----------
+        fileName : str
+            name of the file on the server
+        chunks : Union[Iterable[bytes], AsyncIterator[bytes]]
+            content of the file
+        transform : Optional[StreamTransform]
+            transform applied to the stream, for instance an encryptor (a ContainerEncryptor
+            without hash tree, the header of a streamed container cannot be rewritten)
+        Returns
+        -------
+        str
+            server response
+        """
+
+        return await self._transfer("STOR " + fileName, "I", send=chunks, transform=transform)
+
+    async def downloadFile(self, fileName: str, transform: Optional[StreamTransform] = None) -> str:
+        """
+        download a file from the FTP client.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to download
+        transform : Optional[StreamTransform]
+            transform applied to the file before it is written, for instance a decryptor
+        Returns
+        -------
+        str
+            server response
+        """
+
+        loop = asyncio.get_running_loop()
+        downloadedFile = await loop.run_in_executor(None, _openBinary, fileName, "wb")
+        try:
+
+            def write(block: bytes) -> Awaitable[int]:
+                return loop.run_in_executor(None, downloadedFile.write, block)
+
+            return f"Downloading {fileName}...\n" + await self.retrieve(fileName, write, transform)
+        except FTPError:
+            await loop.run_in_executor(None, downloadedFile.close)
+            await loop.run_in_executor(None, os.remove, fileName)
+            raise
+        finally:
+            await loop.run_in_executor(None, downloadedFile.close)
+
+    async def uploadFile(self, fileName: str, transform: Optional[StreamTransform] = None) -> str:
+        """
+        upload a file to the FTP client.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to upload
+        transform : Optional[StreamTransform]
+            transform applied to the file before it is sent, for instance an encryptor
+            without hash tree
+        Returns
+        -------
+        str
+            server response
+        """
+
+        loop = asyncio.get_running_loop()
+        uploadFile = await loop.run_in_executor(None, _openBinary, fileName, "rb")
+
+        async def blocks() -> AsyncIterator[bytes]:
+            while True:
+                block = await loop.run_in_executor(None, uploadFile.read, BLOCK_SIZE)
+                if not block:
+                    return
+                yield block
+
+        try:
+            return f"Uploading {fileName.split('/')[-1]}...\n" + await self.store(
+                fileName.split("/")[-1], blocks(), transform
+            )
+        finally:
+            await loop.run_in_executor(None, uploadFile.close)
+
+    async def disconnect(self) -> str:
+        """
+        Close connection with the FTP server.
+
+        Returns
+        -------
+        str
+            server response
+        """
+
+        try:
+            async with self.lock:
+                return "Closing connection...\n" + await self._command("QUIT")
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+                self.reader = None
+
+    async def _transfer(
+        self,
+        command: str,
+        transferType: str,
+        receive: Optional[Callable[[bytes], Any]] = None,
+        send: Optional[Chunks] = None,
+        transform: Optional[StreamTransform] = None,
+    ) -> str:
+        async with self.lock:
+            if self.transferType != transferType:
+                await self._expect(self._command("TYPE " + transferType), "2")
+                self.transferType = transferType
+
+            host, port = await self._passive()
+            dataReader, dataWriter = await asyncio.wait_for(
+                asyncio.open_connection(host, port), self.timeout
+            )
+            try:
+                await self._expect(self._command(command), "1")
+                try:
+                    if send is not None:
+                        await _sendChunks(dataWriter, send, transform, self.timeout)
+                    elif receive is not None:
+                        while True:
+                            block = await asyncio.wait_for(
+                                dataReader.read(BLOCK_SIZE), self.timeout
+                            )
+                            if not block:
+                                break
+                            await _awaited(receive(block))
+                except asyncio.TimeoutError as exp:
+                    await self._abortTransfer(dataWriter)
+                    raise FTPError(f"{command}: data connection timed out") from exp
+                except Exception:
+                    await self._abortTransfer(dataWriter)
+                    raise
+            finally:
+                dataWriter.close()
+                try:
+                    await asyncio.wait_for(dataWriter.wait_closed(), self.timeout)
+                except (OSError, asyncio.TimeoutError):
+                    pass
+
+            return await self._expect(self._readResponse(), "2")
+
+    async def _abortTransfer(self, dataWriter: asyncio.StreamWriter) -> None:
+        # the server ends the transfer once the data connection is closed, its reply is read
+        # so the control connection stays usable
+        dataWriter.close()
+        try:
+            await self._readResponse()
+        except (OSError, EOFError, asyncio.TimeoutError, FTPError):
+            pass
+
+    async def _passive(self) -> Tuple[str, int]:
+        if ":" in self.host:
+            response = await self._expect(self._command("EPSV"), "2")
+            match = _EPSV_RESPONSE.search(response)
+            if match is None:
+                raise FTPError(f"Unexpected EPSV response: {response}")
+            return self.host, int(match.group(2))
+
+        response = await self._expect(self._command("PASV"), "2")
+        pasvMatch = _PASV_RESPONSE.search(response)
+        if pasvMatch is None:
+            raise FTPError(f"Unexpected PASV response: {response}")
+        numbers = [int(number) for number in pasvMatch.groups()]
+        # the address sent by the server is ignored, like ftplib does, as it is often
+        # a private address of a server behind NAT
+        return self.host, numbers[4] * 256 + numbers[5]
+
+    async def _command(self, command: str) -> str:
+        if "\r" in command or "\n" in command:
+            raise ValueError("an illegal newline character should not be contained")
+        if self.writer is None:
+            raise FTPError("Not connected")
+        self.writer.write(command.encode("utf-8") + b"\r\n")
+        await asyncio.wait_for(self.writer.drain(), self.timeout)
+        return await self._readResponse()
+
+    async def _readResponse(self) -> str:
+        if self.reader is None:
+            raise FTPError("Not connected")
+
+        line = await self._readLine()
+        lines = [line]
+        if line[3:4] == "-":
+            while not (lines[-1][:3] == line[:3] and lines[-1][3:4] == " "):
+                lines.append(await self._readLine())
+        return "\n".join(lines)
+
+    async def _readLine(self) -> str:
+        assert self.reader is not None
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise FTPError("Connection closed by the server")
+        return line.decode("utf-8").rstrip("\r\n")
+
+    @staticmethod
+    async def _expect(pending: Awaitable[str], expected: str) -> str:
+        response = await pending
+        if not response.startswith(expected):
+            raise FTPError(response)
+        return response
+
+
+def _openBinary(fileName: str, mode: str) -> BinaryIO:
+    return cast(BinaryIO, open(fileName, mode))  # pylint: disable=R1732,W1514
+
+
+async def _awaited(result: Any) -> None:
+    if inspect.isawaitable(result):
+        await result
+
+
+async def _sendChunks(
+    writer: asyncio.StreamWriter,
+    chunks: Chunks,
+    transform: Optional[StreamTransform],
+    timeout: float,
+) -> None:
+    async def write(data: bytes) -> None:
+        if transform is not None:
+            data = transform.update(data)
+        if data:
+            writer.write(data)
+            await asyncio.wait_for(writer.drain(), timeout)
+
+    if isinstance(chunks, collections.abc.AsyncIterator):
+        async for chunk in chunks:
+            await write(chunk)
+    else:
+        for chunk in chunks:
+            await write(chunk)
+
+    if transform is not None:
+        writer.write(transform.finalize())
+    await asyncio.wait_for(writer.drain(), timeout)
+
+
+def _quotedPath(response: str) -> str:
+    start = response.find('"')
+    end = response.rfind('"')
+    if start == -1 or end <= start:
+        return "/"
+    return response[start + 1 : end].replace('""', '"')
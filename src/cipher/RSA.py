@@ -2,11 +2,37 @@
 RSA Cipher
 """
 
+import re
+from typing import List
+
 from Cryptodome.PublicKey import RSA
 from Cryptodome.Cipher import PKCS1_OAEP
+from Cryptodome.Hash import SHA256
 
 from .abstract_cipher import Cipher
 
+FINGERPRINT_SIZE = 16
+
+_PEM_BLOCK = re.compile(rb"-----BEGIN [A-Z ]+-----.+?-----END [A-Z ]+-----", re.DOTALL)
+
+
+def splitKeys(keys: bytes) -> List[bytes]:
+    """
+    Split several PEM encoded keys given together
+
+    paramaters
+    ----------
+    keys: bytes
+        One or more keys
+
+    returns
+    -------
+    List[bytes]
+        The keys, the input as a single key if it holds no PEM block
+    """
+
+    return _PEM_BLOCK.findall(keys) or [keys]
+
 
 class RSACipher(Cipher):
     """
@@ -63,3 +89,16 @@ class RSACipher(Cipher):
         """
 
         return self.cipher.decrypt(enc)
+
+    def fingerprint(self) -> bytes:
+        """
+        Fingerprint of the public key, the same for a private key and its public key
+
+        returns
+        -------
+        bytes
+            First 16 bytes of the SHA-256 of the DER encoded public key
+        """
+
+        publicKey = self.key.publickey().export_key("DER")
+        return SHA256.new(publicKey).digest()[:FINGERPRINT_SIZE]
@@ -0,0 +1,267 @@
+"""
+AEAD cipher engines
+
+AES-GCM and ChaCha20-Poly1305 encrypt a whole buffer per call, AES-GCM uses AES-NI where the
+CPU has it and ChaCha20-Poly1305 is the faster choice on CPUs without it. Both authenticate
+the stream, the 16 bytes tag is appended to the encrypted stream.
+
+The keys of a file are the 32 bytes key followed by the 12 bytes nonce, a new key is generated
+for every file so the nonce is never reused with the same key.
+"""
+
+from typing import Any
+
+from Cryptodome.Cipher import AES, ChaCha20, ChaCha20_Poly1305
+from Cryptodome.Random import get_random_bytes
+
+from .engine import Buffer, CipherEngine, StreamTransform
+
+KEY_SIZE = 32
+NONCE_SIZE = 12
+TAG_SIZE = 16
+
+
+class _AEADEncryptor(StreamTransform):
+    """
+    AEAD encrypting stream transform
+    """
+
+    def __init__(self, cipher: Any) -> None:
+        self.cipher = cipher
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Encrypt the next buffer of the stream
+
+        paramaters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        bytes
+            Encrypted buffer
+        """
+
+        return self.cipher.encrypt(data)  # type: ignore
+
+    def finalize(self) -> bytes:
+        """
+        Finish the stream
+
+        returns
+        -------
+        bytes
+            Authentication tag
+        """
+
+        return self.cipher.digest()  # type: ignore
+
+
+class _AEADDecryptor(StreamTransform):
+    """
+    AEAD decrypting stream transform, holds back the last bytes of the stream as they may be
+    the authentication tag
+    """
+
+    def __init__(self, cipher: Any) -> None:
+        self.cipher = cipher
+        self.pending = b""
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Decrypt the next buffer of the stream
+
+        paramaters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        bytes
+            Decrypted data, not authenticated until finalize returns
+        """
+
+        if len(data) < TAG_SIZE:
+            self.pending += data
+            data = self.pending[:-TAG_SIZE]
+            self.pending = self.pending[-TAG_SIZE:]
+            return self.cipher.decrypt(data)  # type: ignore
+
+        decrypted = self.cipher.decrypt(self.pending) + self.cipher.decrypt(data[:-TAG_SIZE])
+        self.pending = bytes(data[-TAG_SIZE:])
+        return decrypted  # type: ignore
+
+    def finalize(self) -> bytes:
+        """
+        Finish the stream and verify the authentication tag
+
+        returns
+        -------
+        bytes
+            Empty, all the data was returned by update
+        """
+
+        if len(self.pending) != TAG_SIZE:
+            raise ValueError("Encrypted data is truncated")
+        self.cipher.verify(self.pending)
+        return b""
+
+
+class _KeystreamDecryptor(StreamTransform):
+    """
+    Decrypting stream transform of the keystream of an AEAD cipher, without authentication
+    """
+
+    def __init__(self, cipher: Any) -> None:
+        self.cipher = cipher
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Decrypt the next buffer of the stream
+
+        paramaters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        bytes
+            Decrypted buffer
+        """
+
+        return self.cipher.decrypt(data)  # type: ignore
+
+    def finalize(self) -> bytes:
+        """
+        Finish the stream
+
+        returns
+        -------
+        bytes
+            Empty, all the data was returned by update
+        """
+
+        return b""
+
+
+class AESGCMEngine(CipherEngine):
+    """
+    AES-256-GCM cipher engine
+    """
+
+    ENGINE_ID = 1
+    NAME = "aes-gcm"
+
+    def generateKeys(self) -> bytes:
+        """
+        Generate the keys for a new file
+
+        returns
+        -------
+        bytes
+            Key (32 bytes) + nonce (12 bytes)
+        """
+
+        return get_random_bytes(KEY_SIZE + NONCE_SIZE)
+
+    def encryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create an encrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Data authenticated along with the stream
+
+        returns
+        -------
+        StreamTransform
+            Encrypting transform
+        """
+
+        return _AEADEncryptor(self._newCipher(keys, associatedData))
+
+    def decryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create a decrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Data authenticated along with the stream
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform
+        """
+
+        return _AEADDecryptor(self._newCipher(keys, associatedData))
+
+    def decryptorAt(self, keys: bytes, offset: int) -> StreamTransform:
+        """
+        Create a decrypting stream transform starting at an offset of the stream
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        offset: int
+            Offset of the first byte in the encrypted stream
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform, without authentication
+        """
+
+        cipher = self._newKeystream(keys, offset)
+        # discard the keystream before the offset within its block
+        cipher.decrypt(bytes(offset % 64))
+        return _KeystreamDecryptor(cipher)
+
+    @staticmethod
+    def _newCipher(keys: bytes, associatedData: bytes) -> Any:
+        cipher: Any = AES.new(keys[:KEY_SIZE], AES.MODE_GCM, nonce=keys[KEY_SIZE:])
+        cipher.update(associatedData)
+        return cipher
+
+    @staticmethod
+    def _newKeystream(keys: bytes, offset: int) -> Any:
+        # GCM encrypts the stream in CTR mode from the counter block nonce || 2
+        return AES.new(
+            keys[:KEY_SIZE],
+            AES.MODE_CTR,
+            nonce=keys[KEY_SIZE:],
+            initial_value=2 + (offset - offset % 64) // 16,
+        )
+
+
+class ChaCha20Poly1305Engine(AESGCMEngine):
+    """
+    ChaCha20-Poly1305 cipher engine
+    """
+
+    ENGINE_ID = 2
+    NAME = "chacha20-poly1305"
+
+    @staticmethod
+    def _newCipher(keys: bytes, associatedData: bytes) -> Any:
+        cipher: Any = ChaCha20_Poly1305.new(key=keys[:KEY_SIZE], nonce=keys[KEY_SIZE:])
+        cipher.update(associatedData)
+        return cipher
+
+    @staticmethod
+    def _newKeystream(keys: bytes, offset: int) -> Any:
+        # the first block of the keystream is the Poly1305 key, the stream starts at the second
+        cipher: Any = ChaCha20.new(key=keys[:KEY_SIZE], nonce=keys[KEY_SIZE:])
+        cipher.seek(64 + offset - offset % 64)
+        return cipher
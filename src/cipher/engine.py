@@ -0,0 +1,123 @@
+"""
+Cipher engine interface
+
+An engine encrypts the body of a file. It generates the keys of a file, which are wrapped
+with RSA and stored in the key envelope, and creates stream transforms which process the
+body in buffers of any size.
+"""
+
+from abc import ABC, abstractmethod
+from typing import Union
+
+# buffers accepted by transforms, they are processed or copied before update returns so the
+# caller may reuse the memory of a bytearray or memoryview
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+class StreamTransform(ABC):
+    """
+    Stream transform abstract class, encrypts or decrypts a stream one buffer at a time
+    """
+
+    @abstractmethod
+    def update(self, data: Buffer) -> bytes:
+        """
+        Process the next buffer of the stream
+
+        paramaters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        bytes
+            Processed data, may be shorter or longer than the buffer
+        """
+
+    @abstractmethod
+    def finalize(self) -> bytes:
+        """
+        Finish the stream
+
+        returns
+        -------
+        bytes
+            Remaining processed data
+        """
+
+
+class CipherEngine(ABC):
+    """
+    Cipher engine abstract class
+    """
+
+    ENGINE_ID = -1  # pylint: disable=C0103
+    NAME = ""  # pylint: disable=C0103
+
+    @abstractmethod
+    def generateKeys(self) -> bytes:
+        """
+        Generate the keys for a new file
+
+        returns
+        -------
+        bytes
+            Keys of the file
+        """
+
+    @abstractmethod
+    def encryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create an encrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Data authenticated along with the stream, ignored by engines without integrity
+
+        returns
+        -------
+        StreamTransform
+            Encrypting transform
+        """
+
+    @abstractmethod
+    def decryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create a decrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Data authenticated along with the stream, ignored by engines without integrity
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform, its finalize raises ValueError if the stream was tampered with
+        """
+
+    @abstractmethod
+    def decryptorAt(self, keys: bytes, offset: int) -> StreamTransform:
+        """
+        Create a decrypting stream transform starting at an offset of the stream, so parts
+        of a file are decrypted independently. The part is not authenticated, it must be
+        verified by other means (the hash tree of the container)
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        offset: int
+            Offset of the first byte in the encrypted stream, a multiple of 16
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform, without integrity check
+        """
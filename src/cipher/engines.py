@@ -0,0 +1,70 @@
+"""
+Registry of the cipher engines, engines are recorded in the container header by id
+"""
+
+from typing import Dict, List
+
+from .engine import CipherEngine
+from .hybrid_cipher import HybridEngine
+from .aead import AESGCMEngine, ChaCha20Poly1305Engine
+
+_ENGINES: List[CipherEngine] = [AESGCMEngine(), ChaCha20Poly1305Engine(), HybridEngine()]
+_ENGINES_BY_ID: Dict[int, CipherEngine] = {engine.ENGINE_ID: engine for engine in _ENGINES}
+_ENGINES_BY_NAME: Dict[str, CipherEngine] = {engine.NAME: engine for engine in _ENGINES}
+
+DEFAULT_ENGINE = AESGCMEngine.NAME
+
+
+def engineNames() -> List[str]:
+    """
+    Names of the available engines, the default engine comes first
+
+    returns
+    -------
+    List[str]
+        Engine names
+    """
+
+    return [engine.NAME for engine in _ENGINES]
+
+
+def getEngine(engineId: int) -> CipherEngine:
+    """
+    Get an engine by the id recorded in a container header
+
+    paramaters
+    ----------
+    engineId: int
+        Engine id
+
+    returns
+    -------
+    CipherEngine
+        The engine
+    """
+
+    try:
+        return _ENGINES_BY_ID[engineId]
+    except KeyError as exp:
+        raise ValueError(f"Unknown cipher engine {engineId}") from exp
+
+
+def getEngineByName(name: str) -> CipherEngine:
+    """
+    Get an engine by name
+
+    paramaters
+    ----------
+    name: str
+        Engine name
+
+    returns
+    -------
+    CipherEngine
+        The engine
+    """
+
+    try:
+        return _ENGINES_BY_NAME[name]
+    except KeyError as exp:
+        raise ValueError(f"Unknown cipher engine {name}") from exp
@@ -8,15 +8,23 @@ The following methodology is followed for encryption:
     4.  The keys for cryptography algorithms are then grouped in a key file
 
 The decryption follows the same methodology is reverse order
+
+HybridEngine exposes the same scheme as a cipher engine. Every cipher runs in ECB mode, so
+instead of one call per part the engine gathers all the parts of a cipher in a buffer and
+encrypts them with a single call, which gives the same output as the round robin.
 """
 
-from typing import Tuple, List, Generator
+from typing import Tuple, List, Generator, Optional, Callable
 from Cryptodome.Random import get_random_bytes
 
 from .AES import AESCipher
 from .DES import DESCipher
 from .blowfish import BlowfishCipher
 from .abstract_cipher import Cipher
+from .engine import Buffer, CipherEngine, StreamTransform
+
+CHUNK_SIZE = 16
+ROUND_SIZE = 5 * CHUNK_SIZE
 
 
 def roundRobinCipher(ciphers: List[Cipher]) -> Generator[Cipher, None, None]:
@@ -61,39 +69,14 @@ class HybridEncrypter:
             + Blowfish key (16 bytes) + DES key (8 bytes))
         """
 
-        chunckSize = 16
-
-        keyAes = get_random_bytes(16)
-        keyBlowfish = get_random_bytes(16)
-        keyDes = get_random_bytes(8)
+        engine = HybridEngine()
+        keys = engine.generateKeys()
+        encryptor = engine.encryptor(keys)
 
-        aes = AESCipher(keyAes)
-        des = DESCipher(keyDes)
-        blowfish = BlowfishCipher(keyBlowfish)
-
-        cipherGenetator = roundRobinCipher([aes, des, des, blowfish, blowfish])
-
-        if len(raw) % chunckSize != 0:
-            raw += b" " * (chunckSize - len(raw) % chunckSize)
-
-        currChunck = 0
-        encryptedData = b""
-
-        while True:
-            chunk = raw[currChunck : currChunck + chunckSize]
-            currChunck += chunckSize
-
-            if len(chunk) == 0:
-                break
-            if len(chunk) % 16 != chunckSize:
-                chunk += b" " * (chunckSize - len(chunk))
-
-            encryptedData += next(cipherGenetator).encrypt(chunk)
-
-        return (encryptedData, keyAes + keyBlowfish + keyDes)
+        return (encryptor.update(raw) + encryptor.finalize(), keys)
 
     @staticmethod
-    def decrypt(encryptedData: bytes, keys: bytes) -> bytes:
+    def decrypt(encryptedData: bytes, keys: bytes, length: Optional[int] = None) -> bytes:
         """
         Decrypt encrypted data
 
@@ -104,6 +87,9 @@ class HybridEncrypter:
         keys: bytes
             Keys used for encryption (AES key (16 bytes)
             + Blowfish key (16 bytes) + DES key (8 bytes))
+        length: Optional[int]
+            Length of the plaintext, when given the padding is cut off at this length
+            instead of stripping trailing whitespace
 
         returns
         -------
@@ -111,6 +97,10 @@ class HybridEncrypter:
             Decrypted data
         """
 
+        if length is not None:
+            decryptor = HybridEngine().decryptor(keys)
+            return (decryptor.update(encryptedData) + decryptor.finalize())[:length]
+
         chunckSize = 16
 
         keyAes = keys[:16]
@@ -142,3 +132,170 @@ class HybridEncrypter:
             decryptedData = decryptedData.rstrip()
 
         return decryptedData
+
+
+class _HybridTransform(StreamTransform):
+    """
+    Hybrid stream transform, processes the round robin a whole number of rounds at a time.
+    A transform starting in the middle of a round starts the round robin at the cipher of the
+    first part
+    """
+
+    def __init__(self, keys: bytes, encrypt: bool, firstPart: int = 0) -> None:
+        aes = AESCipher(keys[:16])
+        blowfish = BlowfishCipher(keys[16:32])
+        des = DESCipher(keys[32:])
+
+        ciphers: List[Cipher] = [aes, des, des, blowfish, blowfish]
+        phase = firstPart % len(ciphers)
+        self.operations: List[Callable[[bytes], bytes]] = [
+            cipher.encrypt if encrypt else cipher.decrypt
+            for cipher in ciphers[phase:] + ciphers[:phase]
+        ]
+        self.encrypting = encrypt
+        self.pending = bytearray()
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Process the next buffer of the stream
+
+        paramaters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        bytes
+            Processed data of all the complete rounds buffered so far
+        """
+
+        self.pending += data
+        usable = len(self.pending) - len(self.pending) % ROUND_SIZE
+        if usable == 0:
+            return b""
+
+        processed = self._processRounds(self.pending[:usable])
+        del self.pending[:usable]
+        return processed
+
+    def finalize(self) -> bytes:
+        """
+        Finish the stream, the last part is padded with spaces when encrypting
+
+        returns
+        -------
+        bytes
+            Processed data of the last incomplete round
+        """
+
+        tail = bytes(self.pending)
+        self.pending = bytearray()
+
+        if len(tail) % CHUNK_SIZE != 0:
+            if not self.encrypting:
+                raise ValueError("Encrypted data is not a multiple of the block size")
+            tail += b" " * (CHUNK_SIZE - len(tail) % CHUNK_SIZE)
+
+        return b"".join(
+            self.operations[i // CHUNK_SIZE](tail[i : i + CHUNK_SIZE])
+            for i in range(0, len(tail), CHUNK_SIZE)
+        )
+
+    def _processRounds(self, data: bytearray) -> bytes:
+        rounds = len(data) // ROUND_SIZE
+        processed = bytearray(len(data))
+
+        for position, operation in enumerate(self.operations):
+            offset = position * CHUNK_SIZE
+            gathered = bytearray(rounds * CHUNK_SIZE)
+            for i in range(CHUNK_SIZE):
+                gathered[i::CHUNK_SIZE] = data[offset + i :: ROUND_SIZE]
+
+            result = operation(gathered)
+            for i in range(CHUNK_SIZE):
+                processed[offset + i :: ROUND_SIZE] = result[i::CHUNK_SIZE]
+
+        return bytes(processed)
+
+
+class HybridEngine(CipherEngine):
+    """
+    Hybrid cipher engine, AES, DES and Blowfish in round robin fashion without integrity check
+    """
+
+    # pylint: disable=W0613
+
+    ENGINE_ID = 0
+    NAME = "hybrid"
+
+    def generateKeys(self) -> bytes:
+        """
+        Generate the keys for a new file
+
+        returns
+        -------
+        bytes
+            AES key (16 bytes) + Blowfish key (16 bytes) + DES key (8 bytes)
+        """
+
+        return get_random_bytes(16) + get_random_bytes(16) + get_random_bytes(8)
+
+    def encryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create an encrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Ignored, the hybrid scheme has no integrity check
+
+        returns
+        -------
+        StreamTransform
+            Encrypting transform
+        """
+
+        return _HybridTransform(keys, True)
+
+    def decryptor(self, keys: bytes, associatedData: bytes = b"") -> StreamTransform:
+        """
+        Create a decrypting stream transform
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        associatedData: bytes
+            Ignored, the hybrid scheme has no integrity check
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform, the output keeps the padding of the last part
+        """
+
+        return _HybridTransform(keys, False)
+
+    def decryptorAt(self, keys: bytes, offset: int) -> StreamTransform:
+        """
+        Create a decrypting stream transform starting at an offset of the stream
+
+        paramaters
+        ----------
+        keys: bytes
+            Keys of the file
+        offset: int
+            Offset of the first byte in the encrypted stream, a multiple of 16
+
+        returns
+        -------
+        StreamTransform
+            Decrypting transform, the output keeps the padding of the last part
+        """
+
+        if offset % CHUNK_SIZE:
+            raise ValueError(f"Offset must be a multiple of {CHUNK_SIZE}")
+        return _HybridTransform(keys, False, offset // CHUNK_SIZE)
@@ -0,0 +1,394 @@
+"""
+Container module.
+
+A container keeps the RSA wrapped keys and the ciphertext of a file in a single object,
+so a file is uploaded, downloaded and deleted with a single transfer.
+
+The layout of a container is (all integers are big endian):
+    magic               4 bytes     b"SFSC"
+    version             1 byte
+    engine              1 byte      id of the cipher engine of the ciphertext
+    slot count          2 bytes
+    slot size           2 bytes
+    envelope slots      slot count slots of slot size bytes, each free or holding an envelope:
+        key id          16 bytes    fingerprint of the public key which wrapped the keys
+        wrapped length  2 bytes     0 for a free slot
+        wrapped keys    wrapped length bytes, the RSA wrapped keys
+        padding         zeros up to the slot size
+    plaintext length    8 bytes
+    flags               1 byte
+    segment hashes      32 bytes per segment of the plaintext, if FLAG_HASH_TREE is set
+    ciphertext          the rest of the object
+
+The keys are wrapped once per recipient, so one ciphertext is shared by all of them and each
+recipient finds the envelope wrapped for their key by its key id, without trying their keys.
+When FLAG_HASH_TREE is set the root of the hash tree of the segments (see the integrity
+module) is wrapped along with the keys, right after them.
+
+The slots have a fixed size and spare slots are reserved, so the envelopes can be rewritten
+in place (see slotOffset and packSlot) without moving the ciphertext. A slot whose wrapped
+length does not fit is read as free, it was torn by an interrupted rewrite.
+
+Version 4 containers have a recipient count (2 bytes) instead of the slot count and size,
+followed by the envelopes without padding. Version 3 containers have no segment hashes.
+Version 2 containers have a single envelope without key id, stored as its length (2 bytes)
+followed by the wrapped keys. Version 1 containers also have no engine field, their
+ciphertext is always encrypted with the hybrid engine.
+
+Files uploaded before containers were introduced are stored as two objects,
+<name>.enc for the ciphertext and <name>.key.enc for the RSA wrapped keys.
+"""
+
+import struct
+from typing import BinaryIO, List, NamedTuple, Optional, Tuple
+
+from src.cipher.RSA import FINGERPRINT_SIZE
+
+from .integrity import HASH_SIZE, segmentCount
+
+CONTAINER_EXTENSION = ".sfs"
+LEGACY_EXTENSION = ".enc"
+LEGACY_KEY_EXTENSION = ".key.enc"
+
+MAGIC = b"SFSC"
+VERSION = 5
+
+# spare envelope slots of a new container, bytes of a slot before its wrapped keys, and
+# smallest slot size: an envelope of RSA-4096
+SPARE_SLOTS = 2
+SLOT_HEADER_SIZE = FINGERPRINT_SIZE + 2
+MIN_SLOT_SIZE = SLOT_HEADER_SIZE + 512
+
+FLAG_HASH_TREE = 0x01
+
+HYBRID_ENGINE_ID = 0
+KEY_ID_SIZE = FINGERPRINT_SIZE
+
+_MAGIC_VERSION = struct.Struct(">4sB")
+_ENGINE = struct.Struct(">B")
+_COUNT = struct.Struct(">H")
+_SLOTS = struct.Struct(">HH")
+_LENGTH = struct.Struct(">H")
+_SUFFIX = struct.Struct(">QB")
+_ASSOCIATED_DATA = struct.Struct(">BQB")
+
+
+class InvalidContainer(ValueError):
+    """
+    The object is not a container or its version is not supported.
+    """
+
+
+class TruncatedHeader(InvalidContainer):  # pylint: disable=R0901
+    """
+    The object ends before the end of the container header.
+    """
+
+
+class KeyEnvelope(NamedTuple):
+    """
+    Keys of a file wrapped for one recipient.
+    """
+
+    keyId: bytes
+    wrappedKeys: bytes
+
+
+class ContainerHeader(NamedTuple):
+    """
+    Header of a container.
+    """
+
+    envelopes: List[KeyEnvelope]
+    plaintextLength: int
+    engineId: int
+    flags: int = 0
+    version: int = VERSION
+    leaves: Tuple[bytes, ...] = ()
+    # slot of each envelope, and number and size of the slots, chosen by packHeader if empty
+    slots: Tuple[int, ...] = ()
+    slotCount: int = 0
+    slotSize: int = 0
+
+
+def packHeader(header: ContainerHeader) -> bytes:
+    """
+    Serialize a container header.
+
+    parameters
+    ----------
+    header: ContainerHeader
+        Header to serialize, the envelopes are laid out in slots if it has none
+
+    returns
+    -------
+    bytes
+        Serialized header, the ciphertext follows it directly
+    """
+
+    header = withSlots(header)
+    table = [bytes(header.slotSize)] * header.slotCount
+    for slot, envelope in zip(header.slots, header.envelopes):
+        table[slot] = packSlot(envelope, header.slotSize)
+    parts = [
+        _MAGIC_VERSION.pack(MAGIC, VERSION),
+        _ENGINE.pack(header.engineId),
+        _SLOTS.pack(header.slotCount, header.slotSize),
+        *table,
+        _SUFFIX.pack(header.plaintextLength, header.flags),
+    ]
+    if header.flags & FLAG_HASH_TREE:
+        if len(header.leaves) != segmentCount(header.plaintextLength):
+            raise ValueError("Container needs one hash per segment of the plaintext")
+        parts += header.leaves
+
+    return b"".join(parts)
+
+
+def withSlots(header: ContainerHeader) -> ContainerHeader:
+    """
+    Lay the envelopes of a header out in slots, unless it already has its slots.
+
+    parameters
+    ----------
+    header: ContainerHeader
+        Header of a new container, or of a container older than version 5
+
+    returns
+    -------
+    ContainerHeader
+        Header with one slot per envelope, spare slots, and slots large enough for an
+        envelope of RSA-4096
+    """
+
+    if header.slotCount:
+        slots = set(header.slots)
+        if len(slots) != len(header.envelopes) or not slots <= set(range(header.slotCount)):
+            raise ValueError("Container needs a slot of its own per envelope")
+        return header
+    slotSize = max(
+        [MIN_SLOT_SIZE]
+        + [SLOT_HEADER_SIZE + len(envelope.wrappedKeys) for envelope in header.envelopes]
+    )
+    return header._replace(
+        slots=tuple(range(len(header.envelopes))),
+        slotCount=len(header.envelopes) + SPARE_SLOTS,
+        slotSize=slotSize,
+    )
+
+
+def packSlot(envelope: Optional[KeyEnvelope], slotSize: int) -> bytes:
+    """
+    Serialize an envelope slot.
+
+    parameters
+    ----------
+    envelope: Optional[KeyEnvelope]
+        Envelope of the slot, None for a free slot
+    slotSize: int
+        Size of the slots of the container
+
+    returns
+    -------
+    bytes
+        The slot, padded with zeros
+    """
+
+    if envelope is None:
+        return bytes(slotSize)
+    if len(envelope.keyId) != KEY_ID_SIZE:
+        raise ValueError(f"Key id must be {KEY_ID_SIZE} bytes long")
+    slot = envelope.keyId + _LENGTH.pack(len(envelope.wrappedKeys)) + envelope.wrappedKeys
+    if len(slot) > slotSize:
+        raise ValueError("Key envelope does not fit its slot")
+    return slot + bytes(slotSize - len(slot))
+
+
+def slotOffset(header: ContainerHeader, slot: int) -> int:
+    """
+    Offset of an envelope slot in a container of version 5 or later.
+
+    parameters
+    ----------
+    header: ContainerHeader
+        Header of the container
+    slot: int
+        Index of the slot
+
+    returns
+    -------
+    int
+        Offset of the slot from the start of the container
+    """
+
+    return _MAGIC_VERSION.size + _ENGINE.size + _SLOTS.size + slot * header.slotSize
+
+
+def readHeader(file: BinaryIO) -> ContainerHeader:
+    """
+    Read a container header, leaving the file positioned at the start of the ciphertext.
+
+    parameters
+    ----------
+    file: BinaryIO
+        Container opened in binary mode
+
+    returns
+    -------
+    ContainerHeader
+        Header of the container, envelopes of containers older than version 3 have
+        an empty key id
+    """
+
+    magic, version = _MAGIC_VERSION.unpack(_readExactly(file, _MAGIC_VERSION.size))
+    if magic != MAGIC:
+        raise InvalidContainer("File is not a container")
+    if version not in (1, 2, 3, 4, VERSION):
+        raise InvalidContainer(f"Unsupported container version {version}")
+
+    engineId = HYBRID_ENGINE_ID
+    if version >= 2:
+        (engineId,) = _ENGINE.unpack(_readExactly(file, _ENGINE.size))
+
+    envelopes: List[KeyEnvelope] = []
+    slots: Tuple[int, ...] = ()
+    slotCount = slotSize = 0
+    if version >= 5:
+        envelopes, slots, slotCount, slotSize = _readSlots(file)
+    elif version >= 3:
+        (count,) = _COUNT.unpack(_readExactly(file, _COUNT.size))
+        for _ in range(count):
+            keyId = _readExactly(file, KEY_ID_SIZE)
+            (length,) = _LENGTH.unpack(_readExactly(file, _LENGTH.size))
+            envelopes.append(KeyEnvelope(keyId, _readExactly(file, length)))
+    else:
+        (length,) = _LENGTH.unpack(_readExactly(file, _LENGTH.size))
+        envelopes.append(KeyEnvelope(b"", _readExactly(file, length)))
+
+    plaintextLength, flags = _SUFFIX.unpack(_readExactly(file, _SUFFIX.size))
+    leaves: Tuple[bytes, ...] = ()
+    if version >= 4 and flags & FLAG_HASH_TREE:
+        table = _readExactly(file, segmentCount(plaintextLength) * HASH_SIZE)
+        leaves = tuple(table[i : i + HASH_SIZE] for i in range(0, len(table), HASH_SIZE))
+    return ContainerHeader(
+        envelopes,
+        plaintextLength,
+        engineId,
+        flags,
+        version,
+        leaves,
+        slots,
+        slotCount,
+        slotSize,
+    )
+
+
+def associatedData(header: ContainerHeader) -> bytes:
+    """
+    Header fields authenticated along with the ciphertext by engines with integrity check.
+    The envelopes are left out so the keys can be wrapped again without touching the ciphertext.
+
+    parameters
+    ----------
+    header: ContainerHeader
+        Header of the container
+
+    returns
+    -------
+    bytes
+        Associated data
+    """
+
+    return _ASSOCIATED_DATA.pack(header.engineId, header.plaintextLength, header.flags)
+
+
+def packPayload(keys: bytes, root: Optional[bytes]) -> bytes:
+    """
+    Data wrapped in the key envelopes of a container.
+
+    parameters
+    ----------
+    keys: bytes
+        Keys of the file
+    root: Optional[bytes]
+        Root of the hash tree of the file, None for containers without hash tree
+
+    returns
+    -------
+    bytes
+        Keys followed by the root
+    """
+
+    return keys if root is None else keys + root
+
+
+def unpackPayload(header: ContainerHeader, payload: bytes) -> Tuple[bytes, Optional[bytes]]:
+    """
+    Split the data unwrapped from a key envelope.
+
+    parameters
+    ----------
+    header: ContainerHeader
+        Header of the container
+    payload: bytes
+        Unwrapped data
+
+    returns
+    -------
+    Tuple[bytes, Optional[bytes]]
+        Keys of the file and root of its hash tree, None for containers without hash tree
+    """
+
+    if header.version < 4 or not header.flags & FLAG_HASH_TREE:
+        return payload, None
+    if len(payload) <= HASH_SIZE:
+        raise ValueError("Key envelope is too short")
+    return payload[:-HASH_SIZE], payload[-HASH_SIZE:]
+
+
+def _readSlots(file: BinaryIO) -> Tuple[List[KeyEnvelope], Tuple[int, ...], int, int]:
+    slotCount, slotSize = _SLOTS.unpack(_readExactly(file, _SLOTS.size))
+    start = SLOT_HEADER_SIZE
+    if slotSize < start:
+        raise InvalidContainer("Envelope slots are too small")
+    envelopes, slots = [], []
+    for slot in range(slotCount):
+        data = _readExactly(file, slotSize)
+        (length,) = _LENGTH.unpack_from(data, KEY_ID_SIZE)
+        # a free slot, or a slot torn by an interrupted rewrite, otherwise an envelope
+        if 0 < length <= slotSize - start:
+            envelopes.append(KeyEnvelope(data[:KEY_ID_SIZE], data[start : start + length]))
+            slots.append(slot)
+    return envelopes, tuple(slots), slotCount, slotSize
+
+
+def _readExactly(file: BinaryIO, size: int) -> bytes:
+    data = file.read(size)
+    if len(data) != size:
+        raise TruncatedHeader("Container header is truncated")
+    return data
+
+
+def logicalName(remoteName: str) -> Optional[str]:
+    """
+    Map a remote object name to the name of the file it stores.
+
+    parameters
+    ----------
+    remoteName: str
+        Name of the object on the server
+
+    returns
+    -------
+    Optional[str]
+        Name of the stored file, None for objects which are folded into another one
+        (the keys of a legacy file)
+    """
+
+    if remoteName.endswith(LEGACY_KEY_EXTENSION):
+        return None
+    if remoteName.endswith(CONTAINER_EXTENSION):
+        return remoteName[: -len(CONTAINER_EXTENSION)]
+    if remoteName.endswith(LEGACY_EXTENSION):
+        return remoteName[: -len(LEGACY_EXTENSION)]
+    return remoteName
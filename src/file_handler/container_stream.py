@@ -0,0 +1,414 @@
+"""
+Container stream transforms, to encrypt a file into a container or decrypt a container while
+it is transferred, without a temporary file.
+"""
+
+import io
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+from src.cipher.engine import Buffer, StreamTransform
+from src.cipher.engines import DEFAULT_ENGINE, getEngine, getEngineByName
+from src.cipher.RSA import RSACipher
+from src.metrics import measured
+
+from .container import (
+    FLAG_HASH_TREE,
+    ContainerHeader,
+    KeyEnvelope,
+    TruncatedHeader,
+    associatedData,
+    packHeader,
+    packPayload,
+    readHeader,
+    unpackPayload,
+)
+from .integrity import (
+    HASH_SIZE,
+    SEGMENT_SIZE,
+    IntegrityError,
+    SegmentChecker,
+    SegmentHasher,
+    merkleRoot,
+    segmentCount,
+    verifyTree,
+)
+from .keyring import Keyring
+
+
+class ContainerEncryptor(StreamTransform):
+    """
+    Encrypts a plaintext stream into a container, the header is output first.
+
+    With a hash tree, the plaintext is hashed segment by segment as it is encrypted, the
+    segment hashes and the envelopes (wrapping the keys and the root of the hash tree) are
+    only known once the stream is finished. The header output first reserves their space, the
+    caller writes packedHeader over it once finalize has returned. A container streamed where
+    it cannot be rewritten (straight to the server) is made without hash tree.
+    """
+
+    def __init__(
+        self,
+        publicKeys: List[bytes],
+        plaintextLength: int,
+        engineName: str = DEFAULT_ENGINE,
+        hashTree: bool = True,
+    ) -> None:
+        engine = getEngineByName(engineName)
+        self.keys = engine.generateKeys()
+        # the fingerprint of a key is computed once, it is costly (DER export and hash)
+        self.recipients = [
+            (rsaCipher.fingerprint(), rsaCipher) for rsaCipher in map(RSACipher, publicKeys)
+        ]
+
+        # wrapped keys are as long as the RSA modulus whatever they hold
+        envelopes = [
+            KeyEnvelope(keyId, bytes(rsaCipher.key.size_in_bytes()))
+            for keyId, rsaCipher in self.recipients
+        ]
+        self.header = ContainerHeader(
+            envelopes,
+            plaintextLength,
+            engine.ENGINE_ID,
+            FLAG_HASH_TREE,
+            leaves=(bytes(HASH_SIZE),) * segmentCount(plaintextLength),
+        )
+        self.hasher: Optional[SegmentHasher] = SegmentHasher()
+        if not hashTree:
+            self.header = self._wrapped(self.keys)._replace(flags=0, leaves=())
+            self.hasher = None
+        self.encryptor = measured(
+            f"encrypt.{engine.NAME}", engine.encryptor(self.keys, associatedData(self.header))
+        )
+        self.pendingHeader = packHeader(self.header)
+        self.leaves: List[bytes] = []
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Encrypt the next buffer of the plaintext
+
+        parameters
+        ----------
+        data: Buffer
+            Next buffer of the plaintext
+
+        returns
+        -------
+        bytes
+            Next part of the container
+        """
+
+        if self.hasher is not None:
+            self.leaves += self.hasher.update(data)
+        return self._withHeader(self.encryptor.update(data))
+
+    def finalize(self) -> bytes:
+        """
+        Finish the container
+
+        returns
+        -------
+        bytes
+            Last part of the container
+        """
+
+        if self.hasher is not None:
+            lastLeaf = self.hasher.finalize()
+            if lastLeaf is not None:
+                self.leaves.append(lastLeaf)
+            if len(self.leaves) != len(self.header.leaves):
+                raise ValueError("Plaintext length does not match the length of the container")
+            root = merkleRoot(self.leaves)
+            self.header = self._wrapped(packPayload(self.keys, root))._replace(
+                leaves=tuple(self.leaves)
+            )
+        # the keys are only kept until they are wrapped
+        self.keys = b""
+        return self._withHeader(self.encryptor.finalize())
+
+    def packedHeader(self) -> bytes:
+        """
+        Final header of the container, the same length as the header output first
+
+        returns
+        -------
+        bytes
+            Header to write at the start of the container
+        """
+
+        if self.keys:
+            raise ValueError("Container is not finished")
+        return packHeader(self.header)
+
+    def _wrapped(self, payload: bytes) -> ContainerHeader:
+        return self.header._replace(
+            envelopes=[
+                KeyEnvelope(keyId, rsaCipher.encrypt(payload))
+                for keyId, rsaCipher in self.recipients
+            ]
+        )
+
+    def _withHeader(self, data: bytes) -> bytes:
+        if self.pendingHeader:
+            data = self.pendingHeader + data
+            self.pendingHeader = b""
+        return data
+
+
+class ContainerDecryptor(StreamTransform):  # pylint: disable=R0902
+    """
+    Decrypts a container stream, the header is parsed as soon as it is received and the keys
+    are unwrapped with the keyring (or the unwrap callback) unless they are given. Each segment
+    is verified against the hash tree as soon as it is decrypted, so a download through the
+    decryptor stops at the first corrupted segment.
+    With an output file, the decrypted data is written to it instead of being returned.
+    """
+
+    def __init__(
+        self,
+        keyring: Optional[Keyring] = None,
+        keys: Optional[bytes] = None,
+        unwrap: Optional[Callable[[List[KeyEnvelope]], bytes]] = None,
+        output: Optional[BinaryIO] = None,
+    ) -> None:
+        if keyring is not None:
+            unwrap = keyring.unwrapEnvelopes
+        if unwrap is None and keys is None:
+            raise ValueError("A keyring or the keys of the file are required")
+        self.unwrap = unwrap
+        self.keys = keys
+        self.output = output
+        self.header: Optional[ContainerHeader] = None
+        self.decryptor: Optional[StreamTransform] = None
+        self.checker: Optional[SegmentChecker] = None
+        self.pending = b""
+        self.remaining = 0
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Decrypt the next buffer of the container
+
+        parameters
+        ----------
+        data: Buffer
+            Next buffer of the container
+
+        returns
+        -------
+        bytes
+            Decrypted data, empty with an output file. Each segment is verified against the
+            hash tree as soon as it is complete but the data is not authenticated by the
+            engine until finalize returns
+        """
+
+        if self.decryptor is None:
+            self.pending += data
+            if not self._readHeader():
+                return b""
+            data, self.pending = self.pending, b""
+
+        assert self.decryptor is not None
+        return self._truncate(self.decryptor.update(data))
+
+    def finalize(self) -> bytes:
+        """
+        Finish the container and verify it against its hash tree and, if its engine has an
+        integrity check, its authentication tag
+
+        returns
+        -------
+        bytes
+            Remaining decrypted data, empty with an output file
+        """
+
+        if self.decryptor is None:
+            raise TruncatedHeader("Container header is truncated")
+        data = self._truncate(self.decryptor.finalize())
+        if self.checker is not None:
+            self.checker.finalize()
+        return data
+
+    def _readHeader(self) -> bool:
+        stream = io.BytesIO(self.pending)
+        try:
+            self.header = readHeader(stream)
+        except TruncatedHeader:
+            return False
+
+        if self.keys is None:
+            assert self.unwrap is not None
+            self.keys = self.unwrap(self.header.envelopes)
+
+        keys, root = unpackPayload(self.header, self.keys)
+        if root is not None:
+            verifyTree(self.header.leaves, root)
+            self.checker = SegmentChecker(self.header.leaves)
+
+        engine = getEngine(self.header.engineId)
+        self.decryptor = measured(
+            f"decrypt.{engine.NAME}", engine.decryptor(keys, associatedData(self.header))
+        )
+        self.remaining = self.header.plaintextLength
+        self.pending = self.pending[stream.tell() :]
+        return True
+
+    def _truncate(self, data: bytes) -> bytes:
+        data = data[: self.remaining]
+        self.remaining -= len(data)
+        if self.checker is not None:
+            self.checker.update(data)
+        if self.output is not None:
+            self.output.write(data)
+            return b""
+        return data
+
+
+class ContainerVerifier:
+    """
+    Verifies the ranges of a container downloaded in parallel, each range is decrypted on its
+    own and its segments are checked against the hash tree as they are received.
+    The ranges must start at the offsets given by align.
+    """
+
+    def __init__(self, header: ContainerHeader, packedHeader: bytes, keys: bytes) -> None:
+        keys, root = unpackPayload(header, keys)
+        if root is None:
+            raise ValueError("Container has no hash tree")
+        verifyTree(header.leaves, root)
+        self.header = header
+        self.packedHeader = packedHeader
+        self.keys = keys
+
+    def align(self, offset: int) -> int:
+        """
+        Move a range boundary back to the start of a segment
+
+        parameters
+        ----------
+        offset: int
+            Offset in the container
+
+        returns
+        -------
+        int
+            Offset of the segment holding the offset, 0 within the header
+        """
+
+        headerSize = len(self.packedHeader)
+        if offset <= headerSize:
+            return 0
+        return headerSize + (offset - headerSize) // SEGMENT_SIZE * SEGMENT_SIZE
+
+    def rangeCheck(self, offset: int, length: int) -> StreamTransform:
+        """
+        Create the check of a range of the container
+
+        parameters
+        ----------
+        offset: int
+            Offset of the range in the container, as given by align
+        length: int
+            Length of the range
+
+        returns
+        -------
+        StreamTransform
+            Transform fed with the data of the range, update raises IntegrityError as soon as
+            a segment is corrupted and finalize if the range is incomplete
+        """
+
+        return _RangeCheck(self, offset, length)
+
+    def segments(self, offset: int, length: int) -> Tuple[int, int]:
+        """
+        Segments of the plaintext covered by a range of the container
+
+        parameters
+        ----------
+        offset: int
+            Offset of the range in the container, as given by align
+        length: int
+            Length of the range
+
+        returns
+        -------
+        Tuple[int, int]
+            Index of the first segment and index after the last one
+        """
+
+        headerSize = len(self.packedHeader)
+        start = max(offset, headerSize) - headerSize
+        end = min(max(offset + length, headerSize) - headerSize, self.header.plaintextLength)
+        if start % SEGMENT_SIZE:
+            raise ValueError("Range does not start at a segment boundary")
+        if end == self.header.plaintextLength:
+            return start // SEGMENT_SIZE, len(self.header.leaves)
+        return start // SEGMENT_SIZE, end // SEGMENT_SIZE
+
+
+class _RangeCheck(StreamTransform):
+    """
+    Check of a range of a container
+    """
+
+    def __init__(self, verifier: ContainerVerifier, offset: int, length: int) -> None:
+        first, end = verifier.segments(offset, length)
+        self.expectedHeader = verifier.packedHeader[offset : offset + length]
+        engine = getEngine(verifier.header.engineId)
+        self.decryptor = measured(
+            f"verify.{engine.NAME}", engine.decryptorAt(verifier.keys, first * SEGMENT_SIZE)
+        )
+        self.checker = SegmentChecker(verifier.header.leaves, first, end)
+        self.remaining = min(end * SEGMENT_SIZE, verifier.header.plaintextLength) - (
+            first * SEGMENT_SIZE
+        )
+        # ciphertext needed to decrypt the checked plaintext, up to the end of its last block
+        self.unread = -(-self.remaining // 16) * 16
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Check the next buffer of the range
+
+        parameters
+        ----------
+        data: Buffer
+            Next buffer of the range
+
+        returns
+        -------
+        bytes
+            Empty, the data is only checked
+        """
+
+        if self.expectedHeader:
+            headerPart = min(len(data), len(self.expectedHeader))
+            if data[:headerPart] != self.expectedHeader[:headerPart]:
+                raise IntegrityError("Container header does not match")
+            self.expectedHeader = self.expectedHeader[headerPart:]
+            data = data[headerPart:]
+
+        if self.unread > 0 and data:
+            data = data[: self.unread]
+            self.unread -= len(data)
+            self._check(self.decryptor.update(data))
+        return b""
+
+    def finalize(self) -> bytes:
+        """
+        Check the end of the range
+
+        returns
+        -------
+        bytes
+            Empty, the data is only checked
+        """
+
+        if self.expectedHeader or self.unread > 0:
+            raise IntegrityError("Range is truncated")
+        self._check(self.decryptor.finalize())
+        self.checker.finalize()
+        return b""
+
+    def _check(self, plaintext: bytes) -> None:
+        plaintext = plaintext[: self.remaining]
+        self.remaining -= len(plaintext)
+        self.checker.update(plaintext)
@@ -0,0 +1,252 @@
+"""
+DownloadCache module.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".secure_ftp", "cache")
+
+DEFAULT_CACHE_BUDGET = 1024 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    server TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size TEXT NOT NULL,
+    modified TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (server, path)
+);
+CREATE INDEX IF NOT EXISTS entriesByDigest ON entries (digest);
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    lastUsed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objectsByUse ON objects (lastUsed);
+"""
+
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+class DownloadCache:
+    """
+    On disk cache of downloaded objects (containers and legacy ciphertext), so a file
+    downloaded again is decrypted from its local copy without being transferred.
+
+    Objects are stored under the SHA-256 of their content, so identical objects share a
+    copy, and are looked up by server and remote path. An object is only returned while the
+    size and modification time of the remote file are unchanged. The least recently used
+    objects are evicted once the objects exceed the byte budget. Only ciphertext is cached,
+    the decrypted files and keys never are.
+    """
+
+    def __init__(
+        self, directory: str = DEFAULT_CACHE_DIRECTORY, budget: int = DEFAULT_CACHE_BUDGET
+    ) -> None:
+        self.directory = directory
+        self.budget = budget
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self.connection = sqlite3.connect(
+            os.path.join(directory, "index.sqlite3"), check_same_thread=False
+        )
+        self.connection.executescript(_SCHEMA)
+        self.lock = threading.Lock()
+
+    def get(self, server: str, remotePath: str, facts: Tuple[str, str]) -> Optional[str]:
+        """
+        Get the local copy of a remote object.
+
+        parameters
+        ----------
+        server: str
+            Server of the object, for instance user@host:port
+        remotePath: str
+            Path of the object on the server
+        facts: Tuple[str, str]
+            Size and modification time of the object on the server
+
+        returns
+        -------
+        Optional[str]
+            Path of the local copy, None if it is not cached or the object changed
+        """
+
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT size, modified, digest FROM entries WHERE server = ? AND path = ?",
+                (server, remotePath),
+            ).fetchone()
+            if row is None:
+                return None
+
+            size, modified, digest = row
+            objectPath = self._objectPath(digest)
+            if (size, modified) != facts or not _hasSize(objectPath, int(size)):
+                self._discard(server, remotePath)
+                return None
+
+            self.connection.execute(
+                "UPDATE objects SET lastUsed = ? WHERE digest = ?", (time.time_ns(), digest)
+            )
+            return objectPath
+
+    def put(
+        self, server: str, remotePath: str, facts: Tuple[str, str], fileName: str
+    ) -> Optional[str]:
+        """
+        Move a downloaded object into the cache.
+
+        parameters
+        ----------
+        server: str
+            Server of the object, for instance user@host:port
+        remotePath: str
+            Path of the object on the server
+        facts: Tuple[str, str]
+            Size and modification time of the object on the server
+        fileName: str
+            Path of the downloaded object, it is moved into the cache
+
+        returns
+        -------
+        Optional[str]
+            Path of the local copy, None if the object is not cached: the server gave no
+            modification time, its size differs from the download or it exceeds the budget
+        """
+
+        size, modified = facts
+        if not modified or not _hasSize(fileName, int(size or -1)) or int(size) > self.budget:
+            return None
+
+        digest = _fileDigest(fileName)
+        objectPath = self._objectPath(digest)
+        os.makedirs(os.path.dirname(objectPath), exist_ok=True)
+
+        with self.lock, self.connection:
+            self._discard(server, remotePath)
+            _moveFile(fileName, objectPath)
+            self.connection.execute(
+                "INSERT OR REPLACE INTO objects (digest, size, lastUsed) VALUES (?, ?, ?)",
+                (digest, int(size), time.time_ns()),
+            )
+            self.connection.execute(
+                "INSERT INTO entries (server, path, size, modified, digest) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (server, remotePath, size, modified, digest),
+            )
+            self._evict()
+            return objectPath
+
+    def discard(self, server: str, remotePath: str) -> None:
+        """
+        Forget the local copy of a remote object, it is removed unless another remote
+        object has the same content.
+
+        parameters
+        ----------
+        server: str
+            Server of the object, for instance user@host:port
+        remotePath: str
+            Path of the object on the server
+        """
+
+        with self.lock, self.connection:
+            self._discard(server, remotePath)
+
+    def clear(self) -> None:
+        """
+        Remove all the cached objects.
+        """
+
+        with self.lock, self.connection:
+            for (digest,) in self.connection.execute("SELECT digest FROM objects").fetchall():
+                _removeFile(self._objectPath(digest))
+            self.connection.execute("DELETE FROM entries")
+            self.connection.execute("DELETE FROM objects")
+
+    def size(self) -> int:
+        """
+        Get the size of the cached objects.
+
+        returns
+        -------
+        int
+            Bytes held by the cache
+        """
+
+        with self.lock:
+            (total,) = self.connection.execute("SELECT SUM(size) FROM objects").fetchone()
+            return int(total or 0)
+
+    def _objectPath(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest)
+
+    def _discard(self, server: str, remotePath: str) -> None:
+        row = self.connection.execute(
+            "SELECT digest FROM entries WHERE server = ? AND path = ?", (server, remotePath)
+        ).fetchone()
+        if row is None:
+            return
+        self.connection.execute(
+            "DELETE FROM entries WHERE server = ? AND path = ?", (server, remotePath)
+        )
+        (references,) = self.connection.execute(
+            "SELECT COUNT(*) FROM entries WHERE digest = ?", row
+        ).fetchone()
+        if not references:
+            self.connection.execute("DELETE FROM objects WHERE digest = ?", row)
+            _removeFile(self._objectPath(row[0]))
+
+    def _evict(self) -> None:
+        # least recently used objects first, with every remote object they are the copy of
+        (total,) = self.connection.execute("SELECT SUM(size) FROM objects").fetchone()
+        total = total or 0
+        while total > self.budget:
+            digest, size = self.connection.execute(
+                "SELECT digest, size FROM objects ORDER BY lastUsed LIMIT 1"
+            ).fetchone()
+            self.connection.execute("DELETE FROM entries WHERE digest = ?", (digest,))
+            self.connection.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            _removeFile(self._objectPath(digest))
+            total -= size
+
+
+def _fileDigest(fileName: str) -> str:
+    digest = hashlib.sha256()
+    with open(fileName, "rb") as file:
+        for block in iter(lambda: file.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _hasSize(fileName: str, size: int) -> bool:
+    try:
+        return os.path.getsize(fileName) == size
+    except OSError:
+        return False
+
+
+def _moveFile(source: str, destination: str) -> None:
+    try:
+        os.replace(source, destination)
+    except OSError as exp:
+        if exp.errno != errno.EXDEV:
+            raise
+        # the cache is on another file system
+        shutil.copyfile(source, destination)
+        os.remove(source)
+
+
+def _removeFile(fileName: str) -> None:
+    try:
+        os.remove(fileName)
+    except FileNotFoundError:
+        pass
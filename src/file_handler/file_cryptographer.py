@@ -2,8 +2,18 @@
 FileEncrypter module.
 """
 
+import os
+from typing import List, Optional
+
 from src.cipher.hybrid_cipher import HybridEncrypter
 from src.cipher.RSA import RSACipher
+from src.cipher.engines import DEFAULT_ENGINE
+
+from .keyring import Keyring
+from .container import CONTAINER_EXTENSION, readHeader
+from .container_stream import ContainerEncryptor, ContainerDecryptor
+
+BLOCK_SIZE = 1024 * 1024
 
 
 class FileCryptographer:
@@ -57,20 +67,208 @@ class FileCryptographer:
             Key used to decrypt the file
         """
 
-        try:
-            with open(fileName, "rb") as file:
-                encrypted = file.read()
+        keyring = Keyring()
+        keyring.addKey(privateKey)
+        keys = FileCryptographer.unwrapKeysFile(encryptedKeysFilePath, keyring)
+        FileCryptographer.decryptFileWithKeys(fileName, keys)
+
+    @staticmethod
+    def unwrapKeysFile(encryptedKeysFilePath: str, keyring: Keyring) -> bytes:
+        """
+        Decrypts the keys file of a file. Keys files do not record the key they were
+        encrypted with, so every private key of the keyring is tried.
+
+        parameters
+        ----------
+        encryptedKeysFilePath: str
+            Path to the encrypted keys file
+        keyring: Keyring
+            Keyring holding the private key of the file
 
+        returns
+        -------
+        bytes
+            Keys of the file
+        """
+
+        try:
             with open(encryptedKeysFilePath, "rb") as file:
                 encryptedKeys = file.read()
 
-            rsaCipher = RSACipher(privateKey)
-            keys = rsaCipher.decrypt(encryptedKeys)
+            return keyring.unwrap(encryptedKeys)
+
+        except FileNotFoundError as exp:
+            raise FileNotFoundError("File not found") from exp
+
+    @staticmethod
+    def decryptFileWithKeys(
+        fileName: str, keys: bytes, decryptedPath: Optional[str] = None
+    ) -> None:
+        """
+        Decrypts a file using its already decrypted keys.
+
+        parameters
+        ----------
+        fileName: str
+            Path to the file to be decrypted
+        keys: bytes
+            Keys of the file
+        decryptedPath: Optional[str]
+            Path of the decrypted file, next to the encrypted file by default
+        """
+
+        if decryptedPath is None:
+            decryptedPath = fileName.replace(".enc", "") + ".dec"
+
+        try:
+            with open(fileName, "rb") as file:
+                encrypted = file.read()
 
             decrypted = HybridEncrypter.decrypt(encrypted, keys)
 
-            with open(fileName.replace(".enc", "") + ".dec", "wb") as file:
+            with open(decryptedPath, "wb") as file:
                 file.write(decrypted)
 
         except FileNotFoundError as exp:
             raise FileNotFoundError("File not found") from exp
+
+    @staticmethod
+    def encryptToContainer(
+        fileName: str,
+        publicKeys: List[bytes],
+        engineName: str = DEFAULT_ENGINE,
+        containerPath: Optional[str] = None,
+    ) -> str:
+        """
+        Encrypts a file into a single container holding both the wrapped keys and the ciphertext.
+        The file is streamed through the engine one block at a time, and its keys are wrapped
+        once for every recipient. The header is written again once the file is hashed, with
+        the segment hashes and the envelopes wrapping the root of the hash tree.
+
+        parameters
+        ----------
+        fileName: str
+            Path to the file to be encrypted
+        publicKeys: List[bytes]
+            Keys of the recipients, used to wrap the keys of the file
+        engineName: str
+            Name of the cipher engine used to encrypt the file
+        containerPath: Optional[str]
+            Path of the container, next to the file by default
+
+        returns
+        -------
+        str
+            Path to the container
+        """
+
+        if containerPath is None:
+            containerPath = fileName + CONTAINER_EXTENSION
+
+        try:
+            encryptor = ContainerEncryptor(publicKeys, os.path.getsize(fileName), engineName)
+
+            with open(fileName, "rb") as source, open(containerPath, "wb") as container:
+                for block in iter(lambda: source.read(BLOCK_SIZE), b""):
+                    container.write(encryptor.update(block))
+                container.write(encryptor.finalize())
+                container.seek(0)
+                container.write(encryptor.packedHeader())
+
+            return containerPath
+
+        except FileNotFoundError as exp:
+            raise FileNotFoundError("File not found") from exp
+
+    @staticmethod
+    def decryptContainer(fileName: str, privateKey: bytes) -> str:
+        """
+        Decrypts a container.
+
+        parameters
+        ----------
+        fileName: str
+            Path to the container to be decrypted
+        privateKey: bytes
+            Key used to unwrap the keys of the file
+
+        returns
+        -------
+        str
+            Path to the decrypted file
+        """
+
+        keyring = Keyring()
+        keyring.addKey(privateKey)
+        keys = FileCryptographer.unwrapContainerKeys(fileName, keyring)
+        return FileCryptographer.decryptContainerWithKeys(fileName, keys)
+
+    @staticmethod
+    def unwrapContainerKeys(fileName: str, keyring: Keyring) -> bytes:
+        """
+        Unwraps the keys of a container, the private key of an envelope is looked up in the
+        keyring by the key id of the envelope.
+
+        parameters
+        ----------
+        fileName: str
+            Path to the container
+        keyring: Keyring
+            Keyring holding the private key of one of the recipients
+
+        returns
+        -------
+        bytes
+            Keys of the file
+        """
+
+        try:
+            with open(fileName, "rb") as container:
+                header = readHeader(container)
+        except FileNotFoundError as exp:
+            raise FileNotFoundError("File not found") from exp
+
+        return keyring.unwrapEnvelopes(header.envelopes)
+
+    @staticmethod
+    def decryptContainerWithKeys(
+        fileName: str, keys: bytes, decryptedPath: Optional[str] = None
+    ) -> str:
+        """
+        Decrypts a container using its already unwrapped keys. The ciphertext is streamed
+        through the engine recorded in the header one block at a time, the decrypted file is
+        removed if the engine finds the ciphertext was tampered with.
+
+        parameters
+        ----------
+        fileName: str
+            Path to the container to be decrypted
+        keys: bytes
+            Keys of the file
+        decryptedPath: Optional[str]
+            Path of the decrypted file, next to the container by default
+
+        returns
+        -------
+        str
+            Path to the decrypted file
+        """
+
+        if decryptedPath is None:
+            decryptedPath = fileName[: -len(CONTAINER_EXTENSION)] + ".dec"
+
+        try:
+            decryptor = ContainerDecryptor(keys=keys)
+            with open(fileName, "rb") as container, open(decryptedPath, "wb") as decrypted:
+                for block in iter(lambda: container.read(BLOCK_SIZE), b""):
+                    decrypted.write(decryptor.update(block))
+                decrypted.write(decryptor.finalize())
+
+            return decryptedPath
+
+        except FileNotFoundError as exp:
+            raise FileNotFoundError("File not found") from exp
+        except ValueError:
+            if os.path.exists(decryptedPath):
+                os.remove(decryptedPath)
+            raise
@@ -0,0 +1,188 @@
+"""
+Integrity module.
+
+The plaintext of a container is hashed in segments of SEGMENT_SIZE bytes while it is
+encrypted, and the segment hashes (the leaves) are combined into a binary hash tree:
+    leaf    SHA-256(0x00 || segment)
+    node    SHA-256(0x01 || left || right), a node without sibling is carried to the next level
+The leaves are stored in the container header and the root is wrapped with the keys of the
+file, so each segment is verified on its own as soon as it is received, in any order.
+"""
+
+import hashlib
+from typing import List, Optional, Sequence
+
+from src.cipher.engine import Buffer
+
+SEGMENT_SIZE = 1024 * 1024
+HASH_SIZE = 32
+
+_LEAF = b"\x00"
+_NODE = b"\x01"
+
+
+class IntegrityError(ValueError):
+    """
+    A segment of the file does not match its hash, or the hashes do not match the root.
+    """
+
+
+def segmentCount(length: int) -> int:
+    """
+    Number of segments of a plaintext.
+
+    parameters
+    ----------
+    length: int
+        Length of the plaintext
+
+    returns
+    -------
+    int
+        Number of segments, the last one may be shorter than SEGMENT_SIZE
+    """
+
+    return -(-length // SEGMENT_SIZE)
+
+
+def merkleRoot(leaves: Sequence[bytes]) -> bytes:
+    """
+    Root of the hash tree of the leaves.
+
+    parameters
+    ----------
+    leaves: Sequence[bytes]
+        Segment hashes, in order
+
+    returns
+    -------
+    bytes
+        Root hash, the hash of the empty string for an empty file
+    """
+
+    if not leaves:
+        return hashlib.sha256().digest()
+
+    level = list(leaves)
+    while len(level) > 1:
+        parents = [
+            hashlib.sha256(_NODE + level[i] + level[i + 1]).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            parents.append(level[-1])
+        level = parents
+    return level[0]
+
+
+def verifyTree(leaves: Sequence[bytes], root: bytes) -> None:
+    """
+    Verify the leaves of a file against the root of its hash tree.
+
+    parameters
+    ----------
+    leaves: Sequence[bytes]
+        Segment hashes read from the container header
+    root: bytes
+        Root unwrapped with the keys of the file
+    """
+
+    if merkleRoot(leaves) != root:
+        raise IntegrityError("Segment hashes do not match the hash tree root")
+
+
+class SegmentHasher:
+    """
+    Hashes a stream segment by segment, buffers of any size are hashed without copy.
+    """
+
+    def __init__(self) -> None:
+        self.hash = hashlib.sha256(_LEAF)
+        self.filled = 0
+
+    def update(self, data: Buffer) -> List[bytes]:
+        """
+        Hash the next buffer of the stream
+
+        parameters
+        ----------
+        data: Buffer
+            Next buffer of the stream
+
+        returns
+        -------
+        List[bytes]
+            Hashes of the segments completed by the buffer
+        """
+
+        leaves = []
+        with memoryview(data) as view:
+            position = 0
+            while position < len(view):
+                taken = min(SEGMENT_SIZE - self.filled, len(view) - position)
+                self.hash.update(view[position : position + taken])
+                self.filled += taken
+                position += taken
+                if self.filled == SEGMENT_SIZE:
+                    leaves.append(self.hash.digest())
+                    self.hash = hashlib.sha256(_LEAF)
+                    self.filled = 0
+        return leaves
+
+    def finalize(self) -> Optional[bytes]:
+        """
+        Finish the stream
+
+        returns
+        -------
+        Optional[bytes]
+            Hash of the last, incomplete, segment if any
+        """
+
+        return self.hash.digest() if self.filled else None
+
+
+class SegmentChecker:
+    """
+    Verifies a stream of plaintext, which starts at a segment boundary, against the leaves
+    of its file. A mismatch is raised as soon as the segment is complete.
+    """
+
+    def __init__(
+        self, leaves: Sequence[bytes], firstSegment: int = 0, endSegment: Optional[int] = None
+    ) -> None:
+        self.leaves = leaves
+        self.index = firstSegment
+        self.endSegment = len(leaves) if endSegment is None else endSegment
+        self.hasher = SegmentHasher()
+
+    def update(self, data: Buffer) -> None:
+        """
+        Verify the next buffer of the plaintext
+
+        parameters
+        ----------
+        data: Buffer
+            Next buffer of the plaintext
+        """
+
+        for leaf in self.hasher.update(data):
+            self._check(leaf)
+
+    def finalize(self) -> None:
+        """
+        Verify the last segment of the plaintext, and that no segment is missing
+        """
+
+        leaf = self.hasher.finalize()
+        if leaf is not None:
+            self._check(leaf)
+        if self.index != self.endSegment:
+            raise IntegrityError(f"Data ends before segment {self.index}")
+
+    def _check(self, leaf: bytes) -> None:
+        if self.index >= self.endSegment:
+            raise IntegrityError("Data is longer than its hash tree")
+        if leaf != self.leaves[self.index]:
+            raise IntegrityError(f"Segment {self.index} is corrupted")
+        self.index += 1
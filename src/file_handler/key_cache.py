@@ -0,0 +1,134 @@
+"""
+SessionKeyCache module.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class _CachedKeys:  # pylint: disable=R0903
+    """
+    Unwrapped keys of a remote file, with the facts of the file they belong to.
+    """
+
+    def __init__(self, size: str, modified: str, keys: bytes, expiresAt: float) -> None:
+        self.size = size
+        self.modified = modified
+        self.keys = bytearray(keys)
+        self.expiresAt = expiresAt
+
+    def wipe(self) -> None:
+        """
+        Overwrite the keys with zeros.
+        """
+
+        self.keys[:] = bytes(len(self.keys))
+
+
+class SessionKeyCache:
+    """
+    In memory cache of unwrapped file keys, so a file downloaded again skips the RSA
+    decryption of its keys (and the download of the keys of a legacy file).
+
+    Keys are cached by remote path and only returned while the size and modification time of
+    the remote file are unchanged. They are overwritten with zeros when they are evicted or
+    the cache is cleared, and expired keys at the next get or put of any file, so keys are
+    kept past their expiry only while the cache is not used. Copies handed out by get are
+    regular bytes objects and are left to the garbage collector.
+    """
+
+    def __init__(self, ttl: float = 900.0, maxEntries: int = 256) -> None:
+        self.ttl = ttl
+        self.maxEntries = maxEntries
+        self.entries: "OrderedDict[str, _CachedKeys]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, remotePath: str, facts: Tuple[str, str]) -> Optional[bytes]:
+        """
+        Get the keys of a remote file.
+
+        parameters
+        ----------
+        remotePath: str
+            Path of the file on the server
+        facts: Tuple[str, str]
+            Size and modification time of the file on the server
+
+        returns
+        -------
+        Optional[bytes]
+            The unwrapped keys, None if they are not cached, expired or the file changed
+        """
+
+        with self.lock:
+            self._sweep()
+            entry = self.entries.get(remotePath)
+            if entry is None:
+                return None
+
+            if (entry.size, entry.modified) != facts:
+                self._evict(remotePath)
+                return None
+
+            self.entries.move_to_end(remotePath)
+            return bytes(entry.keys)
+
+    def put(self, remotePath: str, facts: Tuple[str, str], keys: bytes) -> None:
+        """
+        Cache the keys of a remote file.
+
+        parameters
+        ----------
+        remotePath: str
+            Path of the file on the server
+        facts: Tuple[str, str]
+            Size and modification time of the file on the server
+        keys: bytes
+            The unwrapped keys
+        """
+
+        with self.lock:
+            self._sweep()
+            if remotePath in self.entries:
+                self._evict(remotePath)
+
+            size, modified = facts
+            self.entries[remotePath] = _CachedKeys(
+                size, modified, keys, time.monotonic() + self.ttl
+            )
+            while len(self.entries) > self.maxEntries:
+                self._evict(next(iter(self.entries)))
+
+    def discard(self, remotePath: str) -> None:
+        """
+        Wipe the keys of a remote file, if cached.
+
+        parameters
+        ----------
+        remotePath: str
+            Path of the file on the server
+        """
+
+        with self.lock:
+            if remotePath in self.entries:
+                self._evict(remotePath)
+
+    def clear(self) -> None:
+        """
+        Wipe all the cached keys.
+        """
+
+        with self.lock:
+            for entry in self.entries.values():
+                entry.wipe()
+            self.entries.clear()
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for remotePath in [path for path, entry in self.entries.items() if entry.expiresAt < now]:
+            self._evict(remotePath)
+
+    def _evict(self, remotePath: str) -> None:
+        self.entries.pop(remotePath).wipe()
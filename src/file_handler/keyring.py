@@ -0,0 +1,203 @@
+"""
+Keyring module.
+"""
+
+import os
+from typing import Dict, List, Optional
+
+from src.cipher.RSA import RSACipher, splitKeys
+from src.metrics import timed
+
+from .container import KeyEnvelope
+
+DEFAULT_KEYRING_DIRECTORY = os.path.join(os.path.expanduser("~"), ".secure_ftp", "keyring")
+
+
+class Keyring:
+    """
+    Local keyring of RSA public and private keys indexed by fingerprint.
+
+    Envelopes of containers record the fingerprint of the key which wrapped them, so the
+    private key able to unwrap a file is found with a single lookup instead of trying every
+    key. Keys are parsed once when they are added.
+    """
+
+    def __init__(self) -> None:
+        self.privateKeys: Dict[bytes, RSACipher] = {}
+        self.publicKeys: Dict[bytes, RSACipher] = {}
+        self.fingerprints: Dict[bytes, bytes] = {}
+
+    def addKey(self, key: bytes) -> bytes:
+        """
+        Add a public or private key to the keyring.
+
+        parameters
+        ----------
+        key: bytes
+            PEM encoded key
+
+        returns
+        -------
+        bytes
+            Fingerprint of the key
+        """
+
+        fingerprint = self.fingerprints.get(key)
+        if fingerprint is not None:
+            return fingerprint
+
+        rsaCipher = RSACipher(key)
+        fingerprint = rsaCipher.fingerprint()
+        if rsaCipher.key.has_private():
+            self.privateKeys[fingerprint] = rsaCipher
+        else:
+            self.publicKeys[fingerprint] = rsaCipher
+
+        self.fingerprints[key] = fingerprint
+        return fingerprint
+
+    def addKeys(self, keys: bytes) -> List[bytes]:
+        """
+        Add one or more PEM encoded keys given together.
+
+        parameters
+        ----------
+        keys: bytes
+            PEM encoded keys
+
+        returns
+        -------
+        List[bytes]
+            Fingerprints of the keys
+        """
+
+        return [self.addKey(key) for key in splitKeys(keys)]
+
+    def loadDirectory(self, directory: str) -> int:
+        """
+        Add all the .pem keys of a directory, files which are not keys are skipped.
+
+        parameters
+        ----------
+        directory: str
+            Path to the directory
+
+        returns
+        -------
+        int
+            Number of keys added
+        """
+
+        if not os.path.isdir(directory):
+            return 0
+
+        count = 0
+        for fileName in sorted(os.listdir(directory)):
+            if not fileName.endswith(".pem"):
+                continue
+            with open(os.path.join(directory, fileName), "rb") as file:
+                try:
+                    count += len(self.addKeys(file.read()))
+                except ValueError:
+                    continue
+        return count
+
+    def privateKey(self, fingerprint: bytes) -> Optional[RSACipher]:
+        """
+        Get a private key by fingerprint.
+
+        parameters
+        ----------
+        fingerprint: bytes
+            Fingerprint of the key
+
+        returns
+        -------
+        Optional[RSACipher]
+            The private key, None if it is not in the keyring
+        """
+
+        return self.privateKeys.get(fingerprint)
+
+    def publicKey(self, fingerprint: bytes) -> Optional[RSACipher]:
+        """
+        Get a public key by fingerprint, private keys are returned for their public key.
+
+        parameters
+        ----------
+        fingerprint: bytes
+            Fingerprint of the key
+
+        returns
+        -------
+        Optional[RSACipher]
+            The key, None if it is not in the keyring
+        """
+
+        return self.publicKeys.get(fingerprint) or self.privateKeys.get(fingerprint)
+
+    @timed("keyring.unwrap")
+    def unwrap(self, wrappedKeys: bytes, keyId: bytes = b"") -> bytes:
+        """
+        Unwrap the keys of a file.
+
+        parameters
+        ----------
+        wrappedKeys: bytes
+            RSA wrapped keys
+        keyId: bytes
+            Fingerprint of the key which wrapped the keys, every private key is tried
+            when it is empty (envelopes written before key ids were recorded)
+
+        returns
+        -------
+        bytes
+            Keys of the file
+        """
+
+        if keyId:
+            rsaCipher = self.privateKey(keyId)
+            if rsaCipher is None:
+                raise ValueError("No private key for this file in the keyring")
+            return rsaCipher.decrypt(wrappedKeys)
+
+        for rsaCipher in self.privateKeys.values():
+            try:
+                return rsaCipher.decrypt(wrappedKeys)
+            except ValueError:
+                continue
+        raise ValueError("No private key in the keyring can decrypt this file")
+
+    def unwrapEnvelopes(self, envelopes: List[KeyEnvelope]) -> bytes:
+        """
+        Unwrap the keys of a container, the private key of an envelope is looked up by the
+        key id of the envelope. Each envelope of a key of the keyring is tried in turn, then
+        the envelopes without key id, so a corrupted envelope does not hide the others.
+
+        parameters
+        ----------
+        envelopes: List[KeyEnvelope]
+            Envelopes of the container
+
+        returns
+        -------
+        bytes
+            Keys of the file
+        """
+
+        candidates = [
+            envelope
+            for envelope in envelopes
+            if envelope.keyId and self.privateKey(envelope.keyId) is not None
+        ]
+        candidates += [envelope for envelope in envelopes if not envelope.keyId]
+
+        error: Optional[ValueError] = None
+        for envelope in candidates:
+            try:
+                return self.unwrap(envelope.wrappedKeys, envelope.keyId)
+            except ValueError as exp:
+                error = exp
+        if error is not None:
+            raise ValueError("No envelope of the file could be unwrapped") from error
+        raise ValueError("File is not shared with any key of the keyring")
@@ -0,0 +1,196 @@
+"""
+This module holds the ftplib clients of the sessions: plain FTP and explicit FTPS clients
+which size the socket buffers of data connections, and the cache of the TLS sessions they
+resume.
+"""
+import ftplib
+import socket
+import ssl
+import threading
+from typing import Callable, Dict, Optional, Tuple, Union
+
+
+class TLSSessionCache:
+    """
+    TLS sessions of the last connection to each server, shared by all the connections
+    made with the same TLS context so a new connection resumes the session instead of
+    doing a full handshake.
+    """
+
+    def __init__(self, context: Optional[ssl.SSLContext] = None) -> None:
+        self.context = context if context is not None else ssl.create_default_context()
+        self.sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+        self.lock = threading.Lock()
+
+    def get(self, host: str, port: int) -> Optional[ssl.SSLSession]:
+        """
+        Get the last session to a server.
+
+        Parameters
+        ----------
+        host : str
+            host of the server
+        port : int
+            port of the server
+        Returns
+        -------
+        Optional[ssl.SSLSession]
+            the session, None if there is no connection to the server yet
+        """
+
+        with self.lock:
+            return self.sessions.get((host, port))
+
+    def put(self, host: str, port: int, session: Optional[ssl.SSLSession]) -> None:
+        """
+        Remember the session of a connection to a server.
+
+        Parameters
+        ----------
+        host : str
+            host of the server
+        port : int
+            port of the server
+        session : Optional[ssl.SSLSession]
+            the session, ignored if None (no session ticket received yet)
+        """
+
+        if session is None:
+            return
+        with self.lock:
+            self.sessions[(host, port)] = session
+
+
+_DEFAULT_SESSION_CACHE: Optional[TLSSessionCache] = None
+
+
+def defaultSessionCache() -> TLSSessionCache:
+    """
+    TLS session cache shared by the connections which are not given their own.
+
+    Returns
+    -------
+    TLSSessionCache
+        the shared session cache
+    """
+
+    global _DEFAULT_SESSION_CACHE  # pylint: disable=W0603
+    if _DEFAULT_SESSION_CACHE is None:
+        _DEFAULT_SESSION_CACHE = TLSSessionCache()
+    return _DEFAULT_SESSION_CACHE
+
+
+def _tuneSocket(sock: socket.socket, bufferSize: int) -> None:
+    if bufferSize <= 0:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, bufferSize)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, bufferSize)
+    except OSError:
+        # the buffer size is a hint, the system defaults are kept if it is refused
+        pass
+
+
+class _TypeCachingFTP(ftplib.FTP):
+    """
+    FTP client which sends a TYPE command only when it changes the transfer type, so a
+    series of binary transfers does not pay a round trip per transfer to set the type.
+    """
+
+    transferType = ""
+    typeResponse = ""
+
+    def connect(
+        self,
+        host: str = "",
+        port: int = 0,
+        timeout: float = -999,
+        source_address: Optional[Tuple[str, int]] = None,
+    ) -> str:
+        # a new control connection starts in the default type of the server
+        self.transferType = ""
+        return super().connect(host, port, timeout, source_address)
+
+    def sendcmd(self, cmd: str) -> str:
+        return self._typeCommand(cmd, super().sendcmd)
+
+    def voidcmd(self, cmd: str) -> str:
+        return self._typeCommand(cmd, super().voidcmd)
+
+    def _typeCommand(self, cmd: str, send: Callable[[str], str]) -> str:
+        if not cmd.upper().startswith("TYPE "):
+            return send(cmd)
+        transferType = cmd[5:].strip().upper()
+        if transferType == self.transferType:
+            return self.typeResponse
+        self.transferType = ""
+        self.typeResponse = send(cmd)
+        self.transferType = transferType
+        return self.typeResponse
+
+
+class TunedFTP(_TypeCachingFTP):
+    """
+    FTP client which sizes the socket buffers of data connections.
+    """
+
+    socketBufferSize = 0
+
+    def ntransfercmd(
+        self, cmd: str, rest: Union[int, str, None] = None
+    ) -> Tuple[socket.socket, int]:
+        conn, size = super().ntransfercmd(cmd, rest)
+        _tuneSocket(conn, self.socketBufferSize)
+        return conn, size
+
+
+class SessionReusingFTPTLS(_TypeCachingFTP, ftplib.FTP_TLS):
+    """
+    Explicit FTPS client which resumes TLS sessions. Data connections resume the session of
+    the control connection, and the control connection resumes the last session to the same
+    server, so only the first connection to a server does a full handshake.
+    """
+
+    socketBufferSize = 0
+
+    def __init__(self, sessionCache: TLSSessionCache) -> None:
+        super().__init__(context=sessionCache.context)
+        self.sessionCache = sessionCache
+        self.handshakes = 0
+        self.resumedHandshakes = 0
+
+    def auth(self) -> str:
+        if isinstance(self.sock, ssl.SSLSocket):
+            raise ValueError("Already using TLS")
+        response = self.voidcmd("AUTH TLS")
+        self.sock = self._wrap(
+            self.sock, self.sessionCache.get(self.host, self.port)  # type: ignore
+        )
+        self.file = self.sock.makefile(mode="r", encoding=self.encoding)
+        return response
+
+    def ntransfercmd(
+        self, cmd: str, rest: Union[int, str, None] = None
+    ) -> Tuple[socket.socket, int]:
+        conn, size = ftplib.FTP.ntransfercmd(self, cmd, rest)
+        _tuneSocket(conn, self.socketBufferSize)
+        if self._prot_p:  # type: ignore
+            controlSession = self.sock.session  # type: ignore
+            conn = self._wrap(conn, controlSession)
+            self.sessionCache.put(self.host, self.port, controlSession)
+        return conn, size
+
+    def rememberSession(self) -> None:
+        """
+        Share the session of the control connection with the next connections to the server.
+        """
+
+        if isinstance(self.sock, ssl.SSLSocket):
+            self.sessionCache.put(self.host, self.port, self.sock.session)
+
+    def _wrap(self, sock: socket.socket, session: Optional[ssl.SSLSession]) -> ssl.SSLSocket:
+        wrapped = self.context.wrap_socket(sock, server_hostname=self.host, session=session)
+        self.handshakes += 1
+        if wrapped.session_reused:
+            self.resumedHandshakes += 1
+        return wrapped
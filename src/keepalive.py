@@ -0,0 +1,181 @@
+"""
+This module keeps the FTP sessions alive: a background thread sends a NOOP on the sessions
+which have been idle for their keepalive interval, and the operations of a session reconnect
+it when the server dropped the control connection.
+"""
+import ftplib
+import threading
+import time
+import weakref
+from functools import wraps
+from typing import Any, Callable, Optional, Protocol, Tuple, Type, TypeVar, cast
+
+# idle seconds after which a session sends a NOOP so the server does not drop it
+DEFAULT_KEEPALIVE_INTERVAL = 60.0
+
+_Method = TypeVar("_Method", bound=Callable[..., Any])
+
+
+class KeptSession(Protocol):
+    """
+    Session kept alive, FTPConnectionModel.
+    """
+
+    keepAliveInterval: float
+    lastActivity: Optional[float]
+    credentials: Optional[Tuple[str, str]]
+    lock: "threading.RLock"
+
+    def keepAlive(self) -> bool:
+        """
+        Send a NOOP, and reconnect if the server dropped the session.
+
+        Returns
+        -------
+        bool
+            whether the session was refreshed
+        """
+
+    def reconnect(self) -> str:
+        """
+        Reconnect, log in again and return to the working directory.
+
+        Returns
+        -------
+        str
+            server response
+        """
+
+
+def connectionLost(exp: Optional[BaseException]) -> bool:
+    """
+    Whether an error, or one of its causes, means the server dropped the control connection.
+
+    Parameters
+    ----------
+    exp : Optional[BaseException]
+        error raised by an operation
+    Returns
+    -------
+    bool
+        True for an end of file, a reset connection or a 421 reply
+    """
+
+    while exp is not None:
+        if isinstance(exp, (EOFError, ConnectionError)):
+            return True
+        if isinstance(exp, ftplib.error_temp) and str(exp).startswith("421"):
+            return True
+        exp = exp.__cause__
+    return False
+
+
+def reconnecting(idempotent: bool, error: Type[Exception]) -> Callable[[_Method], _Method]:
+    """
+    Decorator running an operation of a session under its lock and recording its end for the
+    keepalive. When the server dropped the connection, the session is reconnected and an
+    idempotent operation is retried once, the others raise as they may have been done.
+    Operations called by another operation of the same session are run as they are.
+
+    Parameters
+    ----------
+    idempotent : bool
+        whether the operation can be run again
+    error : Type[Exception]
+        raised by an operation which is not retried, with the connection error as cause
+    Returns
+    -------
+    Callable[[_Method], _Method]
+        the decorator
+    """
+
+    def decorator(func: _Method) -> _Method:
+        @wraps(func)
+        def wrapper(self: KeptSession, *args: Any, **kwargs: Any) -> Any:
+            with self.lock:
+                if self.lastActivity is None:
+                    return func(self, *args, **kwargs)
+                self.lastActivity = None
+                try:
+                    try:
+                        return func(self, *args, **kwargs)
+                    except Exception as exp:  # pylint: disable=W0703
+                        if self.credentials is None or not connectionLost(exp):
+                            raise
+                        self.reconnect()
+                        if not idempotent:
+                            raise error(
+                                f"Connection lost during {func.__name__}, reconnected: {exp}"
+                            ) from exp
+                    return func(self, *args, **kwargs)
+                finally:
+                    self.lastActivity = time.monotonic()
+
+        return cast(_Method, wrapper)
+
+    return decorator
+
+
+class KeepAlive:
+    """
+    Background thread refreshing the idle sessions, so the first operation after a pause has
+    no reconnect delay. Sessions are held by weak references.
+    """
+
+    def __init__(self) -> None:
+        self.sessions: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        self.condition = threading.Condition()
+        self.thread: Optional[threading.Thread] = None
+
+    def register(self, session: KeptSession) -> None:
+        """
+        Keep a session alive until it is unregistered.
+
+        Parameters
+        ----------
+        session : KeptSession
+            logged in session
+        """
+
+        with self.condition:
+            self.sessions.add(session)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="ftp-keepalive", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def unregister(self, session: KeptSession) -> None:
+        """
+        Stop keeping a session alive.
+
+        Parameters
+        ----------
+        session : KeptSession
+            closed session
+        """
+
+        with self.condition:
+            self.sessions.discard(session)
+
+    def _run(self) -> None:
+        while True:
+            with self.condition:
+                while not self.sessions:
+                    self.condition.wait()
+                sessions = list(self.sessions)
+            interval = min(session.keepAliveInterval for session in sessions)
+            now = time.monotonic()
+            for session in sessions:
+                lastActivity = session.lastActivity
+                if lastActivity is not None and now - lastActivity >= session.keepAliveInterval:
+                    try:
+                        session.keepAlive()
+                    except Exception:  # pylint: disable=W0703
+                        # the server is unreachable, the next operation reports it
+                        pass
+            # closed sessions are only held by the set once the list is dropped
+            del sessions
+            time.sleep(min(max(interval / 4, 0.05), 1.0))
+
+
+KEEPALIVE = KeepAlive()
@@ -2,19 +2,94 @@
 Main module of the application.
 """
 
+import argparse
+import os
+from typing import List, Optional
+
+from .metrics import REGISTRY
+from .profiling import DEFAULT_PROFILE_DIRECTORY, PROFILER
 from .view import FTPClientGui
 from .presenter import FTPClientPresenter
 from .model import FTPConnectionModel
+from .file_handler.download_cache import DownloadCache, DEFAULT_CACHE_BUDGET
+from .file_handler.keyring import Keyring, DEFAULT_KEYRING_DIRECTORY
+from .remote_index import RemoteIndex
+from .striped_storage import loadStripedStorage
+
+
+def parseArguments(arguments: Optional[List[str]] = None) -> argparse.Namespace:
+    """
+    Parse the command line of the application.
+
+    Parameters
+    ----------
+    arguments : Optional[List[str]]
+        arguments to parse, the command line if None
+    Returns
+    -------
+    argparse.Namespace
+        parsed arguments
+    """
+    parser = argparse.ArgumentParser(description="Secure FTP client")
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=DEFAULT_PROFILE_DIRECTORY,
+        metavar="DIRECTORY",
+        help="profile each operation (CPU of the calling thread only, memory of all threads), "
+        f"reports are written to DIRECTORY ({DEFAULT_PROFILE_DIRECTORY} by default)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_BUDGET // (1024 * 1024),
+        metavar="MIB",
+        help="size of the cache of downloaded files, in MiB, 0 to disable it "
+        f"({DEFAULT_CACHE_BUDGET // (1024 * 1024)} by default)",
+    )
+    parser.add_argument(
+        "--stripe-servers",
+        metavar="FILE",
+        help="stripe the uploaded files over the servers configured in FILE (JSON), "
+        "downloads are rebuilt from their stripes",
+    )
+    return parser.parse_args(arguments)
 
 
 def main() -> None:
     """
     Main function of the application.
+    Metrics are recorded when SECURE_FTP_METRICS names a directory, they are written there
+    as metrics.json and metrics.prom when the application exits.
     """
+    arguments = parseArguments()
+    if arguments.profile is not None:
+        PROFILER.directory = arguments.profile
+        PROFILER.enabled = True
+
+    metricsDirectory = os.environ.get("SECURE_FTP_METRICS", "")
+    REGISTRY.enabled = bool(metricsDirectory)
+
     view = FTPClientGui()
     model = FTPConnectionModel()
-    presenter = FTPClientPresenter(model, view)
-    presenter.run()
+    keyring = Keyring()
+    keyring.loadDirectory(DEFAULT_KEYRING_DIRECTORY)
+    downloadCache = None
+    if arguments.cache_size > 0:
+        downloadCache = DownloadCache(budget=arguments.cache_size * 1024 * 1024)
+    stripedStorage = None
+    if arguments.stripe_servers is not None:
+        stripedStorage = loadStripedStorage(arguments.stripe_servers)
+    presenter = FTPClientPresenter(
+        model, view, keyring, RemoteIndex(), downloadCache, stripedStorage
+    )
+    try:
+        presenter.run()
+    finally:
+        if metricsDirectory:
+            os.makedirs(metricsDirectory, exist_ok=True)
+            REGISTRY.writeJson(os.path.join(metricsDirectory, "metrics.json"))
+            REGISTRY.writePrometheus(os.path.join(metricsDirectory, "metrics.prom"))
 
 
 if __name__ == "__main__":
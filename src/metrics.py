@@ -0,0 +1,390 @@
+"""
+This module records metrics of the operations of the client: latency histograms and error
+counters of the model, cipher and presenter operations, and bytes and time of the cipher
+stages. The last operations are kept as spans (name, parent operation, thread, duration).
+
+Recording is disabled by default, an instrumented call then costs a single attribute check.
+Metrics are exported as a JSON snapshot or as a Prometheus text format file.
+"""
+import inspect
+import json
+import threading
+import time
+from collections import deque
+from functools import wraps
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Sequence, Type, TypeVar, cast
+
+from src.cipher.engine import Buffer, StreamTransform
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+_Function = TypeVar("_Function", bound=Callable[..., Any])
+_Class = TypeVar("_Class")
+
+
+class Span(NamedTuple):
+    """
+    Operation recorded by the registry.
+    """
+
+    name: str
+    parent: str
+    thread: str
+    start: float
+    seconds: float
+    failed: bool
+
+
+class Histogram:
+    """
+    Latency histogram with fixed buckets, and counter of the failed operations.
+    """
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.failures = 0
+
+    def observe(self, seconds: float, failed: bool = False) -> None:
+        """
+        Record the duration of an operation.
+
+        Parameters
+        ----------
+        seconds : float
+            duration of the operation
+        failed : bool
+            whether the operation raised
+        """
+
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.failures += failed
+
+    def asDict(self) -> Dict[str, Any]:
+        """
+        Histogram as plain values.
+
+        Returns
+        -------
+        Dict[str, Any]
+            count, sum, failures and cumulative counts by upper bound
+        """
+
+        cumulative, buckets = 0, {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "failures": self.failures,
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """
+    Registry of the metrics of the client, safe to use from several threads.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS, maxSpans: int = 1000) -> None:
+        self.enabled = False
+        self.buckets = buckets
+        self.operations: Dict[str, Histogram] = {}
+        self.stages: Dict[str, List[float]] = {}
+        self.spans: Deque[Span] = deque(maxlen=maxSpans)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def call(self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Call a function and record it as an operation, its parent is the operation running
+        in the same thread.
+
+        Parameters
+        ----------
+        name : str
+            name of the operation
+        func : Callable[..., Any]
+            function to call
+        Returns
+        -------
+        Any
+            result of the function
+        """
+
+        stack: List[str] = self.local.__dict__.setdefault("stack", [])
+        parent = stack[-1] if stack else ""
+        stack.append(name)
+        failed = False
+        start, wallStart = time.perf_counter(), time.time()
+        try:
+            return func(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            with self.lock:
+                histogram = self.operations.get(name)
+                if histogram is None:
+                    histogram = self.operations[name] = Histogram(self.buckets)
+                histogram.observe(seconds, failed)
+                self.spans.append(
+                    Span(name, parent, threading.current_thread().name, wallStart, seconds, failed)
+                )
+
+    def recordStage(self, stage: str, byteCount: int, seconds: float) -> None:
+        """
+        Record the bytes processed by a cipher stage.
+
+        Parameters
+        ----------
+        stage : str
+            name of the stage, for instance encrypt.aes-gcm
+        byteCount : int
+            bytes processed
+        seconds : float
+            processing time
+        """
+
+        with self.lock:
+            totals = self.stages.setdefault(stage, [0.0, 0.0])
+            totals[0] += byteCount
+            totals[1] += seconds
+
+    def reset(self) -> None:
+        """
+        Forget all the recorded metrics.
+        """
+
+        with self.lock:
+            self.operations.clear()
+            self.stages.clear()
+            self.spans.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Recorded metrics as plain values.
+
+        Returns
+        -------
+        Dict[str, Any]
+            operations (histograms), stages (bytes, seconds and throughput) and spans
+        """
+
+        with self.lock:
+            return {
+                "operations": {
+                    name: histogram.asDict() for name, histogram in self.operations.items()
+                },
+                "stages": {
+                    stage: {
+                        "bytes": int(byteCount),
+                        "seconds": seconds,
+                        "throughput": byteCount / seconds if seconds > 0 else None,
+                    }
+                    for stage, (byteCount, seconds) in self.stages.items()
+                },
+                "spans": [span._asdict() for span in self.spans],
+            }
+
+    def prometheusText(self) -> str:
+        """
+        Recorded metrics in the Prometheus text exposition format.
+
+        Returns
+        -------
+        str
+            the metrics
+        """
+
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP secure_ftp_operation_seconds Duration of the client operations.",
+            "# TYPE secure_ftp_operation_seconds histogram",
+        ]
+        for name, histogram in sorted(snapshot["operations"].items()):
+            label = f'operation="{_escapeLabel(name)}"'
+            for bound, count in histogram["buckets"].items():
+                lines.append(f'secure_ftp_operation_seconds_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f"secure_ftp_operation_seconds_sum{{{label}}} {histogram['sum']}")
+            lines.append(f"secure_ftp_operation_seconds_count{{{label}}} {histogram['count']}")
+
+        lines += [
+            "# HELP secure_ftp_operation_failures_total Client operations which raised.",
+            "# TYPE secure_ftp_operation_failures_total counter",
+        ]
+        for name, histogram in sorted(snapshot["operations"].items()):
+            label = f'operation="{_escapeLabel(name)}"'
+            lines.append(f"secure_ftp_operation_failures_total{{{label}}} {histogram['failures']}")
+
+        for metric, key, description in (
+            ("secure_ftp_stage_bytes_total", "bytes", "Bytes processed by the cipher stages."),
+            ("secure_ftp_stage_seconds_total", "seconds", "Time spent in the cipher stages."),
+        ):
+            lines += [f"# HELP {metric} {description}", f"# TYPE {metric} counter"]
+            for stage, totals in sorted(snapshot["stages"].items()):
+                lines.append(f'{metric}{{stage="{_escapeLabel(stage)}"}} {totals[key]}')
+
+        return "\n".join(lines) + "\n"
+
+    def writeJson(self, path: str) -> None:
+        """
+        Write the JSON snapshot to a file.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        """
+
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=2)
+
+    def writePrometheus(self, path: str) -> None:
+        """
+        Write the metrics in the Prometheus text format to a file, for instance for the
+        textfile collector of the node exporter.
+
+        Parameters
+        ----------
+        path : str
+            path of the file
+        """
+
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.prometheusText())
+
+
+REGISTRY = MetricsRegistry()
+
+
+def _escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def timed(name: str) -> Callable[[_Function], _Function]:
+    """
+    Decorator recording the calls of a function as an operation of the registry.
+
+    Parameters
+    ----------
+    name : str
+        name of the operation
+    Returns
+    -------
+    Callable[[_Function], _Function]
+        the decorator
+    """
+
+    def decorator(func: _Function) -> _Function:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not REGISTRY.enabled:
+                return func(*args, **kwargs)
+            return REGISTRY.call(name, func, *args, **kwargs)
+
+        return cast(_Function, wrapper)
+
+    return decorator
+
+
+def instrumented(prefix: str) -> Callable[[Type[_Class]], Type[_Class]]:
+    """
+    Class decorator recording the calls of all the public methods of a class, the operations
+    are named <prefix>.<method>.
+
+    Parameters
+    ----------
+    prefix : str
+        prefix of the operation names
+    Returns
+    -------
+    Callable[[Type[_Class]], Type[_Class]]
+        the decorator
+    """
+
+    def decorator(cls: Type[_Class]) -> Type[_Class]:
+        for name, member in list(vars(cls).items()):
+            if not name.startswith("_") and inspect.isfunction(member):
+                setattr(cls, name, timed(f"{prefix}.{name}")(member))
+        return cls
+
+    return decorator
+
+
+def measured(stage: str, transform: StreamTransform) -> StreamTransform:
+    """
+    Record the bytes and processing time of a stream transform as a cipher stage.
+
+    Parameters
+    ----------
+    stage : str
+        name of the stage
+    transform : StreamTransform
+        transform to measure
+    Returns
+    -------
+    StreamTransform
+        the transform itself when the registry is disabled
+    """
+
+    return _MeasuredTransform(stage, transform) if REGISTRY.enabled else transform
+
+
+class _MeasuredTransform(StreamTransform):
+    """
+    Stream transform recording the bytes and time of another one.
+    """
+
+    def __init__(self, stage: str, transform: StreamTransform) -> None:
+        self.stage = stage
+        self.transform = transform
+        self.byteCount = 0
+        self.seconds = 0.0
+
+    def update(self, data: Buffer) -> bytes:
+        """
+        Process the next buffer of the stream
+
+        Parameters
+        ----------
+        data : Buffer
+            next buffer of the stream
+        Returns
+        -------
+        bytes
+            output of the measured transform
+        """
+
+        start = time.perf_counter()
+        processed = self.transform.update(data)
+        self.seconds += time.perf_counter() - start
+        self.byteCount += len(data)
+        return processed
+
+    def finalize(self) -> bytes:
+        """
+        Finish the stream and record the stage
+
+        Returns
+        -------
+        bytes
+            output of the measured transform
+        """
+
+        start = time.perf_counter()
+        try:
+            return self.transform.finalize()
+        finally:
+            self.seconds += time.perf_counter() - start
+            REGISTRY.recordStage(self.stage, self.byteCount, self.seconds)
@@ -3,7 +3,23 @@ This module connects to the FTP server and responsible for all operation on it.
 """
 import ftplib
 import os
-from typing import List
+import posixpath
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Protocol, Sequence, Tuple, Union
+
+from src.cipher.engine import Buffer, StreamTransform
+from .ftp_client import SessionReusingFTPTLS, TLSSessionCache, TunedFTP, defaultSessionCache
+from .keepalive import DEFAULT_KEEPALIVE_INTERVAL, KEEPALIVE, reconnecting
+from .metrics import instrumented
+from .transfer_control import DOWNLOAD, UPLOAD, AdaptiveTransferController, BufferPool, Throttle
+
+
+# commands sent ahead of their replies, small enough for the replies to fit the socket buffers
+DEFAULT_PIPELINE_WINDOW = 128
 
 
 class FTPError(Exception):
@@ -24,16 +40,132 @@ class NotAuthorized(Exception):
     """
 
 
-class FTPConnectionModel:
+class RangeVerifier(Protocol):
+    """
+    Verifies the data of a download as it is received, for instance against the hash tree
+    of a container.
+    """
+
+    def align(self, offset: int) -> int:
+        """
+        Move a segment boundary of a segmented download back to an offset where a range
+        can be verified on its own.
+
+        Parameters
+        ----------
+        offset : int
+            offset in the file
+        Returns
+        -------
+        int
+            aligned offset
+        """
+
+    def rangeCheck(self, offset: int, length: int) -> StreamTransform:
+        """
+        Create the check of a range, fed with the received data. Its update and finalize
+        raise ValueError on invalid data.
+
+        Parameters
+        ----------
+        offset : int
+            offset of the range, as given by align
+        length : int
+            length of the range
+        Returns
+        -------
+        StreamTransform
+            the check
+        """
+
+
+def _sendFile(
+    conn: socket.socket,
+    file: BinaryIO,
+    blockSize: int,
+    throttle: Optional[Throttle] = None,
+    length: Optional[int] = None,
+) -> None:
+    # plain connections hand the file to the kernel (zero copy sendfile, socket.sendfile falls
+    # back to send where it is not supported), TLS connections encrypt it in user space.
+    # A throttled upload, or a part of a file, is sent one block at a time.
+    if not isinstance(conn, ssl.SSLSocket) and throttle is None and length is None:
+        conn.sendfile(file)
+        return
+
+    remaining = length
+    while remaining is None or remaining > 0:
+        count = blockSize if remaining is None else min(blockSize, remaining)
+        if isinstance(conn, ssl.SSLSocket):
+            block = file.read(count)
+            conn.sendall(block)
+            sent = len(block)
+        else:
+            sent = conn.sendfile(file, file.tell(), count)
+        if not sent:
+            break
+        if remaining is not None:
+            remaining -= sent
+        if throttle is not None:
+            throttle(sent)
+
+
+def _checked(
+    receive: Callable[[Buffer], Any], check: Optional[StreamTransform]
+) -> Callable[[Buffer], Any]:
+    if check is None:
+        return receive
+    rangeCheck = check
+
+    def checkedReceive(block: Buffer) -> None:
+        rangeCheck.update(block)
+        receive(block)
+
+    return checkedReceive
+
+
+def _preallocate(file: BinaryIO, size: int) -> None:
+    # reserve the blocks of the file up front so the file system does not grow it block by
+    # block while it is written, the size is only set where fallocate is not available
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(file.fileno(), 0, size)
+            return
+        except OSError:
+            pass
+    file.truncate(size)
+
+
+@instrumented("model")
+class FTPConnectionModel:  # pylint: disable=R0902,R0904
     """
     FTP Connection class is useed to connect to the FTP server.
     responsible for all FTP operations.
-    """
 
-    def __init__(self) -> None:
-        self.ftp = ftplib.FTP()
+    Once logged in, an idle session is kept alive with NOOP and a dropped session reconnects
+    to its working directory (see keepalive). Operations are serialized by its lock.
+    """
 
-    def connect(self, ipAddress: str, port: int) -> str:
+    def __init__(
+        self,
+        sessionCache: Optional[TLSSessionCache] = None,
+        controller: Optional[AdaptiveTransferController] = None,
+        bufferPool: Optional[BufferPool] = None,
+        keepAliveInterval: float = DEFAULT_KEEPALIVE_INTERVAL,
+    ) -> None:
+        self.ftp: Union[TunedFTP, SessionReusingFTPTLS] = TunedFTP()
+        self.sessionCache = sessionCache
+        self.controller = controller if controller is not None else AdaptiveTransferController()
+        self.workingDirectory = "/"
+        self.address: Optional[Tuple[str, int, bool]] = None
+        self.credentials: Optional[Tuple[str, str]] = None
+        self.bufferPool = bufferPool if bufferPool is not None else BufferPool()
+        self.keepAliveInterval = keepAliveInterval
+        self.lock = threading.RLock()
+        # end of the last operation, None while an operation runs
+        self.lastActivity: Optional[float] = time.monotonic()
+
+    def connect(self, ipAddress: str, port: int, useTls: bool = False) -> str:
         """
         Connect to the FTP server.
 
@@ -43,15 +175,31 @@ class FTPConnectionModel:
             ip address of the ftp server
         port : int
             port number of the ftp server
+        useTls : bool
+            secure the connection with explicit TLS (AUTH TLS), data connections
+            are protected too (PROT P) and resume the TLS session of the control connection
         Returns
         -------
         str
             server response
         """
 
+        if useTls:
+            if self.sessionCache is None:
+                self.sessionCache = defaultSessionCache()
+            self.ftp = SessionReusingFTPTLS(self.sessionCache)
+        elif isinstance(self.ftp, ftplib.FTP_TLS):
+            self.ftp = TunedFTP()
+
         try:
-            return self.ftp.connect(ipAddress, port)
-        except OSError as exp:
+            response = self.ftp.connect(ipAddress, port)
+            if isinstance(self.ftp, ftplib.FTP_TLS):
+                response += "\n" + self.ftp.auth()
+            self.address = (ipAddress, port, useTls)
+            return response
+        except (OSError, ftplib.Error) as exp:
+            # the socket is open when the server refused the connection in its welcome
+            self.ftp.close()
             errMsg = f"Unable to connect to {ipAddress}:{port}"
             raise UnableToConnect(errMsg) from exp
 
@@ -72,11 +220,23 @@ class FTPConnectionModel:
         """
 
         try:
-            return self.ftp.login(username, password)
+            response = self.ftp.login(username, password)
+            if isinstance(self.ftp, SessionReusingFTPTLS):
+                self.ftp.prot_p()
+                self.ftp.rememberSession()
+            start = time.perf_counter()
+            self.workingDirectory = self.ftp.pwd()
+            self.controller.recordRoundTrip(time.perf_counter() - start)
+            self.credentials = (username, password)
+            self.lastActivity = time.monotonic()
+            if self.keepAliveInterval > 0:
+                KEEPALIVE.register(self)
+            return response
         except ftplib.error_perm as exp:
             errMsg = f"Unable to login with {username}:{password}"
             raise NotAuthorized(errMsg) from exp
 
+    @reconnecting(idempotent=True, error=FTPError)
     def displayDirectory(self) -> List[str]:
         """
         Display the directory on the FTP client.
@@ -89,6 +249,72 @@ class FTPConnectionModel:
 
         return self.ftp.nlst()
 
+    @reconnecting(idempotent=True, error=FTPError)
+    def listDirectory(self, directoryName: str) -> List[Tuple[str, Dict[str, str]]]:
+        """
+        List a directory with the facts of its entries (MLSD), without changing the working
+        directory.
+
+        Parameters
+        ----------
+        directoryName : str
+            absolute path or path relative to the working directory
+        Returns
+        -------
+        List[Tuple[str, Dict[str, str]]]
+            name and facts (lower case names, type is file or dir) of each entry,
+            without the directory itself and its parent
+        """
+
+        try:
+            return [
+                (name, facts)
+                for name, facts in self.ftp.mlsd(directoryName)
+                if facts.get("type", "").lower() not in ("cdir", "pdir")
+            ]
+        except ftplib.error_perm as exp:
+            raise FTPError(exp) from exp
+
+    @reconnecting(idempotent=True, error=FTPError)
+    def fileFacts(self, fileName: str) -> Dict[str, str]:
+        """
+        Get the facts (size, modification time...) of a file on the FTP server.
+        MLST is used when the server supports it, otherwise SIZE and MDTM.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to get the facts of
+        Returns
+        -------
+        Dict[str, str]
+            facts of the file, with lower case names, at least size and modify
+        """
+
+        try:
+            response = self.ftp.sendcmd("MLST " + fileName)
+        except ftplib.error_perm as exp:
+            if not str(exp).startswith("50"):
+                raise FTPError(exp) from exp
+            return self._sizeAndModificationTime(fileName)
+
+        facts = {}
+        for fact in response.splitlines()[1].strip().split(" ", 1)[0].split(";"):
+            name, _, value = fact.partition("=")
+            if name:
+                facts[name.lower()] = value
+        return facts
+
+    def _sizeAndModificationTime(self, fileName: str) -> Dict[str, str]:
+        try:
+            self.ftp.voidcmd("TYPE I")
+            size = self.ftp.size(fileName)
+            modify = self.ftp.sendcmd("MDTM " + fileName)[4:].strip()
+        except ftplib.error_perm as exp:
+            raise FTPError(exp) from exp
+        return {"size": str(size), "modify": modify}
+
+    @reconnecting(idempotent=True, error=FTPError)
     def changeDirectory(self, directoryName: str) -> str:
         """
         Change directory on the FTP client.
@@ -104,10 +330,29 @@ class FTPConnectionModel:
         """
 
         try:
-            return self.ftp.cwd(directoryName)
+            response = self.ftp.cwd(directoryName)
+            self.workingDirectory = self.remotePath(directoryName)
+            return response
         except ftplib.error_perm as exp:
             raise FTPError(exp) from exp
 
+    def remotePath(self, fileName: str) -> str:
+        """
+        Absolute path on the FTP server of a path relative to the working directory.
+
+        Parameters
+        ----------
+        fileName : str
+            absolute path or path relative to the working directory
+        Returns
+        -------
+        str
+            absolute path
+        """
+
+        return posixpath.normpath(posixpath.join(self.workingDirectory, fileName))
+
+    @reconnecting(idempotent=False, error=FTPError)
     def deleteDirectory(self, directoryName: str) -> str:
         """
         Delete a directory on the FTP client.
@@ -127,6 +372,7 @@ class FTPConnectionModel:
         except ftplib.error_perm as exp:
             raise FTPError(exp) from exp
 
+    @reconnecting(idempotent=False, error=FTPError)
     def createDirectory(self, directoryName: str) -> str:
         """
         Create a directory on the FTP client.
@@ -146,6 +392,7 @@ class FTPConnectionModel:
         except ftplib.error_perm as exp:
             raise FTPError(exp) from exp
 
+    @reconnecting(idempotent=False, error=FTPError)
     def deleteFile(self, fileName: str) -> str:
         """
         delete a file on the FTP client.
@@ -165,30 +412,428 @@ class FTPConnectionModel:
         except ftplib.error_perm as exp:
             raise FTPError(exp) from exp
 
-    def downloadFile(self, fileName: str) -> str:
+    @reconnecting(idempotent=False, error=FTPError)
+    def rename(self, fromName: str, toName: str) -> str:
+        """
+        Rename or move a file or a directory on the FTP server (RNFR then RNTO), without
+        transferring it.
+
+        Parameters
+        ----------
+        fromName : str
+            path of the entry to rename
+        toName : str
+            new path of the entry
+        Returns
+        -------
+        str
+            server response
+        """
+
+        try:
+            return self.ftp.rename(fromName, toName)
+        except (ftplib.error_perm, ftplib.error_reply) as exp:
+            raise FTPError(exp) from exp
+
+    def openSession(self) -> "FTPConnectionModel":
+        """
+        Open another session to the server with the address and credentials of this one,
+        in the same working directory. It shares the TLS session cache, the transfer
+        controller, the buffer pool and the keepalive interval of this session.
+
+        Returns
+        -------
+        FTPConnectionModel
+            the new session, logged in
+        """
+
+        if self.address is None or self.credentials is None:
+            raise FTPError("Not logged in")
+
+        session = FTPConnectionModel(
+            self.sessionCache, self.controller, self.bufferPool, self.keepAliveInterval
+        )
+        session.connect(*self.address)
+        session.login(*self.credentials)
+        if session.workingDirectory != self.workingDirectory:
+            session.changeDirectory(self.workingDirectory)
+        return session
+
+    @reconnecting(idempotent=True, error=FTPError)
+    def downloadFile(
+        self,
+        fileName: str,
+        throttle: Optional[Throttle] = None,
+        verifier: Optional[RangeVerifier] = None,
+        check: Optional[StreamTransform] = None,
+    ) -> str:
         """
         download a file from the FTP client.
+        The local file is preallocated to the size of the remote file, large files are
+        downloaded in segments over parallel sessions when the transfer controller asks for
+        more than one connection.
 
         Parameters
         ----------
         fileName : str
             fileName to download
+        throttle : Optional[Callable[[int], Any]]
+            called with the size of each received block, blocks to limit the rate
+        verifier : Optional[RangeVerifier]
+            verifies each segment as it is received, the download stops at the first invalid
+            block and the file is removed
+        check : Optional[StreamTransform]
+            fed with the blocks of a download over a single connection, instead of the verifier
         Returns
         -------
         str
             server response
         """
 
+        decision = self.controller.decision(DOWNLOAD)
+        self.ftp.socketBufferSize = decision.socketBufferSize
+        start, cpuStart = time.perf_counter(), time.process_time()
         try:
+            size = self._remoteSize(fileName)
             with open(fileName, "wb") as downloadedFile:
-                return f"Downloading {fileName}...\n" + self.ftp.retrbinary(
-                    "RETR " + fileName, downloadedFile.write
+                if size:
+                    _preallocate(downloadedFile, size)
+            if size is not None and self.segmented(size, decision.connections):
+                response, connections, seconds = self._downloadSegments(
+                    fileName, size, decision.connections, throttle, verifier
                 )
+            else:
+                if check is None and verifier is not None and size is not None:
+                    check = verifier.rangeCheck(0, size)
+                transferStart = time.perf_counter()
+                with open(fileName, "r+b") as downloadedFile:
+                    response = self.retrieve(
+                        fileName, _checked(downloadedFile.write, check), throttle=throttle
+                    )
+                    downloadedFile.truncate()
+                seconds = time.perf_counter() - transferStart
+                if check is not None:
+                    check.finalize()
+                size, connections = os.path.getsize(fileName), 1
+        except (OSError, EOFError, ValueError, ftplib.Error, FTPError) as exp:
+            self.controller.record(0, time.perf_counter() - start, decision.connections, True)
+            if os.path.exists(fileName):
+                os.remove(fileName)
+            if isinstance(
+                exp, (OSError, EOFError, ValueError, ftplib.error_temp, ftplib.error_reply)
+            ):
+                raise
+            raise FTPError(exp) from exp
+
+        self.controller.record(
+            size,
+            seconds,
+            connections,
+            connections < decision.connections,
+            time.process_time() - cpuStart,
+        )
+        return f"Downloading {fileName}...\n" + response
+
+    @reconnecting(idempotent=False, error=FTPError)
+    def pipeline(
+        self, commands: Sequence[str], window: int = DEFAULT_PIPELINE_WINDOW
+    ) -> List[Union[str, FTPError]]:
+        """
+        Send control commands without waiting for their replies, for instance DELE, MKD or
+        RMD on many entries. Commands are sent by windows in a single write, then the
+        replies are read and matched in order, so a window costs one round trip.
+
+        Parameters
+        ----------
+        commands : Sequence[str]
+            commands, without end of line
+        window : int
+            number of commands sent before reading their replies
+        Returns
+        -------
+        List[Union[str, FTPError]]
+            reply of each command, FTPError for a command the server refused or answered
+            with an unexpected reply
+        """
+
+        if any("\r" in command or "\n" in command for command in commands):
+            raise ValueError("an illegal newline character should not be contained")
+        sock = self.ftp.sock
+        if sock is None:
+            raise FTPError("Not connected")
+
+        replies: List[Union[str, FTPError]] = []
+        for start in range(0, len(commands), window):
+            batch = commands[start : start + window]
+            lines = "".join(command + ftplib.CRLF for command in batch)
+            sock.sendall(lines.encode(self.ftp.encoding))
+            for index in range(len(batch)):
+                try:
+                    replies.append(self.ftp.getresp())
+                except ftplib.Error as exp:
+                    if str(exp).startswith("421"):
+                        self._drainReplies(len(batch) - index - 1)
+                        raise
+                    replies.append(FTPError(exp))
+        return replies
+
+    def _drainReplies(self, count: int) -> None:
+        # the replies left in a window are read, so none is taken for the reply of a later
+        # command, until the server closes the connection
+        for _ in range(count):
+            try:
+                self.ftp.getresp()
+            except ftplib.Error:
+                continue
+            except (OSError, EOFError):
+                return
+
+    @reconnecting(idempotent=False, error=FTPError)
+    def retrieve(
+        self,
+        fileName: str,
+        receive: Callable[[Buffer], Any],
+        transform: Optional[StreamTransform] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> str:
+        """
+        Retrieve a file from the FTP server, streaming it to a callback.
+        Blocks are received into pooled buffers and handed over as memoryviews which are only
+        valid during the call, the callback must copy or write them before returning.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to retrieve
+        receive : Callable[[Buffer], Any]
+            called with each received block, after the transform if given
+        transform : Optional[StreamTransform]
+            transform applied to the stream, for instance a decryptor
+        throttle : Optional[Callable[[int], Any]]
+            called with the size of each received block, blocks to limit the rate
+        Returns
+        -------
+        str
+            server response
+        """
+
+        if transform is None:
+            sink = receive
+        else:
+            decryptor = transform
+
+            def sink(block: Buffer) -> None:
+                processed = decryptor.update(block)
+                if processed:
+                    receive(processed)
+
+        try:
+            self.ftp.voidcmd("TYPE I")
+            with self.ftp.transfercmd("RETR " + fileName) as conn:
+                self._receiveOrAbort(conn, sink, None, throttle)
+                if isinstance(conn, ssl.SSLSocket):
+                    conn.unwrap()
+            response = self.ftp.voidresp()
         except ftplib.error_perm as exp:
-            os.remove(fileName)
             raise FTPError(exp) from exp
 
-    def uploadFile(self, fileName: str) -> str:
+        if transform is not None:
+            processed = transform.finalize()
+            if processed:
+                receive(processed)
+        return response
+
+    @reconnecting(idempotent=False, error=FTPError)
+    def downloadRange(
+        self,
+        fileName: str,
+        offset: int,
+        length: int,
+        file: BinaryIO,
+        throttle: Optional[Throttle] = None,
+        check: Optional[StreamTransform] = None,
+    ) -> int:
+        """
+        download a range of a file from the FTP client (REST then RETR), written at the same
+        offset of a local file.
+
+        Parameters
+        ----------
+        fileName : str
+            fileName to download
+        offset : int
+            first byte of the range
+        length : int
+            length of the range
+        file : BinaryIO
+            local file opened for writing, without truncating it
+        throttle : Optional[Callable[[int], Any]]
+            called with the size of each received block, blocks to limit the rate
+        check : Optional[StreamTransform]
+            fed with the received blocks and finalized at the end of the range, raises
+            ValueError on invalid data
+        Returns
+        -------
+        int
+            number of bytes downloaded
+        """
+
+        self.ftp.socketBufferSize = self.controller.decision(DOWNLOAD).socketBufferSize
+        self.ftp.voidcmd("TYPE I")
+        file.seek(offset)
+        with self.ftp.transfercmd("RETR " + fileName, rest=offset) as conn:
+            received = self._receiveOrAbort(conn, _checked(file.write, check), length, throttle)
+
+        try:
+            self.ftp.voidresp()
+        except ftplib.error_temp:
+            # the server aborts the transfer (426) when the range ends before the file
+            if received < length:
+                raise
+        if check is not None:
+            check.finalize()
+        return received
+
+    def _receiveOrAbort(
+        self,
+        conn: socket.socket,
+        receive: Callable[[Buffer], Any],
+        length: Optional[int],
+        throttle: Optional[Throttle],
+    ) -> int:
+        try:
+            return self._receive(conn, receive, length, throttle)
+        except Exception:
+            # the server aborts the transfer once the data connection is closed, its reply
+            # is read so the control connection stays usable
+            conn.close()
+            try:
+                self.ftp.voidresp()
+            except (OSError, ftplib.Error):
+                pass
+            raise
+
+    def _receive(
+        self,
+        conn: socket.socket,
+        receive: Callable[[Buffer], Any],
+        length: Optional[int] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> int:
+        blockSize = self.controller.decision(DOWNLOAD).blockSize
+        buffer = self.bufferPool.acquire(blockSize)
+        received = 0
+        try:
+            with memoryview(buffer) as view:
+                while length is None or received < length:
+                    wanted = blockSize if length is None else min(blockSize, length - received)
+                    count = conn.recv_into(view, wanted)
+                    if not count:
+                        break
+                    with view[:count] as block:
+                        receive(block)
+                    received += count
+                    if throttle is not None:
+                        throttle(count)
+        finally:
+            self.bufferPool.release(buffer)
+        return received
+
+    def _remoteSize(self, fileName: str) -> Optional[int]:
+        try:
+            self.ftp.voidcmd("TYPE I")
+            return self.ftp.size(fileName)
+        except ftplib.error_perm:
+            return None
+
+    def segmented(self, size: int, connections: Optional[int] = None) -> bool:
+        """
+        Whether a download of this size is split over parallel sessions, by default with the
+        connections of the next download.
+        """
+        if connections is None:
+            connections = self.controller.decision(DOWNLOAD).connections
+        return (
+            connections > 1
+            and self.credentials is not None
+            and size >= connections * self.controller.minMeasuredBytes
+        )
+
+    def _downloadSegments(
+        self,
+        fileName: str,
+        size: int,
+        connections: int,
+        throttle: Optional[Throttle],
+        verifier: Optional[RangeVerifier],
+    ) -> Tuple[str, int, float]:
+        sessions: List[FTPConnectionModel] = [self]
+        try:
+            for _ in range(connections - 1):
+                try:
+                    sessions.append(self.openSession())
+                except (UnableToConnect, NotAuthorized, FTPError):
+                    # the server refuses more sessions, the segments are spread over the others
+                    break
+
+            segmentSize = -(-size // len(sessions))
+            offsets = [index * segmentSize for index in range(len(sessions))]
+            if verifier is not None:
+                offsets = sorted({verifier.align(offset) for offset in offsets})
+            bounds = offsets + [size]
+            # the sessions are open, only the transfer is measured
+            start = time.perf_counter()
+            downloaded = self._downloadRanges(sessions, fileName, bounds, throttle, verifier)
+            seconds = time.perf_counter() - start
+            if downloaded != size:
+                raise FTPError(f"Downloaded {downloaded} of {size} bytes of {fileName}")
+        finally:
+            for session in sessions[1:]:
+                session.close()
+
+        return f"226 Downloaded in {len(offsets)} segments", len(offsets), seconds
+
+    def _downloadRanges(
+        self,
+        sessions: List["FTPConnectionModel"],
+        fileName: str,
+        bounds: List[int],
+        throttle: Optional[Throttle],
+        verifier: Optional[RangeVerifier],
+    ) -> int:
+        failures: List[Exception] = []
+        aborted = threading.Event()
+
+        def rangeThrottle(count: int) -> None:
+            # the other ranges stop at their next block once a range has failed
+            if aborted.is_set():
+                raise FTPError(f"Download of {fileName} aborted")
+            if throttle is not None:
+                throttle(count)
+
+        def downloadRange(index: int) -> int:
+            offset, length = bounds[index], bounds[index + 1] - bounds[index]
+            check = None if verifier is None else verifier.rangeCheck(offset, length)
+            try:
+                with open(fileName, "r+b") as rangeFile:
+                    return sessions[index].downloadRange(
+                        fileName, offset, length, rangeFile, rangeThrottle, check
+                    )
+            except Exception as exp:  # pylint: disable=W0703
+                failures.append(exp)
+                aborted.set()
+                return 0
+
+        with ThreadPoolExecutor(max(len(bounds) - 2, 1)) as executor:
+            results = [executor.submit(downloadRange, i) for i in range(1, len(bounds) - 1)]
+            # the first range is downloaded by this session, whose lock this thread holds
+            downloaded = downloadRange(0)
+        if failures:
+            raise failures[0]
+        return downloaded + sum(result.result() for result in results)
+
+    @reconnecting(idempotent=True, error=FTPError)
+    def uploadFile(self, fileName: str, throttle: Optional[Throttle] = None) -> str:
         """
         upload a file to the FTP client.
 
@@ -196,20 +841,145 @@ class FTPConnectionModel:
         ----------
         fileName : str
             fileName to upload
+        throttle : Optional[Callable[[int], Any]]
+            called with the size of each sent block, blocks to limit the rate
         Returns
         -------
         str
             server response
         """
 
+        decision = self.controller.decision(UPLOAD)
+        self.ftp.socketBufferSize = decision.socketBufferSize
+        start, cpuStart = time.perf_counter(), time.process_time()
         try:
             with open(fileName, "rb") as uploadFile:
-                return f"Uploading {fileName.split('/')[-1]}...\n" + self.ftp.storbinary(
-                    "STOR " + fileName.split("/")[-1], uploadFile
-                )
+                self.ftp.voidcmd("TYPE I")
+                with self.ftp.transfercmd("STOR " + fileName.split("/")[-1]) as conn:
+                    _sendFile(conn, uploadFile, decision.blockSize, throttle)
+                    if isinstance(conn, ssl.SSLSocket):
+                        conn.unwrap()
+                response = self.ftp.voidresp()
+        except (OSError, ftplib.Error) as exp:
+            self.controller.record(0, time.perf_counter() - start, 1, True, direction=UPLOAD)
+            if isinstance(exp, ftplib.error_perm):
+                raise FTPError(exp) from exp
+            raise
+
+        self.controller.record(
+            os.path.getsize(fileName),
+            time.perf_counter() - start,
+            cpuSeconds=time.process_time() - cpuStart,
+            direction=UPLOAD,
+        )
+        return f"Uploading {fileName.split('/')[-1]}...\n" + response
+
+    def reconnect(self) -> str:
+        """
+        Open a new control connection to the server, log in again and return to the working
+        directory, after the server dropped the connection.
+
+        Returns
+        -------
+        str
+            server response
+        """
+
+        with self.lock:
+            if self.address is None or self.credentials is None:
+                raise FTPError("Not logged in")
+            directory = self.workingDirectory
+            self.ftp.close()
+            response = self.connect(*self.address)
+            response += "\n" + self.login(*self.credentials)
+            if self.workingDirectory != directory:
+                try:
+                    response += "\n" + self.ftp.cwd(directory)
+                except ftplib.error_perm as exp:
+                    raise FTPError(exp) from exp
+                self.workingDirectory = directory
+            return response
+
+    def keepAlive(self) -> bool:
+        """
+        Send a NOOP to keep the session alive, and reconnect if the server dropped it.
+        Nothing is done while an operation runs.
+
+        Returns
+        -------
+        bool
+            whether the session was refreshed
+        """
+
+        if not self.lock.acquire(blocking=False):  # pylint: disable=R1732
+            return False
+
+        try:
+            if self.credentials is None or self.lastActivity is None:
+                return False
+            try:
+                self.ftp.voidcmd("NOOP")
+            except (OSError, EOFError, ftplib.Error):
+                self.reconnect()
+            self.lastActivity = time.monotonic()
+            return True
+        finally:
+            self.lock.release()
+
+    @reconnecting(idempotent=False, error=FTPError)
+    def store(  # pylint: disable=R0913
+        self,
+        fileName: str,
+        file: BinaryIO,
+        offset: Optional[int] = None,
+        length: Optional[int] = None,
+        throttle: Optional[Throttle] = None,
+    ) -> str:
+        """
+        Store the content of a local file object on the FTP server, under any path.
+
+        Parameters
+        ----------
+        fileName : str
+            path of the file on the server
+        file : BinaryIO
+            file object read from its current position
+        offset : Optional[int]
+            overwrite the file from this offset on (REST then STOR) and keep the rest of it,
+            not all servers do; None to replace the file
+        length : Optional[int]
+            number of bytes sent, up to the end of the file object if None
+        throttle : Optional[Callable[[int], Any]]
+            called with the size of each sent block, blocks to limit the rate
+        Returns
+        -------
+        str
+            server response
+        """
+
+        try:
+            self.ftp.voidcmd("TYPE I")
+            with self.ftp.transfercmd("STOR " + fileName, rest=offset) as conn:
+                _sendFile(conn, file, self.controller.decision(UPLOAD).blockSize, throttle, length)
+                if isinstance(conn, ssl.SSLSocket):
+                    conn.unwrap()
+            return self.ftp.voidresp()
         except ftplib.error_perm as exp:
             raise FTPError(exp) from exp
 
+    def close(self) -> None:
+        """
+        Close the connection with the FTP server, ignoring the errors of a broken connection.
+        """
+
+        with self.lock:
+            KEEPALIVE.unregister(self)
+            self.credentials = None
+            try:
+                self.ftp.quit()
+            except (OSError, EOFError, ftplib.Error):
+                self.ftp.close()
+
     def disconnect(self) -> str:
         """
         Close connection with the FTP server.
@@ -220,7 +990,10 @@ class FTPConnectionModel:
             server response
         """
 
-        try:
-            return "Closing connection...\n" + self.ftp.quit()
-        except ftplib.error_perm as exp:
-            raise FTPError(exp) from exp
+        with self.lock:
+            KEEPALIVE.unregister(self)
+            self.credentials = None
+            try:
+                return "Closing connection...\n" + self.ftp.quit()
+            except ftplib.error_perm as exp:
+                raise FTPError(exp) from exp
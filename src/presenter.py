@@ -2,24 +2,67 @@
 FTP Client Presenter
 """
 from __future__ import annotations
-from typing import Union, Protocol, List, Callable, Any
-from functools import wraps
+from typing import (
+    Union,
+    Protocol,
+    List,
+    Callable,
+    Any,
+    Tuple,
+    Optional,
+    Iterable,
+    Sequence,
+    Set,
+)
+from functools import partial, wraps
 
 import tkinter as tk
 import platform
 import os
+import posixpath
 import subprocess
 
+from src.cipher.RSA import RSACipher, splitKeys
+from src.file_handler.download_cache import DownloadCache
 from src.file_handler.file_cryptographer import FileCryptographer
+from src.file_handler.key_cache import SessionKeyCache
+from src.file_handler.keyring import Keyring
+from src.file_handler.container import (
+    CONTAINER_EXTENSION,
+    FLAG_HASH_TREE,
+    LEGACY_EXTENSION,
+    LEGACY_KEY_EXTENSION,
+    KeyEnvelope,
+    logicalName,
+    readHeader,
+)
+from src.file_handler.container_stream import ContainerDecryptor, ContainerVerifier
+from .metrics import timed
+from .profiling import PROFILER
 from .model import FTPConnectionModel, UnableToConnect, NotAuthorized, FTPError
+from .remote_container import KeyRotation, defaultJournalPath, remoteHeader
+from .remote_index import RemoteIndex
+from .remote_mover import RemoteMover
+from .remote_uploader import TreeUploader
+from .remote_walker import RemoteEntry, RemoteTreeWalker
+from .striped_storage import StripedStorage
 
 
 def _newServerResponseEntry(
     func: Callable[[FTPClientPresenter, Any], Any],
 ) -> Callable[[FTPClientPresenter, Any], Any]:
+    measuredFunc = timed(f"presenter.{func.__name__}")(func)
+
     @wraps(func)
     def wrapper(self: FTPClientPresenter, *args: Any, **kwargs: Any) -> Any:
-        result = func(self, *args, **kwargs)
+        if PROFILER.enabled:
+            result, summary = PROFILER.profile(
+                f"presenter.{func.__name__}", measuredFunc, self, *args, **kwargs
+            )
+            if summary:
+                self.view.updateServerResponse("\n" + summary)
+        else:
+            result = measuredFunc(self, *args, **kwargs)
         self.view.scrollDownServerResponse()
         self.view.updateServerResponse("\n")
         return result
@@ -66,6 +109,10 @@ class FTPClientGui(Protocol):
     def portNumber(self) -> str:
         ...
 
+    @property
+    def useTls(self) -> bool:
+        ...
+
     @property
     def username(self) -> str:
         ...
@@ -82,6 +129,14 @@ class FTPClientGui(Protocol):
     def encryptedKeyFilePath(self) -> str:
         ...
 
+    @property
+    def cipherEngine(self) -> str:
+        ...
+
+    @property
+    def searchQuery(self) -> str:
+        ...
+
     def updateServerResponse(self, response: str) -> None:
         ...
 
@@ -106,11 +161,30 @@ class FTPClientPresenter:
     FTP Client Presenter
     """
 
-    # pylint: disable=W0613
-
-    def __init__(self, model: FTPConnectionModel, view: FTPClientGui) -> None:
+    # pylint: disable=W0613,R0902
+
+    def __init__(
+        self,
+        model: FTPConnectionModel,
+        view: FTPClientGui,
+        keyring: Optional[Keyring] = None,
+        index: Optional[RemoteIndex] = None,
+        downloadCache: Optional[DownloadCache] = None,
+        stripedStorage: Optional[StripedStorage] = None,
+    ) -> None:
         self.model = model
         self.view = view
+        self.keyring = keyring if keyring is not None else Keyring()
+        self.keyCache = SessionKeyCache()
+        self.index = index if index is not None else RemoteIndex(":memory:")
+        # downloaded objects are not cached when None
+        self.downloadCache = downloadCache
+        # files are striped over the servers of the striped storage when given
+        self.stripedStorage = stripedStorage
+        # names shown in the directory list, updated in place by the bulk operations
+        self.directoryNames: List[str] = []
+        # paths of the objects of the working directory, from its last listing
+        self.remoteObjects: Set[str] = set()
 
     @_newServerResponseEntry
     def handleConnect(self, event: Union[tk.EventType, None] = None) -> None:
@@ -126,6 +200,7 @@ class FTPClientPresenter:
             msg = self.model.connect(
                 self.view.ipAddress,
                 int(self.view.portNumber),
+                self.view.useTls,
             )
             self.view.updateServerResponse(msg)
             self.view.toggleLoginButton("normal")
@@ -151,6 +226,8 @@ class FTPClientPresenter:
                 self.view.password,
             )
             self.view.updateServerResponse(msg)
+            self.keyCache.clear()
+            self.index.server = f"{self.view.username}@{self.view.ipAddress}:{self.view.portNumber}"
             self.view.toggleControlButtons("normal")
             self._displayDirectory()
         except NotAuthorized as exp:
@@ -176,24 +253,31 @@ class FTPClientPresenter:
     @_newServerResponseEntry
     def handleCreateDirectory(self, event: Union[tk.EventType, None] = None) -> None:
         """
-        Handle the create directory button being pressed.
+        Handle the create directory button being pressed, several directories separated
+        by ";" are created with pipelined commands.
 
         paramters
         ---------
         event: Union[tk.EventType, None]
             The event that triggered the function call.
         """
+        names = self._selectedNames()
         try:
-            msg = self.model.createDirectory(self.view.mainInput)
-            self.view.updateServerResponse(msg)
-            self._displayDirectory()
+            replies = self.model.pipeline([f"MKD {name}" for name in names])
         except FTPError as exp:
             self.view.updateServerResponse(str(exp))
+            return
+        created = self._reportReplies("Created", names, [[reply] for reply in replies])
+        self.index.addEntries(
+            RemoteEntry(self.model.remotePath(name), {"type": "dir"}) for name in created
+        )
+        self._updateDirectoryNames(added=created)
 
     @_newServerResponseEntry
     def handleDeleteDirectory(self, event: Union[tk.EventType, None] = None) -> None:
         """
-        Handle the delete directory button being pressed.
+        Handle the delete directory button being pressed, several directories separated
+        by ";" are deleted with pipelined commands.
 
         paramters
         ---------
@@ -201,12 +285,15 @@ class FTPClientPresenter:
             The event that triggered the function call.
         """
 
+        names = self._selectedNames()
         try:
-            msg = self.model.deleteDirectory(self.view.mainInput)
-            self.view.updateServerResponse(msg)
-            self._displayDirectory()
+            replies = self.model.pipeline([f"RMD {name}" for name in names])
         except FTPError as exp:
             self.view.updateServerResponse(str(exp))
+            return
+        deleted = self._reportReplies("Deleted", names, [[reply] for reply in replies])
+        self.index.removeAll(self.model.remotePath(name) for name in deleted)
+        self._updateDirectoryNames(removed=deleted)
 
     @_newServerResponseEntry
     def handleDownloadFile(self, event: Union[tk.EventType, None] = None) -> None:
@@ -216,29 +303,32 @@ class FTPClientPresenter:
         Here we save the files to disk then remove them, the reason behind this is that
         the ftplib requires a file to be saved to disk.
 
+        Files are stored as a single container, files uploaded before containers were
+        introduced (or whose keys file is given explicitly) use the legacy layout. With a
+        striped storage the container is rebuilt from the stripes of its servers.
+
         paramters
         ---------
         event: Union[tk.EventType, None]
             The event that triggered the function call.
         """
-        rsaKey = self.view.rsaKey
-        encryptedKeyFilePath = self.view.mainInput + ".key.enc"
-        encryptedFilePath = self.view.mainInput + ".enc"
+        containerPath = self.view.mainInput + CONTAINER_EXTENSION
 
         try:
-            self.model.downloadFile(encryptedFilePath)
-            if self.view.encryptedKeyFilePath == "":
-                self.model.downloadFile(encryptedKeyFilePath)
+            if self.view.rsaKey != "":
+                self.keyring.addKeys(bytes(self.view.rsaKey, "utf-8"))
+
+            if self.view.encryptedKeyFilePath == "" and self.stripedStorage is not None:
+                self._downloadStriped(self.stripedStorage, containerPath)
+            elif self.view.encryptedKeyFilePath == "":
+                try:
+                    facts = self._remoteFacts(containerPath)
+                except FTPError:
+                    self._downloadLegacyFile()
+                else:
+                    self._downloadContainer(containerPath, facts)
             else:
-                encryptedKeyFilePath = self.view.encryptedKeyFilePath
-
-            FileCryptographer.decryptFile(
-                encryptedFilePath, encryptedKeyFilePath, bytes(rsaKey, "utf-8")
-            )
-
-            os.remove(encryptedFilePath)
-            if self.view.encryptedKeyFilePath == "":
-                os.remove(encryptedKeyFilePath)
+                self._downloadLegacyFile()
 
             decryptedFilePath = f"{os.getcwd()}/{self.view.mainInput}.dec"
             _openExplorer(decryptedFilePath)
@@ -248,13 +338,255 @@ class FTPClientPresenter:
         except (FileNotFoundError, TypeError, ValueError, FTPError) as exp:
             self.view.updateServerResponse(str(exp))
 
+    def _downloadStriped(self, stripedStorage: StripedStorage, containerPath: str) -> None:
+        """
+        Download a container striped over the servers of the striped storage, and decrypt it.
+
+        paramters
+        ---------
+        stripedStorage: StripedStorage
+            The servers holding the stripes.
+        containerPath: str
+            The name of the container on the servers.
+        """
+        try:
+            manifest, rebuilt = stripedStorage.download(
+                os.path.basename(containerPath), containerPath
+            )
+            for server in rebuilt:
+                self.view.updateServerResponse(f"Rebuilt the stripes of {server} from parity\n")
+            with open(containerPath, "rb") as container:
+                envelopes = readHeader(container).envelopes
+            keys = self.keyring.unwrapEnvelopes(envelopes)
+            FileCryptographer.decryptContainerWithKeys(containerPath, keys)
+            self.view.updateServerResponse(
+                f"Joined {manifest.size} bytes from {len(manifest.servers)} servers\n"
+            )
+        finally:
+            if os.path.exists(containerPath):
+                os.remove(containerPath)
+
+    def _downloadContainer(self, containerPath: str, facts: Tuple[str, str]) -> None:
+        """
+        Download and decrypt a container, its keys are unwrapped only if they are not cached.
+        Over a single connection its segments are verified as they are decrypted, while it is
+        received. A container in the download cache is decrypted from its local copy.
+
+        paramters
+        ---------
+        containerPath: str
+            The path of the container on the server.
+        facts: Tuple[str, str]
+            The size and modification time of the container.
+        """
+        remotePath = self.model.remotePath(containerPath)
+        cachedPath = self._cachedObject(remotePath, facts)
+        if cachedPath is not None and self._decryptCachedContainer(remotePath, facts, cachedPath):
+            return
+
+        decryptedPath = self.view.mainInput + ".dec"
+        try:
+            if self.model.segmented(int(facts[0] or 0)):
+                header, packedHeader = remoteHeader(self.model, containerPath)
+                keys = self._containerKeys(remotePath, facts, header.envelopes)
+                verifier = None
+                if header.flags & FLAG_HASH_TREE:
+                    verifier = ContainerVerifier(header, packedHeader, keys)
+                self.model.downloadFile(containerPath, verifier=verifier)
+                FileCryptographer.decryptContainerWithKeys(containerPath, keys, decryptedPath)
+            else:
+                with open(decryptedPath, "wb") as decrypted:
+                    decryptor = ContainerDecryptor(
+                        unwrap=partial(self._containerKeys, remotePath, facts), output=decrypted
+                    )
+                    self.model.downloadFile(containerPath, check=decryptor)
+            self._cacheObject(remotePath, facts, containerPath)
+        except Exception as exp:
+            if isinstance(exp, ValueError):
+                self.keyCache.discard(remotePath)
+            if os.path.exists(decryptedPath):
+                os.remove(decryptedPath)
+            raise
+        finally:
+            if os.path.exists(containerPath):
+                os.remove(containerPath)
+
+    def _decryptCachedContainer(
+        self, remotePath: str, facts: Tuple[str, str], cachedPath: str
+    ) -> bool:
+        """
+        Decrypt the local copy of a container.
+
+        paramters
+        ---------
+        remotePath: str
+            The path of the container on the server.
+        facts: Tuple[str, str]
+            The size and modification time of the container.
+        cachedPath: str
+            The path of the local copy.
+
+        returns
+        -------
+        bool
+            False if the local copy is corrupted, it is then dropped from the cache.
+        """
+        try:
+            with open(cachedPath, "rb") as container:
+                envelopes = readHeader(container).envelopes
+        except ValueError:
+            return self._dropCachedObject(remotePath)
+
+        keys = self._containerKeys(remotePath, facts, envelopes)
+        try:
+            FileCryptographer.decryptContainerWithKeys(
+                cachedPath, keys, self.view.mainInput + ".dec"
+            )
+        except ValueError:
+            return self._dropCachedObject(remotePath)
+        self.view.updateServerResponse(f"Decrypted the cached copy of {remotePath}\n")
+        return True
+
+    def _containerKeys(
+        self, remotePath: str, facts: Tuple[str, str], envelopes: List[KeyEnvelope]
+    ) -> bytes:
+        """
+        Get the keys of a container from the key cache, or unwrap them.
+
+        paramters
+        ---------
+        remotePath: str
+            The path of the container on the server.
+        facts: Tuple[str, str]
+            The size and modification time of the container.
+        envelopes: List[KeyEnvelope]
+            The envelopes of the container.
+        """
+        keys = self.keyCache.get(remotePath, facts)
+        if keys is None:
+            keys = self.keyring.unwrapEnvelopes(envelopes)
+            self.keyCache.put(remotePath, facts, keys)
+        return keys
+
+    def _downloadLegacyFile(self) -> None:
+        """
+        Download and decrypt a file stored as separate ciphertext and keys objects,
+        the keys object is downloaded only if its keys are not cached. A ciphertext in the
+        download cache is decrypted from its local copy.
+        """
+        encryptedKeyFilePath = self.view.mainInput + LEGACY_KEY_EXTENSION
+        encryptedFilePath = self.view.mainInput + LEGACY_EXTENSION
+
+        if self.view.encryptedKeyFilePath == "":
+            remoteKeyFilePath = self.model.remotePath(encryptedKeyFilePath)
+            facts = self._remoteFacts(encryptedKeyFilePath)
+            keys = self.keyCache.get(remoteKeyFilePath, facts)
+            if keys is None:
+                self.model.downloadFile(encryptedKeyFilePath)
+                try:
+                    keys = FileCryptographer.unwrapKeysFile(encryptedKeyFilePath, self.keyring)
+                finally:
+                    os.remove(encryptedKeyFilePath)
+                self.keyCache.put(remoteKeyFilePath, facts, keys)
+        else:
+            keys = FileCryptographer.unwrapKeysFile(self.view.encryptedKeyFilePath, self.keyring)
+
+        remoteFilePath = self.model.remotePath(encryptedFilePath)
+        facts = ("", "")
+        if self.downloadCache is not None:
+            facts = self._remoteFacts(encryptedFilePath)
+            cachedPath = self._cachedObject(remoteFilePath, facts)
+            if cachedPath is not None:
+                try:
+                    FileCryptographer.decryptFileWithKeys(
+                        cachedPath, keys, self.view.mainInput + ".dec"
+                    )
+                    self.view.updateServerResponse(
+                        f"Decrypted the cached copy of {remoteFilePath}\n"
+                    )
+                    return
+                except ValueError:
+                    self._dropCachedObject(remoteFilePath)
+
+        self.model.downloadFile(encryptedFilePath)
+        try:
+            FileCryptographer.decryptFileWithKeys(encryptedFilePath, keys)
+            self._cacheObject(remoteFilePath, facts, encryptedFilePath)
+        finally:
+            if os.path.exists(encryptedFilePath):
+                os.remove(encryptedFilePath)
+
+    def _cachedObject(self, remotePath: str, facts: Tuple[str, str]) -> Optional[str]:
+        """
+        Get the local copy of a remote object from the download cache.
+
+        paramters
+        ---------
+        remotePath: str
+            The path of the object on the server.
+        facts: Tuple[str, str]
+            The size and modification time of the object.
+        """
+        if self.downloadCache is None:
+            return None
+        return self.downloadCache.get(self.index.server, remotePath, facts)
+
+    def _cacheObject(self, remotePath: str, facts: Tuple[str, str], fileName: str) -> None:
+        """
+        Move a downloaded and decrypted object into the download cache.
+
+        paramters
+        ---------
+        remotePath: str
+            The path of the object on the server.
+        facts: Tuple[str, str]
+            The size and modification time of the object.
+        fileName: str
+            The path of the downloaded object.
+        """
+        if self.downloadCache is None:
+            return
+        try:
+            self.downloadCache.put(self.index.server, remotePath, facts, fileName)
+        except OSError:
+            # the file is downloaded and decrypted, it is only left out of the cache
+            pass
+
+    def _dropCachedObject(self, remotePath: str) -> bool:
+        """
+        Drop a corrupted local copy from the download cache, the object is downloaded again.
+
+        paramters
+        ---------
+        remotePath: str
+            The path of the object on the server.
+        """
+        if self.downloadCache is not None:
+            self.downloadCache.discard(self.index.server, remotePath)
+        return False
+
+    def _remoteFacts(self, fileName: str) -> Tuple[str, str]:
+        """
+        Get the size and modification time of a file on the server.
+
+        paramters
+        ---------
+        fileName: str
+            The path of the file on the server.
+        """
+        facts = self.model.fileFacts(fileName)
+        return (facts.get("size", ""), facts.get("modify", ""))
+
     @_newServerResponseEntry
     def handleUploadFile(self, event: Union[tk.EventType, None] = None) -> None:
         """
         Handle the upload file button being pressed.
 
-        Here we encrypt the file and then upload it to the server. The reason we save the encrypted
-        to disk and then remove it is because the way the ftplib works.
+        Here we encrypt the file into a container and then upload it to the server. The reason we
+        save the container to disk and then remove it is because the way the ftplib works.
+        Several public keys may be given, the file is then uploaded once and shared with all of
+        their owners. A directory is uploaded with its whole tree. With a striped storage the
+        container of a file is striped over its servers.
 
         paramters
         ---------
@@ -263,21 +595,88 @@ class FTPClientPresenter:
         """
 
         try:
-            FileCryptographer.encryptFile(self.view.mainInput, bytes(self.view.rsaKey, "utf-8"))
-            self.model.uploadFile(f"{self.view.mainInput}.enc")
-            self.model.uploadFile(f"{self.view.mainInput}.key.enc")
+            publicKeys = splitKeys(bytes(self.view.rsaKey, "utf-8"))
+            if os.path.isdir(self.view.mainInput):
+                self._uploadDirectory(publicKeys)
+                return
+            containerPath = FileCryptographer.encryptToContainer(
+                self.view.mainInput, publicKeys, self.view.cipherEngine
+            )
+            if self.stripedStorage is not None:
+                self._uploadStriped(self.stripedStorage, containerPath)
+                return
+            try:
+                self.model.uploadFile(containerPath)
+                self.index.add(
+                    self.model.remotePath(os.path.basename(containerPath)),
+                    {"type": "file", "size": str(os.path.getsize(containerPath))},
+                    [self.keyring.addKey(publicKey) for publicKey in publicKeys],
+                )
+            finally:
+                os.remove(containerPath)
             self.view.updateServerResponse(f"Uploaded file: {self.view.mainInput}")
-            os.remove(f"{self.view.mainInput}.enc")
-            os.remove(f"{self.view.mainInput}.key.enc")
 
             self._displayDirectory()
         except (FileNotFoundError, TypeError, ValueError, FTPError) as exp:
             self.view.updateServerResponse(str(exp))
 
+    def _uploadStriped(self, stripedStorage: StripedStorage, containerPath: str) -> None:
+        """
+        Stripe a container over the servers of the striped storage.
+
+        paramters
+        ---------
+        stripedStorage: StripedStorage
+            The servers receiving the stripes.
+        containerPath: str
+            The path of the local container, it is removed once uploaded.
+        """
+        try:
+            manifest = stripedStorage.upload(containerPath, os.path.basename(containerPath))
+        finally:
+            os.remove(containerPath)
+        self.view.updateServerResponse(
+            f"Uploaded file: {self.view.mainInput}, striped over {len(manifest.servers)} servers"
+            f" ({manifest.parity} parity)"
+        )
+
+    def _uploadDirectory(self, publicKeys: List[bytes]) -> None:
+        """
+        Upload a local directory tree into the working directory, each file encrypted into
+        a container, over several sessions.
+
+        paramters
+        ---------
+        publicKeys: List[bytes]
+            Keys of the recipients of the files.
+        """
+        uploader = TreeUploader(self.model, publicKeys, self.view.cipherEngine)
+        created, results = uploader.upload(self.view.mainInput, ".")
+        uploaded = [result for result in results if result.error is None]
+        for result in results:
+            if result.error is not None:
+                self.view.updateServerResponse(f"{result.localPath}: {result.error}\n")
+
+        self.index.addEntries(RemoteEntry(directory, {"type": "dir"}) for directory in created)
+        self.index.addEntries(
+            (
+                RemoteEntry(result.remotePath, {"type": "file", "size": str(result.size)})
+                for result in uploaded
+            ),
+            keyIds=[self.keyring.addKey(publicKey) for publicKey in publicKeys],
+        )
+        self.view.updateServerResponse(
+            f"Uploaded {len(uploaded)} of {len(results)} files of {self.view.mainInput}"
+            f" ({len(created)} directories created)"
+        )
+        self._displayDirectory()
+
     @_newServerResponseEntry
     def handleDeleteFile(self, event: Union[tk.EventType, None] = None) -> None:
         """
-        Handle the delete file button being pressed.
+        Handle the delete file button being pressed, several files separated by ";" are
+        deleted with pipelined commands. The container and the legacy objects of each file
+        are deleted, only those the listing of their directory shows.
 
         paramters
         ---------
@@ -285,13 +684,124 @@ class FTPClientPresenter:
             The event that triggered the function call.
         """
 
+        names = self._selectedNames()
         try:
-            self.model.deleteFile(self.view.mainInput + ".enc")
-            self.model.deleteFile(self.view.mainInput + ".key.enc")
-            self.view.updateServerResponse(f"Deleted file: {self.view.mainInput}")
-            self._displayDirectory()
+            objects = self._existingObjects(names)
+            replies = iter(
+                self.model.pipeline([f"DELE {name}" for entry in objects for name in entry])
+            )
+        except FTPError as exp:
+            self.view.updateServerResponse(str(exp))
+            return
+        deleted = self._reportReplies(
+            "Deleted",
+            names,
+            [
+                [next(replies) for _ in entry] or [FTPError(f"550 {name}: No such file.")]
+                for name, entry in zip(names, objects)
+            ],
+        )
+        removed = [
+            self.model.remotePath(objectName)
+            for name, entry in zip(names, objects)
+            if name in deleted
+            for objectName in entry
+        ]
+        self.remoteObjects.difference_update(removed)
+        self.index.removeAll(removed)
+        self._updateDirectoryNames(removed=deleted)
+
+    @_newServerResponseEntry
+    def handleMove(self, event: Union[tk.EventType, None] = None) -> None:
+        """
+        Handle the move button being pressed, the main entry holds "<sources> > <destination>".
+        A single source is renamed to the destination, several sources separated by ";" or a
+        destination ending with "/" are moved into the destination directory. Files are
+        renamed on the server, without transferring them.
+
+        paramters
+        ---------
+        event: Union[tk.EventType, None]
+            The event that triggered the function call.
+        """
+
+        sourcesText, separator, destination = self.view.mainInput.rpartition(">")
+        sources = [name.strip() for name in sourcesText.split(";") if name.strip()]
+        destination = destination.strip()
+        if not separator or not sources or not destination:
+            self.view.updateServerResponse("Enter the files to move as: <sources> > <destination>")
+            return
+
+        mover = RemoteMover(self.model)
+        try:
+            if len(sources) == 1 and not destination.endswith("/"):
+                results = [mover.rename(sources[0], destination)]
+            else:
+                results = mover.moveInto(sources, destination)
         except FTPError as exp:
             self.view.updateServerResponse(str(exp))
+            return
+
+        for result in results:
+            for source, target in result.renamed:
+                self.index.move(source, target)
+        self._reportReplies(
+            "Moved",
+            sources,
+            [[result.destination if result.error is None else result.error] for result in results],
+        )
+        moved = [result for result in results if result.error is None]
+        self._updateDirectoryNames(
+            added=[result.destination for result in moved],
+            removed=[result.source for result in moved],
+        )
+
+    @_newServerResponseEntry
+    def handleRotateKeys(self, event: Union[tk.EventType, None] = None) -> None:
+        """
+        Handle the rotate keys button being pressed, the keys of all the files below the
+        working directory are rewrapped without re-encrypting the files. The key field holds
+        the new public keys, and the private keys to retire; their envelopes are dropped.
+        An interrupted rotation resumes when it is started again with the same keys.
+
+        paramters
+        ---------
+        event: Union[tk.EventType, None]
+            The event that triggered the function call.
+        """
+
+        newKeys, retiredKeyIds = [], []
+        try:
+            for key in splitKeys(bytes(self.view.rsaKey, "utf-8")):
+                fingerprint = self.keyring.addKey(key)
+                if RSACipher(key).key.has_private():
+                    retiredKeyIds.append(fingerprint)
+                else:
+                    newKeys.append(key)
+        except ValueError as exp:
+            self.view.updateServerResponse(str(exp))
+            return
+        if not newKeys:
+            self.view.updateServerResponse("Enter the new public keys in the key field")
+            return
+
+        root = self.model.workingDirectory
+        rotation = KeyRotation(self.model.openSession, self.keyring, newKeys, retiredKeyIds)
+        rotation.journalPath = defaultJournalPath(
+            self.index.server, root, [keyId for keyId, _ in rotation.recipients], retiredKeyIds
+        )
+        try:
+            result = rotation.run(root)
+        except (UnableToConnect, NotAuthorized, FTPError, OSError) as exp:
+            self.view.updateServerResponse(str(exp))
+            return
+        for path, error in rotation.errors:
+            self.view.updateServerResponse(f"{path}: {error}\n")
+        self.view.updateServerResponse(
+            f"Rewrapped the keys of {result.rekeyed} of {result.found} files below {root}"
+            f" ({result.skipped} up to date, {result.failed} failed)"
+        )
+        self.keyCache.clear()
 
     @_newServerResponseEntry
     def handleDisconnect(self, event: Union[tk.EventType, None] = None) -> None:
@@ -304,6 +814,7 @@ class FTPClientPresenter:
             The event that triggered the function call.
         """
 
+        self.keyCache.clear()
         try:
             msg = self.model.disconnect()
             self.view.updateServerResponse(msg)
@@ -314,6 +825,148 @@ class FTPClientPresenter:
 
         self.view.updateServerResponse("\n")
 
+    @_newServerResponseEntry
+    def handleIndexTree(self, event: Union[tk.EventType, None] = None) -> None:
+        """
+        Handle the index tree button being pressed, the tree below the working directory
+        is walked and recorded in the local index.
+
+        paramters
+        ---------
+        event: Union[tk.EventType, None]
+            The event that triggered the function call.
+        """
+
+        root = self.model.workingDirectory
+        walker = RemoteTreeWalker.forModel(self.model)
+        try:
+            count = self.index.refreshTree(root, walker.walk(root))
+            self.view.updateServerResponse(f"Indexed {count} entries below {root}")
+            for directory, exp in walker.errors:
+                self.view.updateServerResponse(f"\nSkipped {directory}: {exp}")
+        except (UnableToConnect, NotAuthorized, FTPError) as exp:
+            self.view.updateServerResponse(str(exp))
+
+    @timed("presenter.handleSearch")
+    def handleSearch(self, event: Union[tk.EventType, None] = None) -> None:
+        """
+        Handle the search entry being edited, the local index is searched and the matching
+        files are shown in the directory list.
+
+        paramters
+        ---------
+        event: Union[tk.EventType, None]
+            The event that triggered the function call.
+        """
+
+        query = self.view.searchQuery
+        if not query:
+            self._displayDirectory()
+            return
+        self.view.updateDirectoryResponse(
+            [
+                entry.logicalPath + ("/" if entry.isDirectory else "")
+                for entry in self.index.search(query)
+            ]
+        )
+
+    def _selectedNames(self) -> List[str]:
+        return [name.strip() for name in self.view.mainInput.split(";") if name.strip()]
+
+    def _existingObjects(self, names: List[str]) -> List[List[str]]:
+        """
+        Objects of each file (its container and its legacy objects) which exist on the server.
+        The objects of the working directory are looked up in its last listing, the other
+        directories are listed once each.
+
+        paramters
+        ---------
+        names: List[str]
+            Files, relative to the working directory or absolute.
+
+        returns
+        -------
+        List[List[str]]
+            The names of the existing objects of each file.
+        """
+        extensions = (CONTAINER_EXTENSION, LEGACY_EXTENSION, LEGACY_KEY_EXTENSION)
+        known = set(self.remoteObjects)
+        unlisted = {
+            posixpath.dirname(self.model.remotePath(name))
+            for name in names
+            if not any(self.model.remotePath(name + extension) in known for extension in extensions)
+        }
+        for directory in unlisted:
+            known.update(
+                posixpath.join(directory, entryName)
+                for entryName, _ in self.model.listDirectory(directory)
+            )
+        return [
+            [
+                name + extension
+                for extension in extensions
+                if self.model.remotePath(name + extension) in known
+            ]
+            for name in names
+        ]
+
+    def _reportReplies(
+        self, action: str, names: List[str], replies: Sequence[Sequence[Union[str, FTPError]]]
+    ) -> List[str]:
+        """
+        Show the outcome of a bulk operation, an entry succeeded if one of its commands did.
+
+        paramters
+        ---------
+        action: str
+            Past tense of the operation, for the summary.
+        names: List[str]
+            Entries of the operation.
+        replies: Sequence[Sequence[Union[str, FTPError]]]
+            Replies of the commands of each entry.
+
+        returns
+        -------
+        List[str]
+            The entries which succeeded.
+        """
+
+        succeeded = []
+        for name, entryReplies in zip(names, replies):
+            if any(isinstance(reply, str) for reply in entryReplies):
+                succeeded.append(name)
+            else:
+                self.view.updateServerResponse(f"{name}: {entryReplies[0]}\n")
+        self.view.updateServerResponse(f"{action} {len(succeeded)} of {len(names)}: ")
+        self.view.updateServerResponse(", ".join(succeeded))
+        return succeeded
+
+    def _updateDirectoryNames(self, added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+        """
+        Update the directory list once after a bulk operation, without listing the server.
+
+        paramters
+        ---------
+        added: Iterable[str]
+            Entries created, relative to the working directory or absolute.
+        removed: Iterable[str]
+            Entries deleted, relative to the working directory or absolute.
+        """
+
+        def shownNames(names: Iterable[str]) -> List[str]:
+            paths = [self.model.remotePath(name) for name in names]
+            return [
+                posixpath.basename(path)
+                for path in paths
+                if posixpath.dirname(path) == self.model.workingDirectory
+            ]
+
+        removedNames = set(shownNames(removed))
+        fileList = [name for name in self.directoryNames if name not in removedNames]
+        fileList += [name for name in shownNames(added) if name not in fileList]
+        self.directoryNames = fileList
+        self.view.updateDirectoryResponse(fileList)
+
     def _displayDirectory(self) -> None:
         """
         display directory in directory list response text box.
@@ -324,8 +977,19 @@ class FTPClientPresenter:
             The event that triggered the function call.
         """
 
-        fileList = self.model.displayDirectory()
-        fileList = [fileName.replace(".enc", "") for fileName in fileList if ".key" not in fileName]
+        fileList: List[str] = []
+        seen = set()
+        remoteNames = self.model.displayDirectory()
+        self.remoteObjects = {
+            posixpath.join(self.model.workingDirectory, posixpath.basename(remoteName))
+            for remoteName in remoteNames
+        }
+        for remoteName in remoteNames:
+            fileName = logicalName(remoteName)
+            if fileName is not None and fileName not in seen:
+                seen.add(fileName)
+                fileList.append(fileName)
+        self.directoryNames = fileList
         self.view.updateDirectoryResponse(fileList)
 
     def run(self) -> None:
@@ -0,0 +1,123 @@
+"""
+This module profiles the operations of the client, each operation is run under cProfile and
+tracemalloc and a report is written for it: functions by cumulative time, allocation sites
+and peak memory.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Tuple
+
+DEFAULT_PROFILE_DIRECTORY = os.path.join(os.path.expanduser("~"), ".secure_ftp", "profiles")
+
+
+class OperationProfiler:  # pylint: disable=R0903
+    """
+    Profiler of the operations of the client, disabled by default.
+
+    A single operation is profiled at a time, operations started by other threads while
+    one is profiled run without profiling.
+
+    Only the calling thread is timed by function: the work of the threads an operation starts
+    (segments of a download, sessions of a tree upload or walk) shows as the time spent
+    waiting for them. Allocations and peak memory cover all the threads.
+    """
+
+    def __init__(self, directory: str = DEFAULT_PROFILE_DIRECTORY, top: int = 25) -> None:
+        self.enabled = False
+        self.directory = directory
+        self.top = top
+        self.lock = threading.Lock()
+        # reports written, numbers the reports of the same millisecond apart
+        self.reports = 0
+
+    def profile(
+        self, name: str, func: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Tuple[Any, str]:
+        """
+        Call a function under the profilers and write its report.
+
+        Parameters
+        ----------
+        name : str
+            name of the operation, used in the name of the report
+        func : Callable[..., Any]
+            function to call
+        Returns
+        -------
+        Tuple[Any, str]
+            result of the function and summary of the report, the summary is empty if the
+            function was not profiled
+        """
+
+        if not self.lock.acquire(blocking=False):  # pylint: disable=R1732
+            return func(*args, **kwargs), ""
+
+        try:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start(16)
+            elif hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            profiler = cProfile.Profile()
+            start = time.perf_counter()
+            try:
+                result = profiler.runcall(func, *args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                if not tracing:
+                    tracemalloc.stop()
+                path = self._writeReport(name, profiler, snapshot, seconds, peak)
+            return result, (
+                f"Profiled {name}: {seconds:.3f} s, peak memory {peak / 1024 / 1024:.1f} MiB, "
+                f"report {path}"
+            )
+        finally:
+            self.lock.release()
+
+    def _writeReport(
+        self,
+        name: str,
+        profiler: cProfile.Profile,
+        snapshot: tracemalloc.Snapshot,
+        seconds: float,
+        peak: int,
+    ) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        now = time.time()
+        self.reports += 1
+        fileName = (
+            f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+            f"-{self.reports}-{re.sub(r'[^A-Za-z0-9_.-]', '_', name)}"
+        )
+        path = os.path.join(self.directory, fileName + ".txt")
+
+        timings = io.StringIO()
+        stats = pstats.Stats(profiler, stream=timings)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        stats.dump_stats(os.path.join(self.directory, fileName + ".prof"))
+
+        allocations = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        ).statistics("lineno")
+
+        with open(path, "w", encoding="utf-8") as report:
+            report.write(f"Operation: {name}\n")
+            report.write(f"Wall time: {seconds:.6f} s\n")
+            report.write(f"Peak traced memory: {peak} bytes\n\n")
+            report.write(f"Top {self.top} functions by cumulative time, calling thread only\n")
+            report.write(timings.getvalue())
+            report.write(f"\nTop {self.top} allocation sites (memory held at the end)\n")
+            for statistic in allocations[: self.top]:
+                report.write(f"{statistic}\n")
+        return path
+
+
+PROFILER = OperationProfiler()
@@ -0,0 +1,514 @@
+"""
+This module works on the files stored on the server without decrypting them: it reads the
+header of a container without downloading its ciphertext, and rewraps the keys of all the
+files of a tree for new keys.
+"""
+import ftplib
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from src.cipher.engine import Buffer
+from src.cipher.RSA import RSACipher
+from src.file_handler.container import (
+    CONTAINER_EXTENSION,
+    LEGACY_KEY_EXTENSION,
+    SLOT_HEADER_SIZE,
+    ContainerHeader,
+    KeyEnvelope,
+    TruncatedHeader,
+    packHeader,
+    packSlot,
+    readHeader,
+    slotOffset,
+)
+from src.file_handler.keyring import Keyring
+
+from .model import FTPConnectionModel, FTPError
+from .remote_walker import RemoteTreeWalker
+
+DEFAULT_JOURNAL_DIRECTORY = os.path.join(os.path.expanduser("~"), ".secure_ftp", "rekey")
+
+# suffix of the objects uploaded before they replace the rewrapped ones
+_TEMPORARY_SUFFIX = ".rekey"
+
+
+def remoteHeader(model: FTPConnectionModel, containerPath: str) -> Tuple[ContainerHeader, bytes]:
+    """
+    Read the header of a container on the server, without downloading the rest of it.
+
+    Parameters
+    ----------
+    model : FTPConnectionModel
+        logged in session
+    containerPath : str
+        path of the container on the server
+    Returns
+    -------
+    Tuple[ContainerHeader, bytes]
+        the header and its serialized form
+    """
+
+    length = 64 * 1024
+    while True:
+        buffer = io.BytesIO()
+        received = model.downloadRange(containerPath, 0, length, buffer)
+        stream = io.BytesIO(buffer.getvalue())
+        try:
+            header = readHeader(stream)
+        except TruncatedHeader:
+            # the segment hashes of large files do not fit in the first read
+            if received < length:
+                raise
+            length *= 4
+            continue
+        return header, stream.getvalue()[: stream.tell()]
+
+
+def defaultJournalPath(
+    server: str, root: str, keyIds: Sequence[bytes], retiredKeyIds: Sequence[bytes] = ()
+) -> str:
+    """
+    Journal of a key rotation, the same for a rotation of the same tree to the same keys
+    retiring the same keys, so an interrupted rotation resumes.
+
+    Parameters
+    ----------
+    server : str
+        server of the tree, for instance user@host:port
+    root : str
+        absolute path of the root of the tree
+    keyIds : Sequence[bytes]
+        fingerprints of the new keys
+    retiredKeyIds : Sequence[bytes]
+        fingerprints of the retired keys
+    Returns
+    -------
+    str
+        path of the journal
+    """
+
+    digest = hashlib.sha256(
+        "\n".join(
+            [
+                server,
+                root,
+                *sorted(map(bytes.hex, keyIds)),
+                "-",
+                *sorted(map(bytes.hex, retiredKeyIds)),
+            ]
+        ).encode()
+    )
+    return os.path.join(DEFAULT_JOURNAL_DIRECTORY, digest.hexdigest()[:32] + ".journal")
+
+
+class RekeyProgress(NamedTuple):
+    """
+    Progress of a key rotation, reported after each file.
+    """
+
+    found: int
+    rekeyed: int
+    skipped: int
+    failed: int
+    path: str
+
+
+class KeyRotation:  # pylint: disable=R0902
+    """
+    Rewraps the keys of all the files of a remote tree for new public keys, and drops the
+    envelopes of retired keys. The ciphertext of the files is never decrypted.
+
+    The keys file of a legacy file is rewrapped on its own, a few hundred bytes are
+    transferred per file. The envelopes of a container are kept in fixed size slots of its
+    header, so they are rewritten in place (REST then STOR) and only the header is
+    transferred: the new envelopes are written to free slots before the slots of the retired
+    keys are cleared, so the file always keeps an envelope it can be opened with. Containers
+    of older versions, containers without enough free slots, and servers which truncate a
+    file stored at an offset fall back to streaming the container through unchanged behind
+    its new header, with new spare slots. An object is replaced by uploading it under a
+    temporary name and renaming it over the old one, so a file is never left half written.
+
+    Files are rewrapped over several sessions while the tree is walked. Rewrapped files are
+    recorded in a journal, so an interrupted rotation resumes where it stopped; the journal
+    is removed once every file is rewrapped.
+    """
+
+    def __init__(
+        self,
+        sessionFactory: Callable[[], FTPConnectionModel],
+        keyring: Keyring,
+        newKeys: Sequence[bytes],
+        retiredKeyIds: Sequence[bytes] = (),
+        workers: int = 4,
+        journalPath: Optional[str] = None,
+    ) -> None:
+        self.sessionFactory = sessionFactory
+        self.keyring = keyring
+        self.recipients = [
+            (rsaCipher.fingerprint(), rsaCipher) for rsaCipher in map(RSACipher, newKeys)
+        ]
+        self.retiredKeyIds = set(retiredKeyIds)
+        self.workers = workers
+        self.journalPath = journalPath
+        self.errors: List[Tuple[str, Exception]] = []
+        # whether the server overwrites a file from an offset without truncating it, probed
+        # once per rotation on the first container with free slots
+        self.patching: Optional[bool] = None
+        self.probeLock = threading.Lock()
+
+    def run(
+        self, root: str, progress: Optional[Callable[[RekeyProgress], Any]] = None
+    ) -> RekeyProgress:
+        """
+        Rewrap the keys of all the containers and legacy keys files below a directory.
+
+        Parameters
+        ----------
+        root : str
+            absolute path of the root of the tree
+        progress : Optional[Callable[[RekeyProgress], Any]]
+            called after each file, from the worker threads
+        Returns
+        -------
+        RekeyProgress
+            the final counts, the failures are recorded in errors
+        """
+
+        state = _RotationState(self.journalPath, progress)
+        self.errors = state.errors
+        self.patching = None
+        walker = RemoteTreeWalker(self.sessionFactory, self.workers)
+        sessions: List[FTPConnectionModel] = []
+        local = threading.local()
+
+        def rekey(path: str) -> None:
+            session = getattr(local, "session", None)
+            try:
+                if session is None:
+                    session = local.session = self.sessionFactory()
+                    with state.lock:
+                        sessions.append(session)
+                if path.endswith(CONTAINER_EXTENSION):
+                    changed = self.rekeyContainer(session, path)
+                else:
+                    changed = self.rekeyKeysFile(session, path)
+            except Exception as exp:  # pylint: disable=W0703
+                state.record(path, exp)
+            else:
+                state.record(path, changed)
+
+        complete = False
+        try:
+            with ThreadPoolExecutor(self.workers) as executor:
+                for entry in walker.walk(root):
+                    if entry.isDirectory or not entry.path.endswith(
+                        (CONTAINER_EXTENSION, LEGACY_KEY_EXTENSION)
+                    ):
+                        continue
+                    if state.find(entry.path):
+                        executor.submit(rekey, entry.path)
+            complete = True
+        finally:
+            for session in sessions:
+                session.close()
+            self.errors += walker.errors
+            state.close(complete)
+        return state.snapshot("")
+
+    def rekeyContainer(self, session: FTPConnectionModel, path: str) -> bool:
+        """
+        Rewrap the keys of a container: the envelopes of the retired keys are dropped and
+        envelopes are added for the new keys.
+
+        Parameters
+        ----------
+        session : FTPConnectionModel
+            logged in session
+        path : str
+            path of the container on the server
+        Returns
+        -------
+        bool
+            False if the container already had the new keys and none of the retired ones
+        """
+
+        header, packedHeader = remoteHeader(session, path)
+        retired = [
+            index
+            for index, envelope in enumerate(header.envelopes)
+            if not envelope.keyId or envelope.keyId in self.retiredKeyIds
+        ]
+        envelopes = [
+            envelope for index, envelope in enumerate(header.envelopes) if index not in retired
+        ]
+        present = {envelope.keyId for envelope in envelopes}
+        missing = [
+            (keyId, rsaCipher) for keyId, rsaCipher in self.recipients if keyId not in present
+        ]
+        if not missing and not retired:
+            return False
+        if not envelopes and not missing:
+            raise ValueError("The file would not be shared with any key")
+
+        added = []
+        if missing:
+            payload = self.keyring.unwrapEnvelopes(header.envelopes)
+            added = [KeyEnvelope(keyId, rsaCipher.encrypt(payload)) for keyId, rsaCipher in missing]
+
+        if self._fitsSlots(header, added) and self._patchingSupported(session, path):
+            self._patchSlots(session, path, header, added, retired)
+            rewritten, _ = remoteHeader(session, path)
+            if sorted(rewritten.envelopes) != sorted(envelopes + added):
+                raise FTPError(f"The envelopes of {path} were not rewritten")
+            return True
+
+        with tempfile.TemporaryFile() as file:
+            # the new header is laid out again, with spare slots for the next rotations
+            file.write(
+                packHeader(
+                    header._replace(envelopes=envelopes + added, slots=(), slotCount=0, slotSize=0)
+                )
+            )
+            skipped = 0
+
+            def receive(block: Buffer) -> None:
+                # the old header is dropped, the ciphertext is copied as it is
+                nonlocal skipped
+                with memoryview(block) as view:
+                    start = min(len(packedHeader) - skipped, len(view))
+                    skipped += start
+                    file.write(view[start:])
+
+            session.retrieve(path, receive)
+            file.seek(0)
+            self._replace(session, path, file)
+        return True
+
+    def rekeyKeysFile(self, session: FTPConnectionModel, path: str) -> bool:
+        """
+        Rewrap the keys file of a legacy file, which holds the keys wrapped for a single key.
+        A keys file records no key id, so it is only known to be up to date when the private
+        key of the new key is in the keyring.
+
+        Parameters
+        ----------
+        session : FTPConnectionModel
+            logged in session
+        path : str
+            path of the keys file on the server
+        Returns
+        -------
+        bool
+            False if the keys file was already wrapped for the new key
+        """
+
+        if len(self.recipients) != 1:
+            raise ValueError("A legacy keys file can only be wrapped for a single key")
+        keyId, rsaCipher = self.recipients[0]
+
+        buffer = io.BytesIO()
+        session.retrieve(path, buffer.write)
+        wrappedKeys = buffer.getvalue()
+        newPrivateKey = self.keyring.privateKey(keyId)
+        if newPrivateKey is not None:
+            try:
+                newPrivateKey.decrypt(wrappedKeys)
+                return False
+            except ValueError:
+                pass
+
+        keys = self.keyring.unwrap(wrappedKeys)
+        self._replace(session, path, io.BytesIO(rsaCipher.encrypt(keys)))
+        return True
+
+    @staticmethod
+    def _fitsSlots(header: ContainerHeader, added: Sequence[KeyEnvelope]) -> bool:
+        free = header.slotCount - len(header.slots)
+        return (
+            header.version >= 5
+            and len(added) <= free
+            and all(SLOT_HEADER_SIZE + len(env.wrappedKeys) <= header.slotSize for env in added)
+        )
+
+    def _patchingSupported(self, session: FTPConnectionModel, path: str) -> bool:
+        with self.probeLock:
+            if self.patching is None:
+                self.patching = _probePatching(session, path)
+            return self.patching
+
+    @staticmethod
+    def _patchSlots(
+        session: FTPConnectionModel,
+        path: str,
+        header: ContainerHeader,
+        added: Sequence[KeyEnvelope],
+        retired: Sequence[int],
+    ) -> None:
+        table: Dict[int, Optional[KeyEnvelope]] = dict(zip(header.slots, header.envelopes))
+        free = [slot for slot in range(header.slotCount) if slot not in table]
+        # the new envelopes are written before the retired ones are cleared, an interrupted
+        # rotation leaves the file readable with the old or the new keys
+        patches: List[Dict[int, Optional[KeyEnvelope]]] = [
+            dict(zip(free, added)),
+            {header.slots[index]: None for index in retired},
+        ]
+        for changes in patches:
+            if not changes:
+                continue
+            table.update(changes)
+            first, last = min(changes), max(changes)
+            span = b"".join(
+                packSlot(table.get(slot), header.slotSize) for slot in range(first, last + 1)
+            )
+            session.store(path, io.BytesIO(span), offset=slotOffset(header, first))
+
+    @staticmethod
+    def _replace(session: FTPConnectionModel, path: str, file: Any) -> None:
+        temporaryPath = path + _TEMPORARY_SUFFIX
+        session.store(temporaryPath, file)
+        try:
+            session.rename(temporaryPath, path)
+        except FTPError:
+            # servers which refuse to rename over an existing file
+            session.deleteFile(path)
+            session.rename(temporaryPath, path)
+
+
+def _probePatching(session: FTPConnectionModel, containerPath: str) -> bool:
+    """
+    Check that the server overwrites a file from an offset (REST then STOR) and keeps the rest
+    of it, on a container being rotated: its last but one byte is stored again with its own
+    value. A server which truncates the file at the offset only drops the last byte, which is
+    stored back, so the container is left as it was either way.
+
+    Parameters
+    ----------
+    session : FTPConnectionModel
+        logged in session
+    containerPath : str
+        path of the container on the server
+    Returns
+    -------
+    bool
+        whether the envelopes of the containers can be rewritten in place
+    """
+
+    try:
+        size = int(session.fileFacts(containerPath)["size"])
+        buffer = io.BytesIO()
+        session.downloadRange(containerPath, size - 2, 2, buffer)
+        tail = buffer.getvalue()[-2:]
+        session.store(containerPath, io.BytesIO(tail[:1]), offset=size - 2)
+        if int(session.fileFacts(containerPath)["size"]) == size:
+            return True
+    except (FTPError, ftplib.Error, OSError, EOFError, KeyError, ValueError):
+        return False
+    # the last byte is stored back, a failure is reported with the container
+    session.store(containerPath, io.BytesIO(tail[1:]), offset=size - 1)
+    return False
+
+
+class _RotationState:
+    """
+    Counts and journal of a key rotation, shared by the worker threads.
+    """
+
+    def __init__(
+        self, journalPath: Optional[str], progress: Optional[Callable[[RekeyProgress], Any]]
+    ) -> None:
+        self.lock = threading.Lock()
+        self.progress = progress
+        self.counts = {"found": 0, "rekeyed": 0, "skipped": 0, "failed": 0}
+        self.errors: List[Tuple[str, Exception]] = []
+        self.finished: Set[str] = set()
+        self.journalPath = journalPath
+        self.journal = None
+        if journalPath is not None:
+            if os.path.exists(journalPath):
+                with open(journalPath, encoding="utf-8") as journal:
+                    self.finished = {line.rstrip("\n") for line in journal}
+            os.makedirs(os.path.dirname(journalPath) or ".", exist_ok=True)
+            self.journal = open(journalPath, "a", encoding="utf-8")  # pylint: disable=R1732
+
+    def find(self, path: str) -> bool:
+        """
+        Count a file found by the walk.
+
+        Parameters
+        ----------
+        path : str
+            absolute path of the file
+        Returns
+        -------
+        bool
+            False if the journal records the file as rewrapped already
+        """
+
+        with self.lock:
+            self.counts["found"] += 1
+            if path in self.finished:
+                self.counts["skipped"] += 1
+                return False
+            return True
+
+    def record(self, path: str, outcome: Any) -> None:
+        """
+        Record the outcome of a file and report the progress.
+
+        Parameters
+        ----------
+        path : str
+            absolute path of the file
+        outcome : Any
+            True if the file was rewrapped, False if it was up to date, or the error
+        """
+
+        with self.lock:
+            if isinstance(outcome, Exception):
+                self.counts["failed"] += 1
+                self.errors.append((path, outcome))
+            else:
+                self.counts["rekeyed" if outcome else "skipped"] += 1
+                if self.journal is not None:
+                    self.journal.write(path + "\n")
+                    self.journal.flush()
+            snapshot = self.snapshot(path)
+        if self.progress is not None:
+            self.progress(snapshot)
+
+    def snapshot(self, path: str) -> RekeyProgress:
+        """
+        Current counts.
+
+        Parameters
+        ----------
+        path : str
+            last file processed
+        Returns
+        -------
+        RekeyProgress
+            the counts
+        """
+
+        return RekeyProgress(path=path, **self.counts)
+
+    def close(self, complete: bool) -> None:
+        """
+        Close the journal, it is removed once every file is rewrapped.
+
+        Parameters
+        ----------
+        complete : bool
+            whether the whole tree was walked
+        """
+
+        if self.journal is None or self.journalPath is None:
+            return
+        self.journal.close()
+        if complete and not self.errors:
+            os.remove(self.journalPath)
@@ -0,0 +1,382 @@
+"""
+This module keeps a local SQLite index of the remote files, so files are found without
+browsing the server directory by directory.
+"""
+import os
+import posixpath
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from src.file_handler.container import LEGACY_KEY_EXTENSION, logicalName
+
+from .remote_walker import RemoteEntry
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".secure_ftp", "index.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    server TEXT NOT NULL,
+    path TEXT NOT NULL,
+    directory TEXT NOT NULL,
+    logicalName TEXT NOT NULL,
+    logicalPath TEXT NOT NULL,
+    isDirectory INTEGER NOT NULL,
+    isKeys INTEGER NOT NULL,
+    size INTEGER,
+    modified TEXT,
+    keyIds TEXT,
+    contentHash TEXT,
+    PRIMARY KEY (server, path)
+);
+CREATE INDEX IF NOT EXISTS entriesByName ON entries (server, logicalName COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS entriesByDirectory ON entries (server, directory);
+"""
+
+# substring search uses a trigram full text index when SQLite is built with FTS5
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entryNames USING fts5(
+    logicalName, content='entries', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS entriesInsert AFTER INSERT ON entries BEGIN
+    INSERT INTO entryNames(rowid, logicalName) VALUES (new.rowid, new.logicalName);
+END;
+CREATE TRIGGER IF NOT EXISTS entriesDelete AFTER DELETE ON entries BEGIN
+    INSERT INTO entryNames(entryNames, rowid, logicalName)
+    VALUES ('delete', old.rowid, old.logicalName);
+END;
+CREATE TRIGGER IF NOT EXISTS entriesUpdate AFTER UPDATE ON entries BEGIN
+    INSERT INTO entryNames(entryNames, rowid, logicalName)
+    VALUES ('delete', old.rowid, old.logicalName);
+    INSERT INTO entryNames(rowid, logicalName) VALUES (new.rowid, new.logicalName);
+END;
+"""
+
+_Row = Tuple[Any, ...]
+
+_COLUMNS = "path, logicalPath, isDirectory, size, modified, keyIds, contentHash"
+
+_NAME_LIKE = f"""
+SELECT {_COLUMNS} FROM entries
+WHERE server = ? AND isKeys = 0 AND logicalName LIKE ? ESCAPE '\\'
+ORDER BY logicalName COLLATE NOCASE LIMIT ?
+"""
+
+_NAME_MATCH = f"""
+SELECT {_COLUMNS} FROM entryNames JOIN entries ON entries.rowid = entryNames.rowid
+WHERE entryNames MATCH ? AND server = ? AND isKeys = 0
+ORDER BY entries.logicalName COLLATE NOCASE LIMIT ?
+"""
+
+_UPSERT = """
+INSERT INTO entries (server, path, directory, logicalName, logicalPath, isDirectory, isKeys,
+                     size, modified, keyIds, contentHash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (server, path) DO UPDATE SET
+    size = excluded.size,
+    modified = excluded.modified,
+    keyIds = COALESCE(excluded.keyIds, entries.keyIds),
+    contentHash = COALESCE(excluded.contentHash, entries.contentHash)
+"""
+
+
+class IndexEntry(NamedTuple):
+    """
+    Remote file or directory found in the index.
+    """
+
+    path: str
+    logicalPath: str
+    isDirectory: bool
+    size: Optional[int]
+    modified: Optional[str]
+    keyIds: Optional[str]
+    contentHash: Optional[str]
+
+
+class RemoteIndex:
+    """
+    Local SQLite index of remote entries, per server.
+
+    Entries are recorded by walks and by the operations of the client (upload, delete, create
+    directory). The objects of a file (container, legacy ciphertext and keys) are folded under
+    the logical path of the file, so a search returns each file once. Searches match the
+    logical name by prefix (name index) and by substring (trigram full text index), without
+    any round trip to the server.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, server: str = "") -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(_SCHEMA)
+        try:
+            self.connection.executescript(_FTS_SCHEMA)
+            self.fullText = True
+        except sqlite3.OperationalError:
+            self.fullText = False
+        self.server = server
+        self.lock = threading.Lock()
+
+    def add(
+        self,
+        path: str,
+        facts: Dict[str, str],
+        keyIds: Optional[List[bytes]] = None,
+        contentHash: Optional[str] = None,
+    ) -> None:
+        """
+        Record a remote entry, or update it.
+
+        Parameters
+        ----------
+        path : str
+            absolute path on the server
+        facts : Dict[str, str]
+            facts of the entry (type, size, modify), missing facts are left empty
+        keyIds : Optional[List[bytes]]
+            fingerprints of the keys the file is shared with, kept if unknown
+        contentHash : Optional[str]
+            hash of the content, kept if unknown
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute(_UPSERT, self._row(path, facts, keyIds, contentHash))
+
+    def addEntries(
+        self,
+        entries: Iterable[RemoteEntry],
+        batchSize: int = 1000,
+        keyIds: Optional[List[bytes]] = None,
+    ) -> int:
+        """
+        Record the entries found by a walk, in batches of one transaction each.
+
+        Parameters
+        ----------
+        entries : Iterable[RemoteEntry]
+            entries to record, for instance RemoteTreeWalker.walk
+        batchSize : int
+            number of entries per transaction
+        keyIds : Optional[List[bytes]]
+            fingerprints of the keys the files are shared with, kept if unknown
+        Returns
+        -------
+        int
+            number of entries recorded
+        """
+
+        count = 0
+        batch: List[_Row] = []
+        for entry in entries:
+            batch.append(
+                self._row(entry.path, entry.facts, None if entry.isDirectory else keyIds, None)
+            )
+            if len(batch) >= batchSize:
+                count += self._addRows(batch)
+                batch = []
+        return count + self._addRows(batch)
+
+    def refreshTree(self, root: str, entries: Iterable[RemoteEntry], batchSize: int = 1000) -> int:
+        """
+        Record the entries found by a walk of a tree, and forget the entries of the tree the
+        walk did not find. Fingerprints and hashes of the entries found are kept.
+
+        Parameters
+        ----------
+        root : str
+            absolute path of the root of the walk
+        entries : Iterable[RemoteEntry]
+            entries found below the root
+        batchSize : int
+            number of entries per transaction
+        Returns
+        -------
+        int
+            number of entries recorded
+        """
+
+        seen: Set[str] = set()
+
+        def record() -> Iterator[RemoteEntry]:
+            for entry in entries:
+                seen.add(posixpath.normpath(entry.path))
+                yield entry
+
+        count = self.addEntries(record(), batchSize)
+        prefix = posixpath.normpath(root).rstrip("/")
+        with self.lock, self.connection:
+            stale = [
+                (self.server, path)
+                for (path,) in self.connection.execute(
+                    "SELECT path FROM entries WHERE server = ? AND path > ? AND path < ?",
+                    (self.server, prefix + "/", prefix + "0"),
+                )
+                if path not in seen
+            ]
+            self.connection.executemany("DELETE FROM entries WHERE server = ? AND path = ?", stale)
+        return count
+
+    def remove(self, path: str) -> None:
+        """
+        Forget a remote entry, and all the entries below it for a directory.
+
+        Parameters
+        ----------
+        path : str
+            absolute path on the server
+        """
+
+        self.removeAll([path])
+
+    def removeAll(self, paths: Iterable[str]) -> None:
+        """
+        Forget remote entries, and all the entries below the directories, in one transaction.
+
+        Parameters
+        ----------
+        paths : Iterable[str]
+            absolute paths on the server
+        """
+
+        rows = []
+        for path in paths:
+            path = posixpath.normpath(path)
+            prefix = path.rstrip("/")
+            rows.append((self.server, path, prefix + "/", prefix + "0"))
+        with self.lock, self.connection:
+            # paths below the directory sort between "<path>/" and "<path>0" ("0" follows "/")
+            self.connection.executemany(
+                "DELETE FROM entries WHERE server = ? AND (path = ? OR (path > ? AND path < ?))",
+                rows,
+            )
+
+    def move(self, source: str, destination: str) -> None:
+        """
+        Record the move of a remote entry, and of all the entries below it for a directory.
+        Fingerprints and hashes of the entries are kept.
+
+        Parameters
+        ----------
+        source : str
+            absolute path on the server before the move
+        destination : str
+            absolute path on the server after the move
+        """
+
+        source, destination = posixpath.normpath(source), posixpath.normpath(destination)
+        selection = (self.server, source, source.rstrip("/") + "/", source.rstrip("/") + "0")
+        with self.lock, self.connection:
+            rows = self.connection.execute(
+                "SELECT path, isDirectory, size, modified, keyIds, contentHash FROM entries "
+                "WHERE server = ? AND (path = ? OR (path > ? AND path < ?))",
+                selection,
+            ).fetchall()
+            self.connection.execute(
+                "DELETE FROM entries WHERE server = ? AND (path = ? OR (path > ? AND path < ?))",
+                selection,
+            )
+            moved = []
+            for path, isDirectory, size, modified, keyIds, contentHash in rows:
+                facts = {"type": "dir" if isDirectory else "file"}
+                if size is not None:
+                    facts["size"] = str(size)
+                if modified is not None:
+                    facts["modify"] = modified
+                row = self._row(destination + path[len(source) :], facts, None, contentHash)
+                moved.append((*row[:9], keyIds, contentHash))
+            self.connection.executemany(_UPSERT, moved)
+
+    def search(self, text: str, limit: int = 100) -> List[IndexEntry]:
+        """
+        Find the files whose logical name starts with or contains a text, case insensitive.
+        Prefix matches come first.
+
+        Parameters
+        ----------
+        text : str
+            text to look for in the names
+        limit : int
+            maximum number of results
+        Returns
+        -------
+        List[IndexEntry]
+            matching files, one per logical path
+        """
+
+        if not text:
+            return []
+
+        results: Dict[str, IndexEntry] = {}
+        with self.lock:
+            self._collect(results, _NAME_LIKE, (self.server, _escapeLike(text) + "%", limit), limit)
+            if len(results) < limit:
+                if self.fullText and len(text) >= 3:
+                    query = _NAME_MATCH
+                    parameters = ('"' + text.replace('"', '""') + '"', self.server, 2 * limit)
+                else:
+                    query = _NAME_LIKE
+                    parameters = (self.server, "%" + _escapeLike(text) + "%", 2 * limit)
+                self._collect(results, query, parameters, limit)
+        return list(results.values())
+
+    def close(self) -> None:
+        """
+        Close the index database.
+        """
+
+        with self.lock:
+            self.connection.close()
+
+    def _row(
+        self,
+        path: str,
+        facts: Dict[str, str],
+        keyIds: Optional[List[bytes]],
+        contentHash: Optional[str],
+    ) -> _Row:
+        path = posixpath.normpath(path)
+        directory, name = posixpath.split(path)
+        isDirectory = facts.get("type", "").lower() == "dir"
+        isKeys = not isDirectory and name.endswith(LEGACY_KEY_EXTENSION)
+        if isDirectory:
+            fileName = name
+        elif isKeys:
+            fileName = name[: -len(LEGACY_KEY_EXTENSION)]
+        else:
+            fileName = logicalName(name) or name
+        size = facts.get("size")
+        return (
+            self.server,
+            path,
+            directory,
+            fileName,
+            posixpath.join(directory, fileName),
+            int(isDirectory),
+            int(isKeys),
+            int(size) if size and size.isdigit() else None,
+            facts.get("modify"),
+            ",".join(keyId.hex() for keyId in keyIds) if keyIds is not None else None,
+            contentHash,
+        )
+
+    def _addRows(self, rows: List[_Row]) -> int:
+        if not rows:
+            return 0
+        with self.lock, self.connection:
+            self.connection.executemany(_UPSERT, rows)
+        return len(rows)
+
+    def _collect(
+        self, results: Dict[str, IndexEntry], query: str, parameters: _Row, limit: int
+    ) -> None:
+        for row in self.connection.execute(query, parameters):
+            entry = IndexEntry(row[0], row[1], bool(row[2]), row[3], row[4], row[5], row[6])
+            if entry.logicalPath not in results:
+                results[entry.logicalPath] = entry
+                if len(results) >= limit:
+                    return
+
+
+def _escapeLike(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
@@ -0,0 +1,181 @@
+"""
+This module renames and moves files on the server (RNFR and RNTO), without downloading,
+decrypting, encrypting and uploading them again.
+"""
+import posixpath
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple, Union
+
+from src.file_handler.container import CONTAINER_EXTENSION, LEGACY_EXTENSION, LEGACY_KEY_EXTENSION
+
+from .model import FTPConnectionModel, FTPError
+
+# suffixes of the objects of a logical file, "" for a directory or a file stored as it is
+_SUFFIXES = ("", CONTAINER_EXTENSION, LEGACY_EXTENSION, LEGACY_KEY_EXTENSION)
+
+
+class MoveResult(NamedTuple):
+    """
+    Outcome of the move of a logical file or directory.
+    """
+
+    source: str
+    destination: str
+    renamed: List[Tuple[str, str]]
+    error: Optional[FTPError]
+
+
+class RemoteMover:
+    """
+    Server-side rename and move of logical files.
+
+    A logical file is moved with all its objects: its container, or the ciphertext and keys
+    of a legacy file. If an object cannot be renamed, the objects already renamed are renamed
+    back, so a file is never split between two names. A directory is renamed at once with
+    its whole tree. The renames of a batch are pipelined on the control connection, and each
+    directory involved is listed once to find the objects and refuse to overwrite a file.
+    """
+
+    def __init__(self, model: FTPConnectionModel) -> None:
+        self.model = model
+
+    def rename(self, source: str, destination: str) -> MoveResult:
+        """
+        Rename or move a logical file or directory.
+
+        Parameters
+        ----------
+        source : str
+            logical path, absolute or relative to the working directory
+        destination : str
+            new logical path, absolute or relative to the working directory
+        Returns
+        -------
+        MoveResult
+            the outcome of the move
+        """
+
+        return self.moveAll([(source, destination)])[0]
+
+    def moveInto(self, sources: Sequence[str], directory: str) -> List[MoveResult]:
+        """
+        Move logical files and directories into a directory, keeping their names.
+
+        Parameters
+        ----------
+        sources : Sequence[str]
+            logical paths, absolute or relative to the working directory
+        directory : str
+            destination directory
+        Returns
+        -------
+        List[MoveResult]
+            the outcome of each move, in order
+        """
+
+        return self.moveAll(
+            [
+                (source, posixpath.join(directory, posixpath.basename(posixpath.normpath(source))))
+                for source in sources
+            ]
+        )
+
+    def moveAll(self, moves: Sequence[Tuple[str, str]]) -> List[MoveResult]:
+        """
+        Rename or move logical files and directories.
+
+        Parameters
+        ----------
+        moves : Sequence[Tuple[str, str]]
+            logical source and destination paths, absolute or relative to the working
+            directory
+        Returns
+        -------
+        List[MoveResult]
+            the outcome of each move, in order
+        """
+
+        paths = [
+            (self.model.remotePath(source), self.model.remotePath(destination))
+            for source, destination in moves
+        ]
+        listings = self._listings({posixpath.dirname(path) for move in paths for path in move})
+        plans = [self._plan(source, destination, listings) for source, destination in paths]
+
+        replies = iter(
+            self.model.pipeline(
+                [
+                    command
+                    for _, pairs in plans
+                    for source, destination in pairs
+                    for command in (f"RNFR {source}", f"RNTO {destination}")
+                ]
+            )
+        )
+
+        return [
+            self._outcome(source, destination, plan, replies)
+            for (source, destination), plan in zip(paths, plans)
+        ]
+
+    def _outcome(
+        self,
+        source: str,
+        destination: str,
+        plan: Tuple[Optional[FTPError], List[Tuple[str, str]]],
+        replies: Iterator[Union[str, FTPError]],
+    ) -> MoveResult:
+        error, pairs = plan
+        renamed: List[Tuple[str, str]] = []
+        for pair in pairs:
+            fromReply, toReply = next(replies), next(replies)
+            failure = fromReply if isinstance(fromReply, FTPError) else toReply
+            if not isinstance(failure, FTPError):
+                renamed.append(pair)
+            elif error is None:
+                error = failure
+        if error is not None and renamed:
+            error = self._rollBack(renamed, error)
+        return MoveResult(source, destination, renamed, error)
+
+    def _listings(self, directories: Set[str]) -> Dict[str, Union[Set[str], FTPError]]:
+        listings: Dict[str, Union[Set[str], FTPError]] = {}
+        for directory in directories:
+            try:
+                listings[directory] = {name for name, _ in self.model.listDirectory(directory)}
+            except FTPError as exp:
+                listings[directory] = exp
+        return listings
+
+    def _plan(
+        self, source: str, destination: str, listings: Dict[str, Union[Set[str], FTPError]]
+    ) -> Tuple[Optional[FTPError], List[Tuple[str, str]]]:
+        # objects to rename, the listings are updated so the next moves of the batch see them
+        sourceNames = listings[posixpath.dirname(source)]
+        destinationNames = listings[posixpath.dirname(destination)]
+        if isinstance(sourceNames, FTPError):
+            return sourceNames, []
+        if isinstance(destinationNames, FTPError):
+            return destinationNames, []
+
+        sourceName, destinationName = posixpath.basename(source), posixpath.basename(destination)
+        suffixes = [suffix for suffix in _SUFFIXES if sourceName + suffix in sourceNames]
+        if not suffixes:
+            return FTPError(f"550 {source}: No such file or directory."), []
+        if any(destinationName + suffix in destinationNames for suffix in _SUFFIXES):
+            return FTPError(f"550 {destination}: File exists."), []
+
+        for suffix in suffixes:
+            sourceNames.discard(sourceName + suffix)
+            destinationNames.add(destinationName + suffix)
+        return None, [(source + suffix, destination + suffix) for suffix in suffixes]
+
+    def _rollBack(self, renamed: List[Tuple[str, str]], error: FTPError) -> FTPError:
+        # the objects renamed before the failure take their names back, in reverse order
+        while renamed:
+            source, destination = renamed[-1]
+            try:
+                self.model.rename(destination, source)
+            except FTPError as exp:
+                return FTPError(f"{error}, rollback of {destination} failed: {exp}")
+            renamed.pop()
+        return FTPError(f"{error}, rolled back")
@@ -0,0 +1,265 @@
+"""
+This module uploads a local directory tree to the server, each file encrypted into a
+container, over several sessions at once.
+"""
+import collections
+import os
+import posixpath
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from src.cipher.engines import DEFAULT_ENGINE
+from src.file_handler.container import CONTAINER_EXTENSION
+from src.file_handler.file_cryptographer import FileCryptographer
+
+from .model import FTPConnectionModel, FTPError, NotAuthorized, UnableToConnect
+
+
+class UploadResult(NamedTuple):
+    """
+    Outcome of the upload of a local file.
+    """
+
+    localPath: str
+    remotePath: str
+    size: int
+    error: Optional[Exception]
+
+
+class TreeUploader:
+    """
+    Recursive upload of a local directory tree.
+
+    The remote directories of the tree are computed up front. Whether they exist is looked
+    up in an existence map, filled by listing each existing parent directory once: below a
+    directory which is created, no directory can exist yet and none is listed. The missing
+    directories are then created with pipelined MKD commands, parents first.
+
+    Files are encrypted into containers in a temporary directory and stored by absolute
+    path, so the sessions never change directory. They are spread over a pool of sessions,
+    the largest first, and the sessions keep the binary transfer type between files, so each
+    file costs little more than its STOR. The session of the model is one of them, and fewer
+    sessions are used when the server refuses more. Every file has a result, with the error
+    which made it fail if any.
+    """
+
+    def __init__(
+        self,
+        model: FTPConnectionModel,
+        publicKeys: Sequence[bytes],
+        engineName: str = DEFAULT_ENGINE,
+        sessions: int = 4,
+    ) -> None:
+        self.model = model
+        self.publicKeys = list(publicKeys)
+        self.engineName = engineName
+        self.sessions = sessions
+        # absolute remote directory -> whether it exists, and the directories listed
+        self.directories: Dict[str, bool] = {"/": True}
+        self.listed: Set[str] = set()
+
+    def upload(
+        self,
+        localRoot: str,
+        remoteDirectory: str,
+        progress: Optional[Callable[[UploadResult], Any]] = None,
+    ) -> Tuple[List[str], List[UploadResult]]:
+        """
+        Upload a local directory tree into a remote directory, under the name of the local
+        directory.
+
+        Parameters
+        ----------
+        localRoot : str
+            local directory to upload
+        remoteDirectory : str
+            remote directory receiving the tree, absolute or relative to the working
+            directory
+        progress : Optional[Callable[[UploadResult], Any]]
+            called after each file, from the worker threads
+        Returns
+        -------
+        Tuple[List[str], List[UploadResult]]
+            the remote directories created and the outcome of each file
+        """
+
+        localRoot = os.path.abspath(localRoot)
+        remoteRoot = posixpath.join(
+            self.model.remotePath(remoteDirectory), os.path.basename(localRoot)
+        )
+        directories, files = _scan(localRoot, remoteRoot)
+        created, failures = self.createDirectories(directories)
+        results = [
+            UploadResult(localPath, remotePath, size, failures[posixpath.dirname(remotePath)])
+            for localPath, remotePath, size in files
+            if posixpath.dirname(remotePath) in failures
+        ]
+        pending = [
+            (localPath, remotePath, size)
+            for localPath, remotePath, size in files
+            if posixpath.dirname(remotePath) not in failures
+        ]
+        results += self._storeAll(pending, progress)
+        return created, results
+
+    def createDirectories(
+        self, directories: Iterable[str]
+    ) -> Tuple[List[str], Dict[str, FTPError]]:
+        """
+        Create the remote directories which do not exist yet.
+
+        Parameters
+        ----------
+        directories : Iterable[str]
+            absolute remote paths, their parents are created too
+        Returns
+        -------
+        Tuple[List[str], Dict[str, FTPError]]
+            the directories created, and the error of each directory which could not be
+            created or listed, the directories below it included
+        """
+
+        # the working directory exists, its parents are never listed
+        self.directories.setdefault(self.model.workingDirectory, True)
+        wanted = set()
+        for directory in directories:
+            while directory not in wanted and not self.directories.get(directory):
+                wanted.add(directory)
+                directory = posixpath.dirname(directory)
+
+        missing: List[str] = []
+        failures: Dict[str, FTPError] = {}
+        for directory in sorted(wanted, key=lambda path: (path.count("/"), path)):
+            parent = posixpath.dirname(directory)
+            if parent in failures:
+                failures[directory] = failures[parent]
+            elif self.directories.get(parent) and parent not in self.listed:
+                try:
+                    self._list(parent)
+                except FTPError as exp:
+                    failures[directory] = exp
+                    continue
+            if directory not in failures and not self.directories.get(directory):
+                self.directories[directory] = False
+                missing.append(directory)
+
+        created: List[str] = []
+        replies = self.model.pipeline([f"MKD {directory}" for directory in missing])
+        for directory, reply in zip(missing, replies):
+            parent = posixpath.dirname(directory)
+            if parent in failures:
+                failures[directory] = failures[parent]
+            elif isinstance(reply, FTPError):
+                failures[directory] = reply
+            else:
+                self.directories[directory] = True
+                self.listed.add(directory)
+                created.append(directory)
+        return created, failures
+
+    def _list(self, directory: str) -> None:
+        for name, facts in self.model.listDirectory(directory):
+            if facts.get("type", "").lower() == "dir":
+                self.directories[posixpath.join(directory, name)] = True
+        self.listed.add(directory)
+
+    def _storeAll(
+        self,
+        files: List[Tuple[str, str, int]],
+        progress: Optional[Callable[[UploadResult], Any]],
+    ) -> List[UploadResult]:
+        results: List[UploadResult] = []
+        lock = threading.Lock()
+        pending = collections.deque(enumerate(sorted(files, key=lambda file: -file[2])))
+
+        def work(session: FTPConnectionModel) -> None:
+            while True:
+                with lock:
+                    if not pending:
+                        return
+                    index, (localPath, remotePath, size) = pending.popleft()
+                result = self._store(session, workDirectory, index, localPath, remotePath, size)
+                with lock:
+                    results.append(result)
+                if progress is not None:
+                    progress(result)
+
+        sessions = self._openSessions(min(self.sessions, len(files)))
+        try:
+            with tempfile.TemporaryDirectory() as workDirectory:
+                with ThreadPoolExecutor(len(sessions)) as executor:
+                    workers = [executor.submit(work, session) for session in sessions]
+                for worker in workers:
+                    worker.result()
+        finally:
+            for session in sessions[1:]:
+                session.close()
+        return results
+
+    def _openSessions(self, count: int) -> List[FTPConnectionModel]:
+        # the session of the model is the first one, so there is always one
+        sessions = [self.model]
+        for _ in range(count - 1):
+            try:
+                sessions.append(self.model.openSession())
+            except (UnableToConnect, NotAuthorized, FTPError, OSError, EOFError):
+                # the server refuses more sessions, the files are spread over the others
+                break
+        return sessions
+
+    def _store(  # pylint: disable=R0913
+        self,
+        session: FTPConnectionModel,
+        workDirectory: str,
+        index: int,
+        localPath: str,
+        remotePath: str,
+        size: int,
+    ) -> UploadResult:
+        error: Optional[Exception] = None
+        try:
+            containerPath = os.path.join(workDirectory, f"{index}{CONTAINER_EXTENSION}")
+            FileCryptographer.encryptToContainer(
+                localPath, self.publicKeys, self.engineName, containerPath
+            )
+            try:
+                with open(containerPath, "rb") as container:
+                    session.store(remotePath, container)
+                size = os.path.getsize(containerPath)
+            finally:
+                os.remove(containerPath)
+        except Exception as exp:  # pylint: disable=W0703
+            # every file gets a result, whatever failed
+            error = exp
+        return UploadResult(localPath, remotePath, size, error)
+
+
+def _scan(localRoot: str, remoteRoot: str) -> Tuple[List[str], List[Tuple[str, str, int]]]:
+    # remote directories of the tree, and local path, remote path and size of its files
+    directories: List[str] = []
+    files: List[Tuple[str, str, int]] = []
+    for directory, _, fileNames in os.walk(localRoot):
+        relative = os.path.relpath(directory, localRoot)
+        remote = remoteRoot
+        if relative != os.curdir:
+            remote = posixpath.join(remoteRoot, *relative.split(os.sep))
+        directories.append(remote)
+        for fileName in fileNames:
+            localPath = os.path.join(directory, fileName)
+            if os.path.isfile(localPath):
+                remotePath = posixpath.join(remote, fileName) + CONTAINER_EXTENSION
+                files.append((localPath, remotePath, os.path.getsize(localPath)))
+    return directories, files
@@ -0,0 +1,242 @@
+"""
+This module walks a remote directory tree with several sessions at once.
+"""
+import posixpath
+import queue
+import threading
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .model import FTPConnectionModel, FTPError, NotAuthorized, UnableToConnect
+
+
+class RemoteEntry(NamedTuple):
+    """
+    File or directory found by a RemoteTreeWalker.
+    """
+
+    path: str
+    facts: Dict[str, str]
+
+    @property
+    def isDirectory(self) -> bool:
+        """
+        Whether the entry is a directory.
+
+        Returns
+        -------
+        bool
+            True for a directory
+        """
+
+        return self.facts.get("type", "").lower() == "dir"
+
+
+class _Failure(NamedTuple):
+    error: Exception
+
+
+class _Refused(NamedTuple):
+    error: Exception
+
+
+_DONE = object()
+
+
+class RemoteTreeWalker:
+    """
+    Recursive remote directory walker.
+
+    Directories are listed with MLSD by absolute path, so a listing is a single round trip and
+    sessions never change directory. Each worker thread owns a session and takes directories
+    from a shared bounded queue, subdirectories are queued for any worker. When the queue is
+    full the worker lists the subdirectory itself, so the queue bounds the memory without
+    blocking the workers. Entries are streamed back while the walk goes on.
+
+    Workers whose session the server refuses stop, the others list the whole tree. The walk
+    fails only if no session opens at all.
+
+    Directories which cannot be listed (permissions...) are skipped and recorded in errors.
+    """
+
+    def __init__(
+        self,
+        sessionFactory: Callable[[], FTPConnectionModel],
+        sessions: int = 4,
+        maxQueued: int = 10000,
+    ) -> None:
+        self.sessionFactory = sessionFactory
+        self.sessions = sessions
+        self.maxQueued = maxQueued
+        self.errors: List[Tuple[str, FTPError]] = []
+
+    @classmethod
+    def forModel(cls, model: FTPConnectionModel, sessions: int = 4) -> "RemoteTreeWalker":
+        """
+        Walker whose sessions are opened like the session of a logged in model.
+
+        Parameters
+        ----------
+        model : FTPConnectionModel
+            logged in session
+        sessions : int
+            number of sessions walking the tree
+        Returns
+        -------
+        RemoteTreeWalker
+            the walker
+        """
+
+        return cls(model.openSession, sessions)
+
+    def walk(self, root: str) -> Iterator[RemoteEntry]:
+        """
+        Walk a remote tree, the order of the entries is not defined except that a directory
+        comes before its entries.
+
+        Parameters
+        ----------
+        root : str
+            absolute path of the root of the tree, which is not returned itself
+        Returns
+        -------
+        Iterator[RemoteEntry]
+            entries of the tree, with absolute paths
+        """
+
+        state = _WalkState(self.maxQueued)
+        self.errors = []
+        state.directories.put(posixpath.normpath(root))
+
+        workers = [
+            threading.Thread(target=self._work, args=(state,), daemon=True)
+            for _ in range(self.sessions)
+        ]
+        for worker in workers:
+            worker.start()
+
+        finished = 0
+        refused: List[Exception] = []
+        try:
+            while finished < len(workers):
+                result = state.results.get()
+                if result is _DONE:
+                    finished += 1
+                elif isinstance(result, _Refused):
+                    refused.append(result.error)
+                elif isinstance(result, _Failure):
+                    raise result.error
+                elif isinstance(result, RemoteEntry):
+                    yield result
+        finally:
+            state.stopped.set()
+        if refused and len(refused) == len(workers):
+            raise refused[0]
+
+    def _work(self, state: "_WalkState") -> None:
+        session: Optional[FTPConnectionModel] = None
+        try:
+            try:
+                session = self.sessionFactory()
+            except (UnableToConnect, NotAuthorized, FTPError, OSError, EOFError) as exp:
+                # the server refuses more sessions, the directories are listed by the others
+                state.put(_Refused(exp))
+                return
+            while not (state.finished.is_set() or state.stopped.is_set()):
+                try:
+                    directory = state.directories.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._walkDirectory(session, directory, state)
+                state.finishDirectory()
+        except Exception as exp:  # pylint: disable=W0703
+            state.put(_Failure(exp))
+        finally:
+            if session is not None:
+                session.close()
+            state.put(_DONE)
+
+    def _walkDirectory(
+        self, session: FTPConnectionModel, directory: str, state: "_WalkState"
+    ) -> None:
+        try:
+            listing = session.listDirectory(directory)
+        except FTPError as exp:
+            self.errors.append((directory, exp))
+            return
+
+        for name, facts in listing:
+            entry = RemoteEntry(posixpath.join(directory, name), facts)
+            if not state.put(entry):
+                return
+            if entry.isDirectory and not state.queueDirectory(entry.path):
+                self._walkDirectory(session, entry.path, state)
+
+
+class _WalkState:
+    """
+    Queues of a walk and count of the directories left to list.
+    """
+
+    def __init__(self, maxQueued: int) -> None:
+        self.directories: "queue.Queue[str]" = queue.Queue(maxQueued)
+        self.results: "queue.Queue[Union[RemoteEntry, _Refused, _Failure, object]]" = queue.Queue(
+            maxQueued
+        )
+        self.pending = 1
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.stopped = threading.Event()
+
+    def queueDirectory(self, path: str) -> bool:
+        """
+        Queue a directory for any worker.
+
+        Parameters
+        ----------
+        path : str
+            absolute path of the directory
+        Returns
+        -------
+        bool
+            False if the queue is full, the caller lists the directory itself
+        """
+
+        with self.lock:
+            try:
+                self.directories.put_nowait(path)
+            except queue.Full:
+                return False
+            self.pending += 1
+            return True
+
+    def finishDirectory(self) -> None:
+        """
+        Count a queued directory as listed, the walk is finished after the last one.
+        """
+
+        with self.lock:
+            self.pending -= 1
+            if self.pending == 0:
+                self.finished.set()
+
+    def put(self, result: Union[RemoteEntry, _Refused, _Failure, object]) -> bool:
+        """
+        Stream a result to the consumer, waiting while the consumer is behind.
+
+        Parameters
+        ----------
+        result : Union[RemoteEntry, _Refused, _Failure, object]
+            entry, refused session, failure or end of a worker
+        Returns
+        -------
+        bool
+            False if the consumer stopped the walk
+        """
+
+        while not self.stopped.is_set():
+            try:
+                self.results.put(result, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
@@ -0,0 +1,465 @@
+"""
+This module stripes containers over several FTP servers, so a transfer is not capped by the
+uplink of a single server. The container is cut into fixed size stripes dealt round robin to
+the data servers; with XOR parity one more server receives the XOR of each row of stripes, and
+a file can be rebuilt while any one server is missing.
+
+Each server holds a single object per file, its stripes concatenated, <name>.stripe<index>,
+and a copy of the manifest, <name>.manifest, describing the layout:
+
+    {"version": 1, "name": "report.pdf.sfs", "size": 5242880, "stripeSize": 1048576,
+     "parity": "xor", "servers": ["user@10.0.0.1:21/striped", ...],
+     "digests": ["<sha256>", ...]}
+
+A server is recorded by its location, so several directories of one server are told apart.
+The index of a server in "servers" is the index of its object, its digest is the SHA-256 of
+the object, so a corrupted object is treated as a missing one.
+
+The servers are configured in a JSON file:
+
+    {"stripeSize": 1048576, "parity": "xor", "servers": [
+        {"host": "10.0.0.1", "port": 21, "username": "user", "password": "password",
+         "tls": false, "directory": "/striped"}, ...]}
+"""
+import collections
+import contextlib
+import ftplib
+import hashlib
+import io
+import json
+import os
+import posixpath
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .model import FTPConnectionModel, FTPError, NotAuthorized, UnableToConnect
+
+DEFAULT_STRIPE_SIZE = 1024 * 1024
+
+MANIFEST_EXTENSION = ".manifest"
+STRIPE_EXTENSION = ".stripe"
+MANIFEST_VERSION = 1
+
+NO_PARITY = "none"
+XOR_PARITY = "xor"
+
+
+class StripeServer(NamedTuple):
+    """
+    Server receiving the stripes of one index.
+    """
+
+    host: str
+    port: int
+    username: str
+    password: str
+    useTls: bool = False
+    directory: str = "."
+
+    @property
+    def address(self) -> str:
+        """
+        Address of the server, as recorded in the manifests.
+
+        Returns
+        -------
+        str
+            host:port
+        """
+
+        return f"{self.host}:{self.port}"
+
+    @property
+    def location(self) -> str:
+        """
+        Location of the objects on the server, as recorded in the manifests.
+
+        Returns
+        -------
+        str
+            username@host:port/directory
+        """
+
+        return f"{self.username}@{self.address}/{self.directory.strip('/')}"
+
+
+class StripeManifest(NamedTuple):
+    """
+    Layout of a striped container.
+    """
+
+    name: str
+    size: int
+    stripeSize: int
+    parity: str
+    servers: List[str]
+    digests: List[str]
+
+    @property
+    def dataCount(self) -> int:
+        """
+        Number of servers holding stripes of the container.
+
+        Returns
+        -------
+        int
+            the servers, without the parity server
+        """
+
+        return len(self.servers) - (self.parity != NO_PARITY)
+
+    def objectSize(self, index: int) -> int:
+        """
+        Size of the object of a server.
+
+        Parameters
+        ----------
+        index : int
+            index of the server
+        Returns
+        -------
+        int
+            bytes of the object, the parity object is as long as the first one
+        """
+
+        rowSize = self.stripeSize * self.dataCount
+        rows, remainder = divmod(self.size, rowSize)
+        if index >= self.dataCount:
+            index = 0
+        return rows * self.stripeSize + min(
+            max(remainder - index * self.stripeSize, 0), self.stripeSize
+        )
+
+    def pack(self) -> bytes:
+        """
+        Serialize the manifest.
+
+        Returns
+        -------
+        bytes
+            the manifest as JSON
+        """
+
+        fields = {
+            "version": MANIFEST_VERSION,
+            "name": self.name,
+            "size": self.size,
+            "stripeSize": self.stripeSize,
+            "parity": self.parity,
+            "servers": self.servers,
+            "digests": self.digests,
+        }
+        return json.dumps(fields).encode("utf-8")
+
+    @staticmethod
+    def unpack(data: bytes) -> "StripeManifest":
+        """
+        Parse a manifest.
+
+        Parameters
+        ----------
+        data : bytes
+            the manifest as JSON
+        Returns
+        -------
+        StripeManifest
+            the manifest
+        """
+
+        try:
+            fields = json.loads(data.decode("utf-8"))
+            if fields.pop("version") != MANIFEST_VERSION:
+                raise ValueError("Unsupported stripe manifest version")
+            manifest = StripeManifest(**fields)
+        except (KeyError, TypeError, UnicodeDecodeError, json.JSONDecodeError) as exp:
+            raise ValueError("Invalid stripe manifest") from exp
+        if manifest.parity not in (NO_PARITY, XOR_PARITY) or manifest.dataCount < 1:
+            raise ValueError("Invalid stripe manifest")
+        return manifest
+
+
+class StripedStorage:
+    """
+    Upload and download of containers striped over several servers.
+
+    Each server has its own session, so the stripes are transferred in parallel. A container
+    is split into the objects of the servers in a single pass, computing the parity of each
+    row as it goes; a download fetches the objects of all the servers, checks their digests
+    and joins them again, rebuilding the stripes of a missing object from the parity.
+    """
+
+    def __init__(
+        self,
+        servers: Sequence[StripeServer],
+        stripeSize: int = DEFAULT_STRIPE_SIZE,
+        parity: str = XOR_PARITY,
+    ) -> None:
+        if parity not in (NO_PARITY, XOR_PARITY):
+            raise ValueError(f"Unknown parity: {parity}")
+        if len(servers) < 1 + (parity != NO_PARITY):
+            raise ValueError("Not enough servers to stripe over")
+        if len({server.location for server in servers}) < len(servers):
+            raise ValueError("Servers must not share a location")
+        self.servers = list(servers)
+        self.stripeSize = stripeSize
+        self.parity = parity
+
+    def upload(self, containerPath: str, name: str) -> StripeManifest:
+        """
+        Stripe a container over the servers.
+
+        Parameters
+        ----------
+        containerPath : str
+            local container
+        name : str
+            name of the container on the servers
+        Returns
+        -------
+        StripeManifest
+            the layout of the container
+        """
+
+        with tempfile.TemporaryDirectory() as workDirectory:
+            objectPaths = [
+                os.path.join(workDirectory, str(index)) for index in range(len(self.servers))
+            ]
+            digests = _split(containerPath, objectPaths, self.stripeSize, self.parity)
+            manifest = StripeManifest(
+                name,
+                os.path.getsize(containerPath),
+                self.stripeSize,
+                self.parity,
+                [server.location for server in self.servers],
+                digests,
+            )
+
+            def store(index: int) -> None:
+                server = self.servers[index]
+                session = _openSession(server)
+                try:
+                    with open(objectPaths[index], "rb") as stripes:
+                        session.store(_remotePath(server, name, index), stripes)
+                    # the manifest is stored last, it is only found next to a whole object
+                    session.store(_remotePath(server, name), io.BytesIO(manifest.pack()))
+                finally:
+                    session.close()
+
+            errors = _runAll(store, range(len(self.servers)))
+        if errors:
+            raise FTPError(
+                "Striped upload failed: "
+                + ", ".join(f"{self.servers[index].address}: {error}" for index, error in errors)
+            )
+        return manifest
+
+    def download(self, name: str, containerPath: str) -> Tuple[StripeManifest, List[str]]:
+        """
+        Download a striped container, rebuilt from the parity if one server is missing.
+
+        Parameters
+        ----------
+        name : str
+            name of the container on the servers
+        containerPath : str
+            local container written
+        Returns
+        -------
+        Tuple[StripeManifest, List[str]]
+            the layout of the container and the locations of the servers whose object was
+            rebuilt from the parity
+        """
+
+        sessions: Dict[int, FTPConnectionModel] = {}
+        manifests: Dict[int, bytes] = {}
+        objectPaths: Dict[int, str] = {}
+
+        def fetchManifest(index: int) -> None:
+            server = self.servers[index]
+            sessions[index] = _openSession(server)
+            chunks: List[bytes] = []
+            sessions[index].retrieve(
+                _remotePath(server, name), lambda block: chunks.append(bytes(block))
+            )
+            manifests[index] = b"".join(chunks)
+
+        with tempfile.TemporaryDirectory() as workDirectory:
+            try:
+                _runAll(fetchManifest, range(len(self.servers)))
+                manifest, packed = _agreedManifest(name, manifests.values())
+
+                def fetchObject(index: int) -> None:
+                    server = self.servers[index]
+                    if manifests[index] != packed or server.location not in manifest.servers:
+                        return
+                    objectIndex = manifest.servers.index(server.location)
+                    objectPath = os.path.join(workDirectory, str(objectIndex))
+                    with open(objectPath, "wb") as stripes:
+                        sessions[index].downloadRange(
+                            _remotePath(server, name, objectIndex),
+                            0,
+                            manifest.objectSize(objectIndex),
+                            stripes,
+                        )
+                    if _fileDigest(objectPath) == manifest.digests[objectIndex]:
+                        objectPaths[objectIndex] = objectPath
+
+                _runAll(fetchObject, list(manifests))
+            finally:
+                for session in sessions.values():
+                    session.close()
+
+            missing = [
+                manifest.servers[index]
+                for index in range(len(manifest.servers))
+                if index not in objectPaths
+            ]
+            if len(missing) > len(manifest.servers) - manifest.dataCount:
+                raise FTPError(f"Cannot rebuild {name}, missing stripes from {', '.join(missing)}")
+            _join(manifest, objectPaths, containerPath)
+        return manifest, missing
+
+
+def loadStripedStorage(fileName: str) -> StripedStorage:
+    """
+    Load the configuration of the striped storage.
+
+    Parameters
+    ----------
+    fileName : str
+        JSON configuration, see the module documentation
+    Returns
+    -------
+    StripedStorage
+        the striped storage
+    """
+
+    with open(fileName, "r", encoding="utf-8") as file:
+        configuration = json.load(file)
+    try:
+        servers = [
+            StripeServer(
+                server["host"],
+                int(server.get("port", 21)),
+                server["username"],
+                server["password"],
+                bool(server.get("tls", False)),
+                server.get("directory", "."),
+            )
+            for server in configuration["servers"]
+        ]
+    except (KeyError, TypeError) as exp:
+        raise ValueError(f"Invalid striped storage configuration: {exp}") from exp
+    return StripedStorage(
+        servers,
+        int(configuration.get("stripeSize", DEFAULT_STRIPE_SIZE)),
+        configuration.get("parity", XOR_PARITY),
+    )
+
+
+def _openSession(server: StripeServer) -> FTPConnectionModel:
+    session = FTPConnectionModel()
+    session.connect(server.host, server.port, server.useTls)
+    try:
+        session.login(server.username, server.password)
+    except BaseException:
+        session.close()
+        raise
+    return session
+
+
+def _remotePath(server: StripeServer, name: str, index: Optional[int] = None) -> str:
+    suffix = MANIFEST_EXTENSION if index is None else f"{STRIPE_EXTENSION}{index}"
+    return posixpath.join(server.directory, name + suffix)
+
+
+def _runAll(task: Callable[[int], Any], indexes: Iterable[int]) -> List[Tuple[int, Exception]]:
+    # runs the task for each server at once, returns the errors by index of server
+    indexes = list(indexes)
+    errors: List[Tuple[int, Exception]] = []
+    with ThreadPoolExecutor(max(1, len(indexes))) as executor:
+        futures = [(index, executor.submit(task, index)) for index in indexes]
+    for index, future in futures:
+        try:
+            future.result()
+        except (UnableToConnect, NotAuthorized, FTPError, ftplib.Error, OSError, EOFError) as exp:
+            errors.append((index, exp))
+    return errors
+
+
+def _agreedManifest(name: str, candidates: Iterable[bytes]) -> Tuple[StripeManifest, bytes]:
+    # the manifest stored on most servers, a server left with an older one is missing
+    for packed, _ in collections.Counter(candidates).most_common():
+        try:
+            return StripeManifest.unpack(packed), packed
+        except ValueError:
+            continue
+    raise FTPError(f"No stripe manifest found for {name}")
+
+
+def _xor(stripes: Sequence[bytes], size: int) -> bytes:
+    # shorter stripes are padded with zeros, as the end of a little endian integer
+    parity = 0
+    for stripe in stripes:
+        parity ^= int.from_bytes(stripe, "little")
+    return parity.to_bytes(size, "little")
+
+
+def _split(containerPath: str, objectPaths: List[str], stripeSize: int, parity: str) -> List[str]:
+    # deals the stripes of each row to the data objects, then their XOR to the parity object
+    dataCount = len(objectPaths) - (parity != NO_PARITY)
+    digests = [hashlib.sha256() for _ in objectPaths]
+    with contextlib.ExitStack() as stack:
+        container = stack.enter_context(open(containerPath, "rb"))
+        objects = [stack.enter_context(open(path, "wb")) for path in objectPaths]
+        for row in iter(lambda: container.read(stripeSize * dataCount), b""):
+            stripes = [row[start : start + stripeSize] for start in range(0, len(row), stripeSize)]
+            if parity != NO_PARITY:
+                stripes += [b""] * (dataCount - len(stripes))
+                stripes.append(_xor(stripes, len(stripes[0])))
+            for stripe, file, digest in zip(stripes, objects, digests):
+                file.write(stripe)
+                digest.update(stripe)
+    return [digest.hexdigest() for digest in digests]
+
+
+def _join(manifest: StripeManifest, objectPaths: Dict[int, str], containerPath: str) -> None:
+    # reads the stripes of each row back, a missing one is the XOR of the others and parity
+    rowSize = manifest.stripeSize * manifest.dataCount
+    with contextlib.ExitStack() as stack:
+        objects: Dict[int, BinaryIO] = {
+            index: stack.enter_context(open(path, "rb")) for index, path in objectPaths.items()
+        }
+        container = stack.enter_context(open(containerPath, "wb"))
+        for rowStart in range(0, manifest.size, rowSize):
+            remainder = min(manifest.size - rowStart, rowSize)
+            sizes = [
+                min(max(remainder - index * manifest.stripeSize, 0), manifest.stripeSize)
+                for index in range(manifest.dataCount)
+            ]
+            sizes.append(sizes[0])
+            stripes = {index: file.read(sizes[index]) for index, file in objects.items()}
+            for index in range(manifest.dataCount):
+                if index not in stripes:
+                    stripes[index] = _xor(list(stripes.values()), sizes[0])[: sizes[index]]
+                container.write(stripes[index])
+
+
+def _fileDigest(fileName: str) -> str:
+    digest = hashlib.sha256()
+    with open(fileName, "rb") as file:
+        for block in iter(lambda: file.read(DEFAULT_STRIPE_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,306 @@
+"""
+This module adapts the transfer parameters (block size, socket buffer size and number of
+parallel connections) to the throughput achieved by the last transfers.
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+KIB = 1024
+MIB = 1024 * KIB
+
+# directions of the transfers, each is adapted on its own
+DOWNLOAD = "download"
+UPLOAD = "upload"
+DIRECTIONS = (DOWNLOAD, UPLOAD)
+
+# called with the number of bytes of each block transferred, blocks to limit the rate
+Throttle = Callable[[int], Any]
+
+
+class TransferDecision(NamedTuple):
+    """
+    Transfer parameters chosen by the controller.
+    """
+
+    blockSize: int
+    socketBufferSize: int
+    connections: int
+    reason: str
+
+
+class TransferMeasurement(NamedTuple):
+    """
+    Measurement of a finished transfer, with the decision taken after it.
+    """
+
+    timestamp: float
+    direction: str
+    bytesTransferred: int
+    seconds: float
+    throughput: float
+    connections: int
+    blockSize: int
+    failed: bool
+    cpuSeconds: float
+    decision: TransferDecision
+
+
+class AdaptiveTransferController:
+    """
+    AIMD controller of the transfer parameters.
+
+    After each transfer large enough to measure the link, the goodput (bytes per second of all
+    the connections of the transfer) is compared with the previous one:
+        - it improved: one more connection (additive increase) and a doubled block size,
+        - it dropped or the transfer failed: half the connections and block size
+          (multiplicative decrease), so an overloaded server is relieved quickly,
+        - otherwise the parameters are kept.
+    The socket buffers are sized to twice the bandwidth delay product of a connection.
+
+    Downloads and uploads have their own decision and previous goodput, so a fast direction
+    is not compared with a slow one. Uploads use a single connection, only their block and
+    buffer sizes adapt.
+
+    Decisions and measurements are kept in a bounded history for inspection.
+    """
+
+    # pylint: disable=R0902,R0913
+
+    def __init__(
+        self,
+        minBlockSize: int = 8 * KIB,
+        maxBlockSize: int = 4 * MIB,
+        maxConnections: int = 8,
+        minMeasuredBytes: int = 256 * KIB,
+        tolerance: float = 0.1,
+        historySize: int = 256,
+    ) -> None:
+        self.minBlockSize = minBlockSize
+        self.maxBlockSize = maxBlockSize
+        self.maxConnections = maxConnections
+        self.minMeasuredBytes = minMeasuredBytes
+        self.tolerance = tolerance
+        self.history: Deque[TransferMeasurement] = deque(maxlen=historySize)
+        initial = TransferDecision(
+            minBlockSize, _clamp(4 * minBlockSize, 64 * KIB, 8 * MIB), 1, "initial"
+        )
+        # by direction: parameters of the next transfers and goodput of the last measured one
+        self.decisions: Dict[str, TransferDecision] = dict.fromkeys(DIRECTIONS, initial)
+        self.lastThroughputs: Dict[str, Optional[float]] = dict.fromkeys(DIRECTIONS)
+        self.roundTripTime: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def decision(self, direction: str = DOWNLOAD) -> TransferDecision:
+        """
+        Parameters of the next transfers in a direction.
+
+        Parameters
+        ----------
+        direction : str
+            DOWNLOAD or UPLOAD
+        Returns
+        -------
+        TransferDecision
+            block size, socket buffer size and number of connections
+        """
+
+        return self.decisions[direction]
+
+    def recordRoundTrip(self, seconds: float) -> None:
+        """
+        Record the round trip time of a command on the control connection.
+
+        Parameters
+        ----------
+        seconds : float
+            round trip time
+        """
+
+        with self.lock:
+            if self.roundTripTime is None:
+                self.roundTripTime = seconds
+            else:
+                self.roundTripTime = 0.875 * self.roundTripTime + 0.125 * seconds
+
+    def record(
+        self,
+        bytesTransferred: int,
+        seconds: float,
+        connections: int = 1,
+        failed: bool = False,
+        cpuSeconds: float = 0.0,
+        direction: str = DOWNLOAD,
+    ) -> TransferDecision:
+        """
+        Record a finished transfer and adapt the parameters of the next ones in its direction.
+
+        Parameters
+        ----------
+        bytesTransferred : int
+            bytes transferred by all the connections of the transfer
+        seconds : float
+            duration of the transfer, without the sessions opened for it
+        connections : int
+            number of connections used by the transfer
+        failed : bool
+            whether the transfer failed (refused connection, timeout...)
+        cpuSeconds : float
+            processor time spent by the client during the transfer
+        direction : str
+            DOWNLOAD or UPLOAD
+        Returns
+        -------
+        TransferDecision
+            parameters of the next transfers in this direction
+        """
+
+        with self.lock:
+            throughput = bytesTransferred / seconds if seconds > 0 else 0.0
+            decision = self._decide(direction, bytesTransferred, throughput, failed)
+            self.history.append(
+                TransferMeasurement(
+                    time.time(),
+                    direction,
+                    bytesTransferred,
+                    seconds,
+                    throughput,
+                    connections,
+                    self.decisions[direction].blockSize,
+                    failed,
+                    cpuSeconds,
+                    decision,
+                )
+            )
+            self.decisions[direction] = decision
+            return decision
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current parameters and measurement history, for inspection.
+
+        Returns
+        -------
+        Dict[str, Any]
+            the decisions and throughputs by direction, round trip time and measurements as
+            plain values
+        """
+
+        with self.lock:
+            measurements: List[Dict[str, Any]] = []
+            for measurement in self.history:
+                entry = measurement._asdict()
+                entry["decision"] = measurement.decision._asdict()
+                measurements.append(entry)
+            return {
+                "decisions": {
+                    direction: decision._asdict() for direction, decision in self.decisions.items()
+                },
+                "roundTripTime": self.roundTripTime,
+                "throughputs": dict(self.lastThroughputs),
+                "measurements": measurements,
+            }
+
+    def _decide(
+        self, direction: str, bytesTransferred: int, throughput: float, failed: bool
+    ) -> TransferDecision:
+        current = self.decisions[direction]
+        maxConnections = self.maxConnections if direction == DOWNLOAD else 1
+
+        if failed:
+            self.lastThroughputs[direction] = None
+            return self._withBuffer(
+                direction,
+                max(self.minBlockSize, current.blockSize // 2),
+                max(1, current.connections // 2),
+                "transfer failed, multiplicative decrease",
+            )
+
+        if bytesTransferred < self.minMeasuredBytes:
+            return current._replace(reason="transfer too small to measure, kept")
+
+        previous = self.lastThroughputs[direction]
+        self.lastThroughputs[direction] = throughput
+
+        if previous is None or throughput > previous * (1 + self.tolerance):
+            return self._withBuffer(
+                direction,
+                min(self.maxBlockSize, current.blockSize * 2),
+                min(maxConnections, current.connections + 1),
+                "goodput improved, additive increase",
+            )
+
+        if throughput < previous * (1 - self.tolerance):
+            return self._withBuffer(
+                direction,
+                max(self.minBlockSize, current.blockSize // 2),
+                max(1, current.connections // 2),
+                "goodput dropped, multiplicative decrease",
+            )
+
+        return current._replace(reason="goodput stable, kept")
+
+    def _withBuffer(
+        self, direction: str, blockSize: int, connections: int, reason: str
+    ) -> TransferDecision:
+        lastThroughput = self.lastThroughputs[direction]
+        if self.roundTripTime is not None and lastThroughput is not None:
+            perConnection = lastThroughput / max(1, self.decisions[direction].connections)
+            bufferSize = int(2 * perConnection * self.roundTripTime)
+        else:
+            bufferSize = 4 * blockSize
+        return TransferDecision(
+            blockSize, _clamp(max(bufferSize, blockSize), 64 * KIB, 8 * MIB), connections, reason
+        )
+
+
+def _clamp(value: int, lowest: int, highest: int) -> int:
+    return max(lowest, min(highest, value))
+
+
+class BufferPool:
+    """
+    Pool of preallocated receive buffers, so downloads read into the same bytearrays with
+    recv_into instead of allocating a bytes object per block.
+    """
+
+    def __init__(self, maxBuffers: int = 16) -> None:
+        self.maxBuffers = maxBuffers
+        self.buffers: Dict[int, List[bytearray]] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, size: int) -> bytearray:
+        """
+        Take a buffer out of the pool, a new one is allocated if none of this size is free.
+
+        Parameters
+        ----------
+        size : int
+            size of the buffer
+        Returns
+        -------
+        bytearray
+            the buffer, to give back with release
+        """
+
+        with self.lock:
+            free = self.buffers.get(size)
+            if free:
+                return free.pop()
+        return bytearray(size)
+
+    def release(self, buffer: bytearray) -> None:
+        """
+        Give a buffer back to the pool.
+
+        Parameters
+        ----------
+        buffer : bytearray
+            buffer taken with acquire, no reference to it may be kept
+        """
+
+        with self.lock:
+            free = self.buffers.setdefault(len(buffer), [])
+            if len(free) < self.maxBuffers:
+                free.append(buffer)
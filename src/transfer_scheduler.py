@@ -0,0 +1,392 @@
+"""
+This module queues transfers and runs them on a pool of sessions, by priority and with
+rate limits, so bulk transfers neither delay interactive ones nor saturate the link.
+"""
+import heapq
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Tuple
+
+from .model import FTPConnectionModel
+from .transfer_control import DOWNLOAD, MIB, UPLOAD, Throttle
+
+INTERACTIVE = 0
+NORMAL = 1
+BULK = 2
+
+# transfers which may be paused are split in pieces of this size by default, each over its
+# own data connection
+PIECE_SIZE = 8 * MIB
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter. Transfers take one token per byte, once the bucket is empty
+    they wait for it to refill at the rate. The rate can be changed at any time.
+    """
+
+    def __init__(self, rate: float = 0.0, burst: Optional[float] = None) -> None:
+        self.rate = 0.0
+        self.burst = 0.0
+        self.tokens = 0.0
+        self.lastRefill = time.monotonic()
+        self.lock = threading.Lock()
+        self.setRate(rate, burst)
+
+    def setRate(self, rate: float, burst: Optional[float] = None) -> None:
+        """
+        Change the rate of the bucket.
+
+        Parameters
+        ----------
+        rate : float
+            bytes per second, 0 for no limit
+        burst : Optional[float]
+            bytes which can be taken at once from a full bucket, one second of the rate
+            (at least 64 KiB) by default
+        """
+
+        with self.lock:
+            self._refill()
+            self.rate = rate
+            self.burst = burst if burst is not None else max(rate, 64 * 1024.0)
+            self.tokens = min(self.tokens, self.burst)
+
+    def consume(self, amount: int) -> None:
+        """
+        Take tokens from the bucket, waiting until the bucket has refilled if it runs short.
+        A block larger than the bucket is let through and the debt is paid by waiting.
+
+        Parameters
+        ----------
+        amount : int
+            number of bytes transferred
+        """
+
+        with self.lock:
+            if self.rate <= 0:
+                return
+            self._refill()
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.lastRefill) * self.rate)
+        self.lastRefill = now
+
+
+class TransferJob:
+    """
+    Transfer queued in a TransferScheduler. Its result (the server response) or error is
+    given by its future.
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        fileName: str,
+        directory: str,
+        priority: int,
+        size: Optional[int],
+        rate: float,
+    ) -> None:
+        self.operation = operation
+        self.fileName = fileName
+        self.directory = directory
+        self.priority = priority
+        self.size = size
+        self.bucket = TokenBucket(rate)
+        self.future: "Future[str]" = Future()
+
+    def setRate(self, rate: float) -> None:
+        """
+        Change the rate limit of the transfer, even while it runs.
+
+        Parameters
+        ----------
+        rate : float
+            bytes per second, 0 for no limit
+        """
+
+        self.bucket.setRate(rate)
+
+    def cancel(self) -> bool:
+        """
+        Cancel the transfer if it has not started yet.
+
+        Returns
+        -------
+        bool
+            whether the transfer was cancelled
+        """
+
+        return self.future.cancel()
+
+    def sortKey(self) -> Tuple[int, float]:
+        """
+        Order of the job in the queue: priority first, then shortest job first.
+        Jobs of unknown size come last within their priority.
+
+        Returns
+        -------
+        Tuple[int, float]
+            sort key
+        """
+
+        return self.priority, float(self.size) if self.size is not None else math.inf
+
+
+class TransferScheduler:
+    """
+    Runs queued transfers on a pool of worker sessions.
+
+    - Jobs are started by priority (INTERACTIVE, NORMAL, BULK) and shortest job first
+      within a priority.
+    - A job more urgent than all the running ones does not wait for a worker: it is started
+      right away on an extra session, and the running jobs of lower priority pause until
+      no more urgent job runs. Jobs less urgent than INTERACTIVE are transferred in pieces,
+      each over its own data connection (REST then RETR or STOR), and pause between two
+      pieces: a paused job holds its control session but no data connection.
+    - Transfers are limited by a rate shared by all of them and by a rate of their own,
+      both can be changed at runtime.
+    """
+
+    # pylint: disable=R0902
+
+    def __init__(
+        self,
+        sessionFactory: Callable[[], FTPConnectionModel],
+        workers: int = 2,
+        rate: float = 0.0,
+        pieceSize: int = PIECE_SIZE,
+    ) -> None:
+        self.sessionFactory = sessionFactory
+        self.bucket = TokenBucket(rate)
+        self.pieceSize = pieceSize
+        self.queue: List[Tuple[int, float, int, TransferJob]] = []
+        self.running: List[TransferJob] = []
+        self.idleWorkers = 0
+        self.submitted = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.threads = [
+            threading.Thread(target=self._work, args=(False,), daemon=True) for _ in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    @classmethod
+    def forModel(
+        cls, model: FTPConnectionModel, workers: int = 2, rate: float = 0.0
+    ) -> "TransferScheduler":
+        """
+        Scheduler whose workers open their sessions like the session of a logged in model.
+
+        Parameters
+        ----------
+        model : FTPConnectionModel
+            logged in session
+        workers : int
+            number of worker sessions
+        rate : float
+            global rate limit in bytes per second, 0 for no limit
+        Returns
+        -------
+        TransferScheduler
+            the scheduler
+        """
+
+        return cls(model.openSession, workers, rate)
+
+    def setRate(self, rate: float) -> None:
+        """
+        Change the rate limit shared by all the transfers.
+
+        Parameters
+        ----------
+        rate : float
+            bytes per second, 0 for no limit
+        """
+
+        self.bucket.setRate(rate)
+
+    def submit(
+        self,
+        operation: str,
+        fileName: str,
+        directory: str = "",
+        priority: int = NORMAL,
+        size: Optional[int] = None,
+        rate: float = 0.0,
+    ) -> TransferJob:
+        """
+        Queue a transfer.
+
+        Parameters
+        ----------
+        operation : str
+            DOWNLOAD or UPLOAD
+        fileName : str
+            file to download (to the local working directory) or local file to upload
+        directory : str
+            remote directory of the transfer, the worker's login directory if empty
+        priority : int
+            INTERACTIVE, NORMAL or BULK
+        size : Optional[int]
+            size of the transfer for shortest job first, the local size for uploads if None
+        rate : float
+            rate limit of this transfer in bytes per second, 0 for no limit
+        Returns
+        -------
+        TransferJob
+            the queued job
+        """
+
+        if operation not in (DOWNLOAD, UPLOAD):
+            raise ValueError(f"Unknown transfer operation {operation}")
+        if size is None and operation == UPLOAD:
+            size = os.path.getsize(fileName)
+
+        job = TransferJob(operation, fileName, directory, priority, size, rate)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Scheduler is shut down")
+            self.submitted += 1
+            heapq.heappush(self.queue, (*job.sortKey(), self.submitted, job))
+            if (
+                self.idleWorkers == 0
+                and self.running
+                and all(priority < other.priority for other in self.running)
+            ):
+                threading.Thread(target=self._work, args=(True,), daemon=True).start()
+            self.condition.notify_all()
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers once the queued transfers are done, queued transfers are
+        cancelled if wait is False.
+
+        Parameters
+        ----------
+        wait : bool
+            wait for the queued transfers
+        """
+
+        with self.condition:
+            self.closed = True
+            if not wait:
+                for *_, job in self.queue:
+                    job.cancel()
+                self.queue.clear()
+            self.condition.notify_all()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def _work(self, extra: bool) -> None:
+        session: Optional[FTPConnectionModel] = None
+        try:
+            while True:
+                job = self._nextJob(extra)
+                if job is None:
+                    return
+                try:
+                    if session is None:
+                        session = self.sessionFactory()
+                    job.future.set_result(self._run(session, job))
+                except Exception as exp:  # pylint: disable=W0703
+                    job.future.set_exception(exp)
+                    if session is not None:
+                        # the session may be broken, the next job opens a new one
+                        session.close()
+                        session = None
+                finally:
+                    with self.condition:
+                        self.running.remove(job)
+                        self.condition.notify_all()
+                if extra:
+                    return
+        finally:
+            if session is not None:
+                session.close()
+
+    def _nextJob(self, extra: bool) -> Optional[TransferJob]:
+        with self.condition:
+            while True:
+                while not self.queue and not self.closed and not extra:
+                    self.idleWorkers += 1
+                    self.condition.wait()
+                    self.idleWorkers -= 1
+                if not self.queue:
+                    return None
+                job = heapq.heappop(self.queue)[-1]
+                if job.future.set_running_or_notify_cancel():
+                    self.running.append(job)
+                    return job
+
+    def _run(self, session: FTPConnectionModel, job: TransferJob) -> str:
+        if job.directory and session.workingDirectory != session.remotePath(job.directory):
+            session.changeDirectory(job.directory)
+
+        def throttle(amount: int) -> None:
+            job.bucket.consume(amount)
+            self.bucket.consume(amount)
+
+        if job.priority <= INTERACTIVE:
+            # no job is more urgent, the transfer is never paused
+            if job.operation == DOWNLOAD:
+                return session.downloadFile(job.fileName, throttle)
+            return session.uploadFile(job.fileName, throttle)
+        if job.operation == DOWNLOAD:
+            return self._downloadPieces(session, job, throttle)
+        return self._uploadPieces(session, job, throttle)
+
+    def _downloadPieces(
+        self, session: FTPConnectionModel, job: TransferJob, throttle: Throttle
+    ) -> str:
+        size = int(session.fileFacts(job.fileName)["size"])
+        received = pieces = 0
+        try:
+            with open(job.fileName, "wb") as file:
+                while received < size:
+                    self._yieldTo(job)
+                    length = min(self.pieceSize, size - received)
+                    count = session.downloadRange(job.fileName, received, length, file, throttle)
+                    received += count
+                    pieces += 1
+                    if count < length:
+                        break
+        except BaseException:
+            if os.path.exists(job.fileName):
+                os.remove(job.fileName)
+            raise
+        return f"Downloading {job.fileName}...\n226 Downloaded {received} bytes in {pieces} pieces"
+
+    def _uploadPieces(
+        self, session: FTPConnectionModel, job: TransferJob, throttle: Throttle
+    ) -> str:
+        remoteName = job.fileName.split("/")[-1]
+        with open(job.fileName, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            sent = 0
+            while True:
+                self._yieldTo(job)
+                length = min(self.pieceSize, size - sent)
+                # the first piece replaces the remote file, the next ones are written after it
+                response = session.store(remoteName, file, sent or None, length, throttle)
+                sent += length
+                if sent >= size:
+                    return f"Uploading {remoteName}...\n" + response
+
+    def _yieldTo(self, job: TransferJob) -> None:
+        with self.condition:
+            while any(other.priority < job.priority for other in self.running):
+                self.condition.wait()
@@ -0,0 +1,96 @@
+"""
+This module coalesces the updates of the user interface: the updates posted between two
+frames are applied together once, so the cost of redrawing the widgets does not grow with
+the number of updates.
+"""
+import threading
+from typing import Any, Callable, Dict, List
+
+# milliseconds between two flushes of the pending updates, about one frame
+DEFAULT_FRAME_INTERVAL = 16
+
+
+class UpdateCoalescer:
+    """
+    Pending updates of the user interface, flushed once per frame.
+
+    Text appended to a widget is joined and inserted at once. An update replacing the
+    content or the state of a widget supersedes the pending update with the same key, only
+    the last one is applied. Updates may be posted from any thread, they are applied by the
+    flush scheduled on the event loop.
+    """
+
+    def __init__(
+        self,
+        schedule: Callable[[int, Callable[[], None]], Any],
+        frameInterval: int = DEFAULT_FRAME_INTERVAL,
+    ) -> None:
+        self.schedule = schedule
+        self.frameInterval = frameInterval
+        self.lock = threading.Lock()
+        self.appenders: Dict[str, Callable[[str], None]] = {}
+        self.appended: Dict[str, List[str]] = {}
+        self.replacements: Dict[str, Callable[[], Any]] = {}
+        self.scheduled = False
+
+    def append(self, key: str, text: str, apply: Callable[[str], None]) -> None:
+        """
+        Append text to a widget.
+
+        Parameters
+        ----------
+        key : str
+            name of the widget
+        text : str
+            text to append
+        apply : Callable[[str], None]
+            appends the text of all the pending updates of the widget
+        """
+
+        with self.lock:
+            self.appenders[key] = apply
+            self.appended.setdefault(key, []).append(text)
+            self._schedule()
+
+    def replace(self, key: str, apply: Callable[[], Any]) -> None:
+        """
+        Replace the content or the state of a widget, superseding the pending update with
+        the same key.
+
+        Parameters
+        ----------
+        key : str
+            name of the update
+        apply : Callable[[], Any]
+            applies the update
+        """
+
+        with self.lock:
+            # the update moves after the ones posted since the update it supersedes
+            self.replacements.pop(key, None)
+            self.replacements[key] = apply
+            self._schedule()
+
+    def flush(self) -> None:
+        """
+        Apply the pending updates: the appended text first, then the replacements in the
+        order they were posted.
+        """
+
+        with self.lock:
+            appended = [
+                (self.appenders[key], "".join(texts)) for key, texts in self.appended.items()
+            ]
+            replacements = list(self.replacements.values())
+            self.appended.clear()
+            self.replacements.clear()
+            self.scheduled = False
+        for apply, text in appended:
+            apply(text)
+        for replacement in replacements:
+            replacement()
+
+    def _schedule(self) -> None:
+        if not self.scheduled:
+            self.scheduled = True
+            self.schedule(self.frameInterval, self.flush)
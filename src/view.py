@@ -8,6 +8,9 @@ import os
 import tkinter as tk
 import customtkinter as ctk
 
+from src.cipher.engines import engineNames
+from src.update_coalescer import UpdateCoalescer
+
 
 class FTPClientPresenter(Protocol):
     """
@@ -43,11 +46,23 @@ class FTPClientPresenter(Protocol):
     def handleDeleteFile(self, event: Union[tk.EventType, None] = None) -> None:
         ...
 
+    def handleMove(self, event: Union[tk.EventType, None] = None) -> None:
+        ...
+
+    def handleRotateKeys(self, event: Union[tk.EventType, None] = None) -> None:
+        ...
+
     def handleDisconnect(self, event: Union[tk.EventType, None] = None) -> None:
         ...
 
+    def handleIndexTree(self, event: Union[tk.EventType, None] = None) -> None:
+        ...
+
+    def handleSearch(self, event: Union[tk.EventType, None] = None) -> None:
+        ...
 
-class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
+
+class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901,R0904
     """
     FTP Client GUI
     """
@@ -62,6 +77,9 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         self.entryWidgets: Dict[str, ctk.CTkEntry] = {}
         self.buttonWidgets: Dict[str, ctk.CTkEntry] = {}
         self.responseWidgets: Dict[str, ctk.CTkTextbox] = {}
+        self.optionMenuWidgets: Dict[str, ctk.CTkOptionMenu] = {}
+        self.checkBoxWidgets: Dict[str, ctk.CTkCheckBox] = {}
+        self.updates = UpdateCoalescer(self.after)
 
     def buildGUI(self, presenter: FTPClientPresenter) -> None:
         """
@@ -71,16 +89,22 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         self.grid_columnconfigure((2, 3), weight=0)
         self.grid_rowconfigure((0, 1, 2), weight=1)
 
-        self.buildSidebar()
+        self.buildSidebar(presenter)
         self.buildResponseSection()
         self.buildControlSection(presenter)
         self.buildConnectSection(presenter)
         self.buildLoginSection(presenter)
 
-    def buildSidebar(self) -> None:
+    def buildSidebar(self, presenter: FTPClientPresenter) -> None:
         """
         Build the sidebar frame with widgets
-        The sidebar contain the name of the application and the appearance mode option menu
+        The sidebar contain the name of the application, the cipher engine option menu,
+        the search entry and the appearance mode option menu
+
+        parameters
+        ----------
+        presenter: FtpClientPresenter
+            The presenter for the ftp client
         """
         sideBarFrame = ctk.CTkFrame(self, width=140, corner_radius=0)
         sideBarFrame.grid(row=0, column=0, rowspan=4, sticky="nsew")
@@ -91,6 +115,15 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
             font=ctk.CTkFont(size=20, weight="bold"),
         )
         nameLabel.grid(row=0, column=0, padx=20, pady=(20, 10))
+        cipherEngineLabel = ctk.CTkLabel(sideBarFrame, text="Cipher Engine:", anchor="w")
+        cipherEngineLabel.grid(row=1, column=0, padx=20, pady=(10, 0))
+        cipherEngineOptionMenu = ctk.CTkOptionMenu(sideBarFrame, values=engineNames())
+        cipherEngineOptionMenu.grid(row=2, column=0, padx=20, pady=(10, 10))
+        self.optionMenuWidgets["cipherEngineOptionMenu"] = cipherEngineOptionMenu
+        searchEntry = ctk.CTkEntry(sideBarFrame, placeholder_text="Search files")
+        searchEntry.grid(row=3, column=0, padx=20, pady=(10, 10))
+        searchEntry.bind("<KeyRelease>", presenter.handleSearch)
+        self.entryWidgets["searchEntry"] = searchEntry
         appearanceModeLabel = ctk.CTkLabel(sideBarFrame, text="Appearance Mode:", anchor="w")
         appearanceModeLabel.grid(row=5, column=0, padx=20, pady=(10, 0))
         appearanceModeOptioneMenu = ctk.CTkOptionMenu(
@@ -130,7 +163,7 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         """
         Build the connect section frame with widgets
         The connect section contain the connection details entry widgets
-        for ip and port, and the connect button
+        for ip and port, the TLS check box and the connect button
 
         parameters
         ----------
@@ -151,8 +184,12 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         portEntry.grid(row=2, column=2, padx=5, pady=10, sticky="n")
         self.entryWidgets["portEntry"] = portEntry
 
+        useTlsCheckBox = ctk.CTkCheckBox(master=connectFrame, text="Use TLS (FTPS)")
+        useTlsCheckBox.grid(row=3, column=2, padx=5, pady=5, sticky="n")
+        self.checkBoxWidgets["useTlsCheckBox"] = useTlsCheckBox
+
         connectButton = ctk.CTkButton(connectFrame, command=presenter.handleConnect, text="Connect")
-        connectButton.grid(row=3, column=2, padx=5, pady=10, sticky="n")
+        connectButton.grid(row=4, column=2, padx=5, pady=10, sticky="n")
         self.buttonWidgets["connectButton"] = connectButton
 
     def buildLoginSection(self, presenter: FTPClientPresenter) -> None:
@@ -227,7 +264,7 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
             self.buttonWidgets["mainEntrySelectFileButton"] = mainEntrySelectFileButton
 
             rsaKeyEntry = ctk.CTkEntry(
-                entryFrame, placeholder_text="Enter Public/Private key for Upload/Download"
+                entryFrame, placeholder_text="Enter Public key(s)/Private key for Upload/Download"
             )
             rsaKeyEntry.grid(row=1, column=0, columnspan=5, padx=20, pady=(10, 0), sticky="nsew")
             self.entryWidgets["rsaKeyEntry"] = rsaKeyEntry
@@ -307,6 +344,22 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
             disconnectButton.grid(row=3, column=1, padx=20, pady=10, sticky="nsew")
             self.buttonWidgets["disconnectButton"] = disconnectButton
 
+            indexTreeButton = ctk.CTkButton(
+                parent, command=presenter.handleIndexTree, text="Index Tree"
+            )
+            indexTreeButton.grid(row=3, column=0, padx=20, pady=10, sticky="nsew")
+            self.buttonWidgets["indexTreeButton"] = indexTreeButton
+
+            moveButton = ctk.CTkButton(parent, command=presenter.handleMove, text="Move")
+            moveButton.grid(row=3, column=2, padx=20, pady=10, sticky="nsew")
+            self.buttonWidgets["moveButton"] = moveButton
+
+            rotateKeysButton = ctk.CTkButton(
+                parent, command=presenter.handleRotateKeys, text="Rotate Keys"
+            )
+            rotateKeysButton.grid(row=4, column=1, padx=20, pady=10, sticky="nsew")
+            self.buttonWidgets["rotateKeysButton"] = rotateKeysButton
+
             self.toggleControlButtons("disabled")
 
         controlFrame = ctk.CTkFrame(self, fg_color="transparent")
@@ -353,6 +406,18 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         """
         return self.entryWidgets["portEntry"].get()  # type: ignore
 
+    @property
+    def useTls(self) -> bool:
+        """
+        Get the state of the TLS check box
+
+        returns
+        -------
+        bool
+            Whether to connect with explicit TLS
+        """
+        return bool(self.checkBoxWidgets["useTlsCheckBox"].get())
+
     @property
     def username(self) -> str:
         """
@@ -401,36 +466,54 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         """
         return self.entryWidgets["encryptedKeyFilePathEntry"].get()  # type: ignore
 
+    @property
+    def cipherEngine(self) -> str:
+        """
+        Get the selected cipher engine from the cipher engine option menu
+
+        returns
+        -------
+        str
+            The name of the cipher engine used to encrypt uploads
+        """
+        return self.optionMenuWidgets["cipherEngineOptionMenu"].get()  # type: ignore
+
+    @property
+    def searchQuery(self) -> str:
+        """
+        Get the input from the search entry widget
+
+        returns
+        -------
+        str
+            The text to search for in the index of remote files
+        """
+        return self.entryWidgets["searchEntry"].get()  # type: ignore
+
     def updateServerResponse(self, response: str) -> None:
         """
         Update the server response textbox with the response
-        The
+        The responses of a frame are inserted at once
 
         parameters
         ----------
         response: str
             The response to update the textbox with
         """
-        self.responseWidgets["serverResponseTextbox"].configure(state="normal")
-        self.responseWidgets["serverResponseTextbox"].insert("end", response)
-        self.responseWidgets["serverResponseTextbox"].configure(state="disabled")
+        self.updates.append("serverResponse", response, self._insertServerResponse)
 
     def updateDirectoryResponse(self, fileList: List[str]) -> None:
         """
         Update the directory response textbox with the directory list
-        The text is replaced with the response
+        The text is replaced with the response, only the last list of a frame is shown
 
         parameters
         ----------
         fileList: List[str]
             The list of directories/files to update the textbox with
         """
-        self.responseWidgets["directoryListTextbox"].configure(state="normal")
-        self.responseWidgets["directoryListTextbox"].delete(1.0, "end")
-        for file in fileList:
-            self.responseWidgets["directoryListTextbox"].insert("end", file)
-            self.responseWidgets["directoryListTextbox"].insert("end", "\n")
-        self.responseWidgets["directoryListTextbox"].configure(state="disabled")
+        text = "".join(file + "\n" for file in fileList)
+        self.updates.replace("directoryList", lambda: self._replaceDirectoryList(text))
 
     def toggleLoginButton(self, state: str) -> None:
         """
@@ -441,7 +524,9 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         state: str
             The state to toggle the login button to
         """
-        self.buttonWidgets["loginButton"].configure(state=state)
+        self.updates.replace(
+            "loginButton", lambda: self.buttonWidgets["loginButton"].configure(state=state)
+        )
 
     def toggleControlButtons(self, state: str) -> None:
         """
@@ -452,7 +537,37 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         state: str
             The state to toggle the login button to
         """
+        self.updates.replace("controlButtons", lambda: self._configureControlButtons(state))
+
+    def scrollDownServerResponse(self) -> None:
+        """
+        Scroll the server response textbox down
+        """
+        self.updates.replace(
+            "serverResponseScroll", lambda: self.responseWidgets["serverResponseTextbox"].see("end")
+        )
+
+    def _insertServerResponse(self, text: str) -> None:
+        """
+        Insert text at the end of the server response textbox
+        """
+        self.responseWidgets["serverResponseTextbox"].configure(state="normal")
+        self.responseWidgets["serverResponseTextbox"].insert("end", text)
+        self.responseWidgets["serverResponseTextbox"].configure(state="disabled")
+
+    def _replaceDirectoryList(self, text: str) -> None:
+        """
+        Replace the text of the directory list textbox
+        """
+        self.responseWidgets["directoryListTextbox"].configure(state="normal")
+        self.responseWidgets["directoryListTextbox"].delete(1.0, "end")
+        self.responseWidgets["directoryListTextbox"].insert("end", text)
+        self.responseWidgets["directoryListTextbox"].configure(state="disabled")
 
+    def _configureControlButtons(self, state: str) -> None:
+        """
+        Set the state of the control buttons
+        """
         self.buttonWidgets["changeDirectoryButton"].configure(state=state)
         self.buttonWidgets["createDirectoryButton"].configure(state=state)
         self.buttonWidgets["deleteDirectoryButton"].configure(state=state)
@@ -460,16 +575,13 @@ class FTPClientGui(ctk.CTk):  # type: ignore # pylint: disable=R0901
         self.buttonWidgets["uploadFileButton"].configure(state=state)
         self.buttonWidgets["deleteFileButton"].configure(state=state)
         self.buttonWidgets["disconnectButton"].configure(state=state)
+        self.buttonWidgets["indexTreeButton"].configure(state=state)
+        self.buttonWidgets["moveButton"].configure(state=state)
+        self.buttonWidgets["rotateKeysButton"].configure(state=state)
         self.buttonWidgets["mainEntrySelectFileButton"].configure(state=state)
         self.buttonWidgets["rsaKeyButton"].configure(state=state)
         self.buttonWidgets["encryptedKeyFilePathButton"].configure(state=state)
 
-    def scrollDownServerResponse(self) -> None:
-        """
-        Scroll the server response textbox down
-        """
-        self.responseWidgets["serverResponseTextbox"].see("end")
-
     def _chooseMainInputDirectory(self) -> None:
         """
         Open a file dialog to choose a directory
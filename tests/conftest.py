@@ -0,0 +1,95 @@
+"""
+Fixtures of the tests: a local FTP server (see tests.dev_server) simulating the network and
+the faults of a remote server, and sessions logged in to it.
+
+The faults of the server may be changed by a test while it runs:
+
+    def testSlowListing(model, faults):
+        faults.slowReplies["MLSD"] = 0.5
+"""
+# pylint: disable=C0103
+import pathlib
+from typing import Iterator
+
+import pytest
+from Cryptodome.PublicKey import RSA
+
+from src.model import FTPConnectionModel
+
+from .dev_server import DevFTPServer, FaultProfile
+
+USERNAME = "user"
+PASSWORD = "password"
+
+
+@pytest.fixture(name="privateKey", scope="session")
+def privateKeyFixture() -> bytes:
+    """
+    Private RSA key of the recipient of the containers, generated once.
+    """
+
+    return RSA.generate(2048).export_key()
+
+
+@pytest.fixture(name="publicKey", scope="session")
+def publicKeyFixture(privateKey: bytes) -> bytes:
+    """
+    Public RSA key matching the private key.
+    """
+
+    return RSA.import_key(privateKey).publickey().export_key()
+
+
+@pytest.fixture(name="faults")
+def faultsFixture() -> FaultProfile:
+    """
+    Faults of the server, none until a test sets them.
+    """
+
+    return FaultProfile()
+
+
+@pytest.fixture(name="remoteDirectory")
+def remoteDirectoryFixture(tmp_path: pathlib.Path) -> pathlib.Path:
+    """
+    Directory served by the server, the root of its file system.
+    """
+
+    directory = tmp_path / "remote"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture(name="localDirectory")
+def localDirectoryFixture(tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch) -> pathlib.Path:
+    """
+    Working directory of the test, where the model downloads files.
+    """
+
+    directory = tmp_path / "local"
+    directory.mkdir()
+    monkeypatch.chdir(directory)
+    return directory
+
+
+@pytest.fixture(name="ftpServer")
+def ftpServerFixture(remoteDirectory: pathlib.Path, faults: FaultProfile) -> Iterator[DevFTPServer]:
+    """
+    Local FTP server, listening on a free port of the loopback interface.
+    """
+
+    with DevFTPServer(str(remoteDirectory), USERNAME, PASSWORD, faults) as server:
+        yield server
+
+
+@pytest.fixture(name="model")
+def modelFixture(ftpServer: DevFTPServer) -> Iterator[FTPConnectionModel]:
+    """
+    Session logged in to the local server, without keepalive.
+    """
+
+    model = FTPConnectionModel(keepAliveInterval=0)
+    model.connect("127.0.0.1", ftpServer.port)
+    model.login(USERNAME, PASSWORD)
+    yield model
+    model.close()
@@ -0,0 +1,521 @@
+"""
+This module runs a local FTP server which simulates the network and the faults of a remote
+server: round trip time, bandwidth caps, data connections dropped at a chosen byte offset,
+control connections dropped and slow replies. It stands in for the production server to
+develop and measure the client offline.
+
+    $ python -m tests.dev_server ROOT --rtt 0.05 --bandwidth 1000000 --drop-after 65536
+
+The server is pyftpdlib (listed in requirements-dev.txt), it implements every command the client
+uses, REST, APPE, MLSD, MLST, SIZE, RNFR and RNTO included.
+"""
+import argparse
+import collections
+import threading
+import time
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple, Type
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.filesystems import AbstractedFS
+from pyftpdlib.handlers import FTPHandler, ThrottledDTPHandler
+from pyftpdlib.ioloop import IOLoop
+from pyftpdlib.servers import ThreadedFTPServer
+
+# commands whose data connections are dropped by default
+TRANSFER_COMMANDS = frozenset({"RETR", "STOR", "APPE"})
+
+
+class FaultProfile:
+    """
+    Network conditions and faults simulated by a DevFTPServer. Its attributes may be changed
+    while the server runs, they apply to the next replies and data connections.
+
+    - rtt: seconds added before each reply. Replies are delayed, not the server, so
+      pipelined commands wait a single round trip like on a real link.
+    - slowReplies: seconds added before the replies to some commands, by command.
+    - bandwidth: bytes per second of each data connection, 0 for no limit.
+    - dropAfter: data connections of dropCommands are closed after this many bytes,
+      None to never drop them. Only the next drops connections are dropped, so a retry
+      succeeds.
+    - disconnectAfter: the control connection receiving the command of this rank, counted
+      over all the connections, is closed without reply. 0 to never close one.
+    - maxSessions: control connections opened beyond this many at once are refused with a
+      421 reply, like a server limiting its connections. 0 for no limit.
+    """
+
+    # pylint: disable=R0902,R0913
+
+    def __init__(
+        self,
+        rtt: float = 0.0,
+        bandwidth: int = 0,
+        dropAfter: Optional[int] = None,
+        drops: int = 1,
+        dropCommands: Iterable[str] = TRANSFER_COMMANDS,
+        slowReplies: Optional[Dict[str, float]] = None,
+        disconnectAfter: int = 0,
+        maxSessions: int = 0,
+    ) -> None:
+        self.rtt = rtt
+        self.bandwidth = bandwidth
+        self.dropAfter = dropAfter
+        self.drops = drops
+        self.dropCommands = frozenset(command.upper() for command in dropCommands)
+        self.slowReplies = {
+            command.upper(): delay for command, delay in (slowReplies or {}).items()
+        }
+        self.disconnectAfter = disconnectAfter
+        self.maxSessions = maxSessions
+        self.commands = 0
+        self.sessions = 0
+        self.lock = threading.Lock()
+
+    def replyDelay(self, command: str) -> float:
+        """
+        Delay of a reply.
+
+        Parameters
+        ----------
+        command : str
+            command replied to, empty for the greeting
+        Returns
+        -------
+        float
+            seconds to wait before sending the reply
+        """
+
+        return self.rtt + self.slowReplies.get(command, 0.0)
+
+    def takeDrop(self, command: str) -> Optional[int]:
+        """
+        Whether to drop a new data connection, the drop is counted.
+
+        Parameters
+        ----------
+        command : str
+            command of the data connection
+        Returns
+        -------
+        Optional[int]
+            byte offset of the drop, None to leave the connection alone
+        """
+
+        with self.lock:
+            if self.dropAfter is None or self.drops <= 0 or command not in self.dropCommands:
+                return None
+            self.drops -= 1
+            return self.dropAfter
+
+    def openSession(self) -> bool:
+        """
+        Count a new control connection.
+
+        Returns
+        -------
+        bool
+            False if the connection is to be refused, it is then not counted
+        """
+
+        with self.lock:
+            if self.maxSessions and self.sessions >= self.maxSessions:
+                return False
+            self.sessions += 1
+            return True
+
+    def closeSession(self) -> None:
+        """
+        Count a closed control connection, opened with openSession.
+        """
+
+        with self.lock:
+            self.sessions -= 1
+
+    def countCommand(self) -> bool:
+        """
+        Count a command received by the server.
+
+        Returns
+        -------
+        bool
+            True if the control connection which received it is to be closed
+        """
+
+        with self.lock:
+            self.commands += 1
+            return self.commands == self.disconnectAfter
+
+
+class _ThreadSafeFS(AbstractedFS):  # type: ignore
+    """
+    File system of a client connection which does not change the working directory of the
+    process, the server runs in the process of the client and serves in threads.
+    """
+
+    def chdir(self, path: str) -> None:
+        if not self.isdir(path):
+            raise OSError(2, "No such file or directory", path)
+        self.cwd = self.fs2ftp(path)
+
+
+class _FaultyFTPHandler(FTPHandler):  # type: ignore # pylint: disable=R0901
+    """
+    Control connection whose replies are delayed and which may be dropped.
+    """
+
+    faults = FaultProfile()
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        # used by add_channel and close, which the base class may call
+        self.counted = False
+        self.refused = False
+        super().__init__(*args, **kwargs)
+        self.command = ""
+        self.delayedReplies: Deque[Tuple[float, str, Any]] = collections.deque()
+        self.closeWhenSent = False
+
+    def handle(self) -> None:
+        if not self.faults.openSession():
+            self.refused = True
+            self.respond("421 Too many connections.")
+            return
+        self.counted = True
+        super().handle()
+
+    def add_channel(self, *args: Any, **kwargs: Any) -> None:
+        super().add_channel(*args, **kwargs)
+        # closed once registered, the thread serving the connection registers it after handle
+        if self.refused:
+            self.close_when_done()
+
+    def close(self) -> None:
+        if self.counted:
+            self.counted = False
+            self.faults.closeSession()
+        super().close()
+
+    def process_command(self, cmd: str, *args: Any, **kwargs: Any) -> None:
+        if self.faults.countCommand():
+            self.close()
+            return
+        self.command = cmd
+        super().process_command(cmd, *args, **kwargs)
+
+    def respond(self, resp: str, logfun: Any = None) -> None:
+        delay = self.faults.replyDelay(self.command)
+        if delay <= 0 and not self.delayedReplies:
+            self._respondNow(resp, logfun)
+            return
+        # replies keep their order, a reply is never sent before the previous one
+        due = time.monotonic() + delay
+        if self.delayedReplies:
+            due = max(due, self.delayedReplies[-1][0])
+        self._last_response = resp
+        self.delayedReplies.append((due, resp, logfun))
+        if len(self.delayedReplies) == 1:
+            self.ioloop.call_later(delay, self._sendDelayedReplies, _errback=self.handle_error)
+
+    def close_when_done(self) -> None:
+        if self.delayedReplies:
+            self.closeWhenSent = True
+        else:
+            super().close_when_done()
+
+    def _sendDelayedReplies(self) -> None:
+        if self._closed:
+            return
+        now = time.monotonic()
+        while self.delayedReplies and self.delayedReplies[0][0] <= now:
+            _, resp, logfun = self.delayedReplies.popleft()
+            self._respondNow(resp, logfun)
+        if self.delayedReplies:
+            self.ioloop.call_later(
+                self.delayedReplies[0][0] - now,
+                self._sendDelayedReplies,
+                _errback=self.handle_error,
+            )
+        elif self.closeWhenSent:
+            super().close_when_done()
+
+    def _respondNow(self, resp: str, logfun: Any) -> None:
+        if logfun is None:
+            super().respond(resp)
+        else:
+            super().respond(resp, logfun)
+
+
+class _FaultyDTPHandler(ThrottledDTPHandler):  # type: ignore # pylint: disable=R0901,W0223
+    """
+    Data connection capped to the bandwidth of the faults, and dropped at their byte offset.
+    """
+
+    faults = FaultProfile()
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self.dropAt: Optional[int] = None
+        self.checkedDrop = False
+        self.dropNow = False
+        # start of the transfer and bytes transferred since, to pace it
+        self.paceStart: Optional[float] = None
+        self.pacedBytes = 0
+        super().__init__(*args, **kwargs)
+
+    @property
+    def read_limit(self) -> int:  # pylint: disable=C0103
+        """
+        Bytes per second received, 0 for no limit.
+        """
+
+        return self.faults.bandwidth
+
+    @property
+    def write_limit(self) -> int:  # pylint: disable=C0103
+        """
+        Bytes per second sent, 0 for no limit.
+        """
+
+        return self.faults.bandwidth
+
+    def _throttle_bandwidth(self, len_chunk: int, max_speed: int) -> None:
+        # the transfer is paced from its start, the throttle of pyftpdlib lets about two
+        # seconds of data through before it slows down
+        now = time.monotonic()
+        if self.paceStart is None:
+            self.paceStart = now
+        self.pacedBytes += len_chunk
+        delay = self.paceStart + self.pacedBytes / max_speed - now
+        if delay <= 0:
+            return
+
+        def resume() -> None:
+            self.add_channel(events=self.ioloop.READ if self.receive else self.ioloop.WRITE)
+
+        self.del_channel()
+        self._cancel_throttler()
+        self._throttler = self.ioloop.call_later(delay, resume, _errback=self.handle_error)
+
+    def send(self, data: bytes) -> int:
+        remaining = self._remaining()
+        if remaining is not None:
+            data = data[:remaining]
+        sent: int = super().send(data)
+        if remaining is not None and sent >= remaining:
+            self._drop()
+        return sent
+
+    def recv(self, buffer_size: int) -> bytes:  # pylint: disable=C0103
+        chunk: bytes = super().recv(buffer_size)
+        remaining = self._remaining()
+        if remaining is not None and len(chunk) >= remaining:
+            # the bytes before the offset are written, the connection is dropped after
+            chunk = chunk[:remaining]
+            self.dropNow = True
+        return chunk
+
+    def handle_read(self) -> None:
+        super().handle_read()
+        if self.dropNow:
+            self._drop()
+
+    handle_read_event = handle_read
+
+    def _remaining(self) -> Optional[int]:
+        if not self.checkedDrop:
+            self.checkedDrop = True
+            # the first block is sent before the command of the transfer is set
+            command = self.cmd or self.cmd_channel.command
+            self.dropAt = self.faults.takeDrop(command.upper())
+        if self.dropAt is None:
+            return None
+        return max(self.dropAt - int(self.get_transmitted_bytes()), 0)
+
+    def _drop(self) -> None:
+        if not self._closed:
+            self._resp = ("426 Connection dropped; transfer aborted.", None)
+            self.close()
+
+
+class _ThreadedServer(ThreadedFTPServer):  # type: ignore # pylint: disable=R0901,W0223
+    """
+    Threaded server which can be closed alone.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # the exit event is a class attribute, closing a server would end the connections
+        # of all the servers of the process
+        self._exit = threading.Event()
+        self._lock = threading.Lock()
+
+
+class DevFTPServer:
+    """
+    Local FTP server simulating the faults of a FaultProfile, served by a background thread.
+    Each client connection has its own thread, so a slow connection does not delay the
+    others, and several servers can run in the same process.
+
+        with DevFTPServer(root, faults=FaultProfile(rtt=0.05)) as server:
+            model.connect("127.0.0.1", server.port)
+    """
+
+    def __init__(
+        self,
+        root: str,
+        username: str = "user",
+        password: str = "password",
+        faults: Optional[FaultProfile] = None,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        certfile: Optional[str] = None,
+    ) -> None:
+        self.faults = faults if faults is not None else FaultProfile()
+        authorizer = DummyAuthorizer()
+        authorizer.add_user(username, password, root, perm="elradfmwMT")
+
+        controlBases: List[Type[Any]] = [_FaultyFTPHandler]
+        dataBases: List[Type[Any]] = [_FaultyDTPHandler]
+        if certfile is not None:
+            # pylint: disable=C0415
+            from pyftpdlib.handlers import TLS_DTPHandler, TLS_FTPHandler
+
+            controlBases.append(TLS_FTPHandler)
+            dataBases.append(TLS_DTPHandler)
+        dataHandler = type("DevDTPHandler", tuple(dataBases), {"faults": self.faults})
+        handler = type(
+            "DevFTPHandler",
+            tuple(controlBases),
+            {
+                "faults": self.faults,
+                "authorizer": authorizer,
+                "dtp_handler": dataHandler,
+                "abstracted_fs": _ThreadSafeFS,
+                "certfile": certfile,
+                "tls_control_required": False,
+                "tls_data_required": False,
+            },
+        )
+        # an ioloop of its own, several servers may run in the same process
+        self.server = _ThreadedServer(address, handler, ioloop=IOLoop())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """
+        Port the server listens on.
+
+        Returns
+        -------
+        int
+            the port
+        """
+
+        return int(self.server.address[1])
+
+    def start(self) -> "DevFTPServer":
+        """
+        Serve in a background thread.
+
+        Returns
+        -------
+        DevFTPServer
+            the server
+        """
+
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            kwargs={"timeout": 0.1, "handle_exit": False},
+            name="dev-ftp-server",
+            daemon=True,
+        )
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Close the server and all its connections.
+        """
+
+        self.server.close_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self) -> "DevFTPServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+
+def _slowReply(value: str) -> Tuple[str, float]:
+    command, _, delay = value.partition("=")
+    return command, float(delay)
+
+
+def main(arguments: Optional[List[str]] = None) -> None:
+    """
+    Run a development server until interrupted.
+
+    Parameters
+    ----------
+    arguments : Optional[List[str]]
+        arguments to parse, the command line if None
+    """
+
+    parser = argparse.ArgumentParser(description="Local FTP server with simulated faults")
+    parser.add_argument("root", help="directory served")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2121)
+    parser.add_argument("--user", default="user")
+    parser.add_argument("--password", default="password")
+    parser.add_argument("--rtt", type=float, default=0.0, help="seconds added to each reply")
+    parser.add_argument("--bandwidth", type=int, default=0, help="bytes per second, 0 no cap")
+    parser.add_argument(
+        "--drop-after", type=int, default=None, metavar="BYTES", help="drop transfers here"
+    )
+    parser.add_argument("--drops", type=int, default=1, help="number of transfers dropped")
+    parser.add_argument(
+        "--slow",
+        type=_slowReply,
+        action="append",
+        default=[],
+        metavar="COMMAND=SECONDS",
+        help="delay the replies to a command",
+    )
+    parser.add_argument(
+        "--disconnect-after", type=int, default=0, metavar="N", help="drop at the Nth command"
+    )
+    parser.add_argument(
+        "--max-sessions", type=int, default=0, metavar="N", help="refuse connections beyond N"
+    )
+    parser.add_argument("--certfile", default=None, help="certificate and key for FTPS")
+    options = parser.parse_args(arguments)
+
+    faults = FaultProfile(
+        options.rtt,
+        options.bandwidth,
+        options.drop_after,
+        options.drops,
+        slowReplies=dict(options.slow),
+        disconnectAfter=options.disconnect_after,
+        maxSessions=options.max_sessions,
+    )
+    server = DevFTPServer(
+        options.root,
+        options.user,
+        options.password,
+        faults,
+        (options.host, options.port),
+        options.certfile,
+    )
+    print(f"Serving {options.root} on {options.host}:{server.port}")
+    server.start()
+    try:
+        while server.thread is not None and server.thread.is_alive():
+            server.thread.join(0.5)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
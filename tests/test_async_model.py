@@ -0,0 +1,260 @@
+"""
+Tests of AsyncFTPConnectionModel against the local server.
+"""
+import asyncio
+import os
+import pathlib
+import time
+from typing import Any, BinaryIO, List
+
+import pytest
+
+import src.async_model
+from src.async_model import AsyncFTPConnectionModel
+from src.cipher.aead import AESGCMEngine
+from src.model import FTPError
+
+from .dev_server import DevFTPServer, FaultProfile
+from .conftest import PASSWORD, USERNAME
+
+
+async def _session(ftpServer: DevFTPServer, timeout: float = 5) -> AsyncFTPConnectionModel:
+    session = AsyncFTPConnectionModel(timeout)
+    await session.connect("127.0.0.1", ftpServer.port)
+    await session.login(USERNAME, PASSWORD)
+    return session
+
+
+def testFailedReceiveLeavesSessionUsable(
+    ftpServer: DevFTPServer, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    The reply of a transfer whose receiver failed is read, the next command gets its own.
+    """
+
+    (remoteDirectory / "file.bin").write_bytes(os.urandom(1_000_000))
+
+    def receive(block: bytes) -> None:
+        raise ValueError("receiver failed")
+
+    async def scenario() -> None:
+        session = await _session(ftpServer)
+        try:
+            with pytest.raises(ValueError):
+                await session.retrieve("file.bin", receive)
+            assert (await session.createDirectory("directory")).startswith("257")
+            assert (remoteDirectory / "directory").is_dir()
+        finally:
+            await session.disconnect()
+
+    asyncio.run(scenario())
+
+
+def testUploadAndDownload(
+    ftpServer: DevFTPServer, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    A file uploaded then downloaded is unchanged.
+    """
+
+    data = os.urandom(300_000)
+    (localDirectory / "file.bin").write_bytes(data)
+
+    async def scenario() -> None:
+        session = await _session(ftpServer)
+        try:
+            await session.uploadFile("file.bin")
+            os.remove("file.bin")
+            await session.downloadFile("file.bin")
+        finally:
+            await session.disconnect()
+
+    asyncio.run(scenario())
+
+    assert (remoteDirectory / "file.bin").read_bytes() == data
+    assert (localDirectory / "file.bin").read_bytes() == data
+
+
+def testTransformedTransfers(ftpServer: DevFTPServer, remoteDirectory: pathlib.Path) -> None:
+    """
+    Streams are encrypted on the way up and decrypted on the way down.
+    """
+
+    data = os.urandom(200_000)
+    engine = AESGCMEngine()
+    keys = engine.generateKeys()
+
+    async def scenario() -> bytes:
+        session = await _session(ftpServer)
+        try:
+            chunks = [data[start : start + 50_000] for start in range(0, len(data), 50_000)]
+            await session.store("file.bin", chunks, engine.encryptor(keys))
+            blocks: List[bytes] = []
+            await session.retrieve("file.bin", blocks.append, engine.decryptor(keys))
+            return b"".join(blocks)
+        finally:
+            await session.disconnect()
+
+    assert asyncio.run(scenario()) == data
+    assert (remoteDirectory / "file.bin").read_bytes() != data
+
+
+def testDirectories(ftpServer: DevFTPServer, remoteDirectory: pathlib.Path) -> None:
+    """
+    Directories are created, listed, entered and deleted.
+    """
+
+    async def scenario() -> List[str]:
+        session = await _session(ftpServer)
+        try:
+            await session.createDirectory("directory")
+            await session.changeDirectory("directory")
+            await session.store("file.txt", [b"content"])
+            names = await session.displayDirectory()
+            await session.deleteFile("file.txt")
+            await session.changeDirectory("..")
+            await session.deleteDirectory("directory")
+            return names
+        finally:
+            await session.disconnect()
+
+    assert asyncio.run(scenario()) == ["file.txt"]
+    assert not list(remoteDirectory.iterdir())
+
+
+def testConcurrentSessions(
+    ftpServer: DevFTPServer, faults: FaultProfile, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    Sessions driven by one event loop wait their round trips at the same time.
+    """
+
+    faults.rtt = 0.05
+    contents = {f"file{index}.bin": os.urandom(10_000) for index in range(8)}
+
+    async def upload(name: str) -> None:
+        session = await _session(ftpServer)
+        try:
+            await session.store(name, [contents[name]])
+        finally:
+            await session.disconnect()
+
+    async def scenario() -> None:
+        await asyncio.gather(*(upload(name) for name in contents))
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+    elapsed = time.perf_counter() - start
+
+    for name, data in contents.items():
+        assert (remoteDirectory / name).read_bytes() == data
+    # each session waits about 9 round trips, the 8 sessions together far less than 8 times
+    assert elapsed < 3 * 9 * faults.rtt
+
+
+def testNewlinesAreRejected(ftpServer: DevFTPServer, remoteDirectory: pathlib.Path) -> None:
+    """
+    A name with an end of line cannot smuggle a second command.
+    """
+
+    (remoteDirectory / "kept.txt").write_bytes(b"content")
+
+    async def scenario() -> None:
+        session = await _session(ftpServer)
+        try:
+            for name in ("file.txt\r\nDELE kept.txt", "file.txt\nDELE kept.txt"):
+                with pytest.raises(ValueError):
+                    await session.deleteFile(name)
+            assert (await session.displayDirectory()) == ["kept.txt"]
+        finally:
+            await session.disconnect()
+
+    asyncio.run(scenario())
+    assert (remoteDirectory / "kept.txt").exists()
+
+
+def testStalledDataConnectionTimesOut(
+    ftpServer: DevFTPServer,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+) -> None:
+    """
+    A download whose data connection stalls fails after the timeout and leaves no file.
+    """
+
+    (remoteDirectory / "file.bin").write_bytes(os.urandom(1_000_000))
+
+    async def scenario() -> None:
+        session = await _session(ftpServer, timeout=0.5)
+        faults.bandwidth = 1000
+        try:
+            with pytest.raises(FTPError, match="timed out"):
+                await session.downloadFile("file.bin")
+        finally:
+            session.writer.close()  # type: ignore[union-attr]
+
+    start = time.perf_counter()
+    asyncio.run(scenario())
+
+    assert time.perf_counter() - start < 5
+    assert not (localDirectory / "file.bin").exists()
+
+
+def testFileIOLeavesTheLoopFree(
+    ftpServer: DevFTPServer,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    Local files are written outside the event loop, a slow disk does not stall other tasks.
+    """
+
+    (remoteDirectory / "file.bin").write_bytes(os.urandom(640 * 1024))
+    openBinary = src.async_model._openBinary  # pylint: disable=W0212
+
+    class SlowFile:
+        """
+        File whose writes block like a slow disk.
+        """
+
+        # pylint: disable=C0116
+
+        def __init__(self, file: BinaryIO) -> None:
+            self.file = file
+
+        def write(self, data: bytes) -> int:
+            time.sleep(0.05)
+            return self.file.write(data)
+
+        def close(self) -> None:
+            self.file.close()
+
+    def slowOpen(fileName: str, mode: str) -> Any:
+        return SlowFile(openBinary(fileName, mode))
+
+    monkeypatch.setattr(src.async_model, "_openBinary", slowOpen)
+
+    async def scenario() -> float:
+        session = await _session(ftpServer)
+        longest = 0.0
+
+        async def ticker() -> None:
+            nonlocal longest
+            while True:
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                longest = max(longest, time.perf_counter() - start)
+
+        tick = asyncio.ensure_future(ticker())
+        try:
+            await session.downloadFile("file.bin")
+        finally:
+            tick.cancel()
+            await session.disconnect()
+        return longest
+
+    # a write on the loop would hold it for 50 ms
+    assert asyncio.run(scenario()) < 0.03
+    assert (localDirectory / "file.bin").stat().st_size == 640 * 1024
@@ -0,0 +1,54 @@
+"""
+Benchmarks of the client against the local server. They run with the tests and check the
+order of magnitude of a gain, make benchmark prints the measures.
+"""
+import io
+import os
+import pathlib
+import time
+from typing import Callable
+
+import pytest
+
+from src.model import FTPConnectionModel
+
+GIGABYTE = 1024**3
+
+
+def _cpuPerGigabyte(upload: Callable[[], None], size: int, runs: int = 3) -> float:
+    # CPU time of the calling thread only, the server runs in other threads of the process
+    cpuTimes = []
+    for _ in range(runs):
+        start = time.thread_time()
+        upload()
+        cpuTimes.append(time.thread_time() - start)
+    return min(cpuTimes) * GIGABYTE / size
+
+
+@pytest.mark.benchmark
+def testSendfileCpuPerGigabyte(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    Uploads handed to the kernel with sendfile cost less CPU than a copy through user space.
+    """
+
+    size = 64 * 1024 * 1024
+    data = os.urandom(size)
+    (localDirectory / "file.bin").write_bytes(data)
+
+    def uploadFromDisk() -> None:
+        with open("file.bin", "rb") as file:
+            model.store("/file.bin", file)
+
+    def uploadFromMemory() -> None:
+        model.store("/file.bin", io.BytesIO(data))
+
+    # a file on disk is sent with sendfile, a file in memory has no descriptor and is sent
+    # block by block
+    sendfile = _cpuPerGigabyte(uploadFromDisk, size)
+    copied = _cpuPerGigabyte(uploadFromMemory, size)
+    print(f"\nupload CPU per GB: sendfile {sendfile:.3f} s, copied {copied:.3f} s")
+
+    assert (remoteDirectory / "file.bin").stat().st_size == size
+    assert sendfile < copied / 2
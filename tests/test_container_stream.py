@@ -0,0 +1,145 @@
+"""
+Tests of the verification of containers against their hash tree, while they are decrypted
+and range by range.
+"""
+import io
+import os
+import pathlib
+from typing import Tuple
+
+import pytest
+
+from src.file_handler.container import packHeader, readHeader
+from src.file_handler.container_stream import ContainerDecryptor, ContainerVerifier
+from src.file_handler.file_cryptographer import FileCryptographer
+from src.file_handler.integrity import SEGMENT_SIZE, IntegrityError
+from src.file_handler.keyring import Keyring
+
+BLOCK_SIZE = 64 * 1024
+
+
+@pytest.fixture(name="container")
+def containerFixture(  # pylint: disable=C0103
+    tmp_path: pathlib.Path, privateKey: bytes, publicKey: bytes
+) -> Tuple[bytes, bytes, bytes]:
+    """
+    Plaintext of four segments and a half, its container and the keys of the container.
+    """
+
+    plaintext = os.urandom(4 * SEGMENT_SIZE + SEGMENT_SIZE // 2)
+    source = tmp_path / "file.bin"
+    source.write_bytes(plaintext)
+    containerPath = FileCryptographer.encryptToContainer(str(source), [publicKey])
+    keyring = Keyring()
+    keyring.addKey(privateKey)
+    keys = FileCryptographer.unwrapContainerKeys(containerPath, keyring)
+    return plaintext, pathlib.Path(containerPath).read_bytes(), keys
+
+
+def _headerLength(data: bytes) -> int:
+    stream = io.BytesIO(data)
+    readHeader(stream)
+    return stream.tell()
+
+
+def _corrupted(data: bytes, offset: int) -> bytes:
+    return data[:offset] + bytes([data[offset] ^ 1]) + data[offset + 1 :]
+
+
+def _decrypt(decryptor: ContainerDecryptor, data: bytes) -> Tuple[bytes, int]:
+    # returns the plaintext and the bytes fed before an error
+    plaintext = io.BytesIO()
+    fed = 0
+    try:
+        for offset in range(0, len(data), BLOCK_SIZE):
+            fed += len(data[offset : offset + BLOCK_SIZE])
+            plaintext.write(decryptor.update(data[offset : offset + BLOCK_SIZE]))
+        plaintext.write(decryptor.finalize())
+    except IntegrityError:
+        return plaintext.getvalue(), fed
+    return plaintext.getvalue(), -1
+
+
+def testSegmentsAreVerifiedWhileDecrypting(container: Tuple[bytes, bytes, bytes]) -> None:
+    """
+    An intact container is decrypted by the keys or the unwrap callback, to the caller or to
+    an output file.
+    """
+
+    plaintext, data, keys = container
+
+    assert _decrypt(ContainerDecryptor(keys=keys), data) == (plaintext, -1)
+
+    output = io.BytesIO()
+    decryptor = ContainerDecryptor(unwrap=lambda envelopes: keys, output=output)
+    assert _decrypt(decryptor, data) == (b"", -1)
+    assert output.getvalue() == plaintext
+
+
+def testForgedHashTreeIsRejected(container: Tuple[bytes, bytes, bytes]) -> None:
+    """
+    Segment hashes which do not match the root wrapped with the keys are rejected with the
+    header, before any data is decrypted.
+    """
+
+    _, data, keys = container
+    headerLength = _headerLength(data)
+    header = readHeader(io.BytesIO(data))
+    leaves = (bytes(len(header.leaves[0])),) + header.leaves[1:]
+    forged = packHeader(header._replace(leaves=leaves)) + data[headerLength:]
+
+    # rejected with the first block, which holds the header
+    assert headerLength < BLOCK_SIZE
+    assert _decrypt(ContainerDecryptor(keys=keys), forged) == (b"", BLOCK_SIZE)
+
+
+def testCorruptedSegmentStopsTheDecryption(container: Tuple[bytes, bytes, bytes]) -> None:
+    """
+    The decryption stops once the corrupted segment is received, the next segments are not
+    read and only the segments before it are output.
+    """
+
+    plaintext, data, keys = container
+    headerLength = _headerLength(data)
+    corrupted = _corrupted(data, headerLength + SEGMENT_SIZE + 100)
+
+    decrypted, fed = _decrypt(ContainerDecryptor(keys=keys), corrupted)
+
+    assert 0 < fed <= headerLength + 2 * SEGMENT_SIZE + BLOCK_SIZE
+    assert len(decrypted) <= 2 * SEGMENT_SIZE
+    assert plaintext.startswith(decrypted[:SEGMENT_SIZE])
+
+
+def testRangesAreCheckedOnTheirOwn(container: Tuple[bytes, bytes, bytes]) -> None:
+    """
+    Each range starting at an aligned offset is decrypted from its offset and checked against
+    the hash tree, a corrupted range fails alone.
+    """
+
+    _, data, keys = container
+    headerLength = _headerLength(data)
+    header = readHeader(io.BytesIO(data))
+    verifier = ContainerVerifier(header, data[:headerLength], keys)
+    offsets = [verifier.align(offset) for offset in (100, len(data) // 3, 2 * len(data) // 3)]
+    bounds = offsets + [len(data)]
+    assert offsets == [0, headerLength + SEGMENT_SIZE, headerLength + 2 * SEGMENT_SIZE]
+
+    corrupted = _corrupted(data, headerLength + 3 * SEGMENT_SIZE + 5)
+    for start, end in zip(offsets, bounds[1:]):
+        check = verifier.rangeCheck(start, end - start)
+        assert check.update(data[start:end]) == b""
+        assert check.finalize() == b""
+        check = verifier.rangeCheck(start, end - start)
+        if start == offsets[-1]:
+            with pytest.raises(IntegrityError):
+                check.update(corrupted[start:end])
+        else:
+            check.update(corrupted[start:end])
+            check.finalize()
+
+    check = verifier.rangeCheck(offsets[1], SEGMENT_SIZE)
+    check.update(data[offsets[1] : offsets[1] + SEGMENT_SIZE // 2])
+    with pytest.raises(IntegrityError):
+        check.finalize()
+    with pytest.raises(ValueError):
+        verifier.rangeCheck(offsets[1] + 16, SEGMENT_SIZE)
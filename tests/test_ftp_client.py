@@ -0,0 +1,104 @@
+"""
+Tests of the TLS session resumption of the FTPS client against the local server.
+"""
+import datetime
+import ipaddress
+import os
+import pathlib
+import ssl
+from typing import Iterator
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from src.ftp_client import SessionReusingFTPTLS, TLSSessionCache
+from src.model import FTPConnectionModel
+
+from .dev_server import DevFTPServer
+from .conftest import PASSWORD, USERNAME
+
+
+@pytest.fixture(name="certificate")
+def certificateFixture(tmp_path: pathlib.Path) -> pathlib.Path:  # pylint: disable=C0103
+    """
+    Self-signed certificate of 127.0.0.1 and its key, in a single PEM file.
+    """
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]),
+            critical=False,
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    path = tmp_path / "certificate.pem"
+    path.write_bytes(
+        certificate.public_bytes(serialization.Encoding.PEM)
+        + key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return path
+
+
+@pytest.fixture(name="tlsServer")
+def tlsServerFixture(
+    remoteDirectory: pathlib.Path, certificate: pathlib.Path
+) -> Iterator[DevFTPServer]:
+    """
+    Local FTPS server, explicit TLS with the self-signed certificate.
+    """
+
+    with DevFTPServer(
+        str(remoteDirectory), USERNAME, PASSWORD, certfile=str(certificate)
+    ) as server:
+        yield server
+
+
+def testTlsSessionsAreResumed(
+    tlsServer: DevFTPServer, certificate: pathlib.Path, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    Data connections and later sessions resume the session of the first handshake.
+    """
+
+    data = os.urandom(100_000)
+    (remoteDirectory / "file.bin").write_bytes(data)
+    cache = TLSSessionCache(ssl.create_default_context(cafile=str(certificate)))
+    model = FTPConnectionModel(cache, keepAliveInterval=0)
+    model.connect("127.0.0.1", tlsServer.port, useTls=True)
+    model.login(USERNAME, PASSWORD)
+    try:
+        blocks = []
+        for _ in range(3):
+            model.retrieve("file.bin", lambda block: blocks.append(bytes(block)))
+        assert b"".join(blocks) == data * 3
+        assert isinstance(model.ftp, SessionReusingFTPTLS)
+        # the control connection does the only full handshake
+        assert model.ftp.handshakes == 4
+        assert model.ftp.resumedHandshakes == 3
+
+        session = model.openSession()
+        try:
+            assert isinstance(session.ftp, SessionReusingFTPTLS)
+            assert session.ftp.resumedHandshakes == session.ftp.handshakes == 1
+        finally:
+            session.close()
+    finally:
+        model.close()
@@ -0,0 +1,47 @@
+"""
+Tests of SessionKeyCache.
+"""
+import time
+
+import pytest
+
+from src.file_handler.key_cache import SessionKeyCache
+
+FACTS = ("1024", "20240101000000")
+
+
+def testKeysAreReturnedWhileTheFileIsUnchanged() -> None:
+    """
+    Keys are returned for the same size and modification time, wiped when the file changed.
+    """
+
+    cache = SessionKeyCache()
+    cache.put("/file.sfs", FACTS, b"keys")
+    entry = cache.entries["/file.sfs"]
+
+    assert cache.get("/file.sfs", FACTS) == b"keys"
+    assert cache.get("/file.sfs", ("2048", FACTS[1])) is None
+    assert entry.keys == bytes(4)
+    assert cache.get("/file.sfs", FACTS) is None
+
+
+def testExpiredKeysAreZeroed(monkeypatch: pytest.MonkeyPatch) -> None:
+    """
+    Expired keys are overwritten with zeros at the next use of the cache, for any file.
+    """
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache = SessionKeyCache(ttl=10.0)
+    cache.put("/old.sfs", FACTS, b"old keys")
+    entry = cache.entries["/old.sfs"]
+
+    now += 5.0
+    cache.put("/new.sfs", FACTS, b"new keys")
+    assert entry.keys == bytearray(b"old keys")
+
+    now += 6.0
+    assert cache.get("/other.sfs", FACTS) is None
+    assert entry.keys == bytes(len(b"old keys"))
+    assert list(cache.entries) == ["/new.sfs"]
+    assert cache.get("/new.sfs", FACTS) == b"new keys"
@@ -0,0 +1,55 @@
+"""
+Tests of Keyring.
+"""
+import pytest
+from Cryptodome.PublicKey import RSA
+
+from src.cipher.RSA import RSACipher
+from src.file_handler.container import KeyEnvelope
+from src.file_handler.keyring import Keyring
+
+
+def _envelope(publicKey: bytes, payload: bytes, keyId: bytes = b"") -> KeyEnvelope:
+    return KeyEnvelope(keyId, RSACipher(publicKey).encrypt(payload))
+
+
+def _corrupted(envelope: KeyEnvelope) -> KeyEnvelope:
+    wrappedKeys = bytearray(envelope.wrappedKeys)
+    wrappedKeys[len(wrappedKeys) // 2] ^= 0xFF
+    return envelope._replace(wrappedKeys=bytes(wrappedKeys))
+
+
+def testCorruptedEnvelopeFallsBackToTheOthers(privateKey: bytes, publicKey: bytes) -> None:
+    """
+    An envelope which does not unwrap, torn by an interrupted rewrite, is skipped for the next
+    envelope of a key of the keyring, then for the envelopes without key id.
+    """
+
+    otherPrivateKey = RSA.generate(2048).export_key()
+    otherPublicKey = RSA.import_key(otherPrivateKey).publickey().export_key()
+    keyring = Keyring()
+    keyId = keyring.addKey(privateKey)
+    otherKeyId = keyring.addKey(otherPrivateKey)
+    payload = b"keys of the file"
+
+    torn = _corrupted(_envelope(publicKey, payload, keyId))
+    assert keyring.unwrapEnvelopes([torn, _envelope(otherPublicKey, payload, otherKeyId)]) == (
+        payload
+    )
+    assert keyring.unwrapEnvelopes([torn, _envelope(otherPublicKey, payload)]) == payload
+    with pytest.raises(ValueError, match="could be unwrapped"):
+        keyring.unwrapEnvelopes([torn])
+
+
+def testEnvelopesOfOtherKeysAreNotTried(privateKey: bytes, publicKey: bytes) -> None:
+    """
+    A container without an envelope for the keyring is reported as not shared with it.
+    """
+
+    keyring = Keyring()
+    keyId = RSACipher(publicKey).fingerprint()
+
+    with pytest.raises(ValueError, match="not shared"):
+        keyring.unwrapEnvelopes([_envelope(publicKey, b"keys", keyId)])
+    keyring.addKey(privateKey)
+    assert keyring.unwrapEnvelopes([_envelope(publicKey, b"keys", keyId)]) == b"keys"
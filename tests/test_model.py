@@ -0,0 +1,251 @@
+"""
+Tests of FTPConnectionModel against the local server.
+"""
+import ftplib
+import io
+import os
+import pathlib
+import time
+
+import pytest
+
+from src.model import FTPConnectionModel, FTPError
+from src.transfer_control import DOWNLOAD, TransferDecision
+
+from .dev_server import FaultProfile
+
+
+def testUploadAndDownload(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    A file uploaded then downloaded is unchanged.
+    """
+
+    data = os.urandom(300_000)
+    (localDirectory / "file.bin").write_bytes(data)
+
+    model.uploadFile("file.bin")
+    assert (remoteDirectory / "file.bin").read_bytes() == data
+
+    os.remove("file.bin")
+    model.downloadFile("file.bin")
+    assert (localDirectory / "file.bin").read_bytes() == data
+
+
+def testSegmentedDownload(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    A large file is downloaded in ranges over parallel sessions.
+    """
+
+    data = os.urandom(1024 * 1024 + 17)
+    (remoteDirectory / "large.bin").write_bytes(data)
+    model.controller.decisions[DOWNLOAD] = TransferDecision(64 * 1024, 256 * 1024, 3, "test")
+
+    response = model.downloadFile("large.bin")
+
+    assert "226 Downloaded in 3 segments" in response
+    assert (localDirectory / "large.bin").read_bytes() == data
+
+
+def testSessionSetupIsNotMeasured(
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+) -> None:
+    """
+    The controller measures the segments, not the login of their sessions.
+    """
+
+    (remoteDirectory / "large.bin").write_bytes(os.urandom(1024 * 1024))
+    model.controller.decisions[DOWNLOAD] = TransferDecision(64 * 1024, 256 * 1024, 3, "test")
+    faults.rtt = 0.05
+
+    start = time.perf_counter()
+    model.downloadFile("large.bin")
+    elapsed = time.perf_counter() - start
+
+    measurement = model.controller.history[-1]
+    assert measurement.direction == DOWNLOAD
+    assert measurement.connections == 3
+    # two sessions are opened one after the other, each waits several round trips
+    assert measurement.seconds < elapsed - 4 * faults.rtt
+    assert (localDirectory / "large.bin").stat().st_size == 1024 * 1024
+
+
+def testDownloadRange(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    A range is written at its offset (REST then RETR).
+    """
+
+    data = os.urandom(100_000)
+    (remoteDirectory / "file.bin").write_bytes(data)
+
+    with open(localDirectory / "range.bin", "wb") as file:
+        received = model.downloadRange("file.bin", 40_000, 25_000, file)
+
+    assert received == 25_000
+    local = (localDirectory / "range.bin").read_bytes()
+    assert local[40_000:] == data[40_000:65_000]
+    # the session is usable after the server aborted the rest of the file
+    assert model.fileFacts("file.bin")["size"] == str(len(data))
+
+
+def testListDirectory(model: FTPConnectionModel, remoteDirectory: pathlib.Path) -> None:
+    """
+    Entries are listed with their facts (MLSD).
+    """
+
+    (remoteDirectory / "directory").mkdir()
+    (remoteDirectory / "directory" / "file.txt").write_bytes(b"content")
+
+    entries = dict(model.listDirectory("/directory"))
+    root = dict(model.listDirectory("/"))
+
+    assert list(entries) == ["file.txt"]
+    assert entries["file.txt"]["type"] == "file"
+    assert entries["file.txt"]["size"] == "7"
+    assert root["directory"]["type"] == "dir"
+
+
+def testRename(model: FTPConnectionModel, remoteDirectory: pathlib.Path) -> None:
+    """
+    A file is moved to another directory (RNFR then RNTO).
+    """
+
+    (remoteDirectory / "directory").mkdir()
+    (remoteDirectory / "old.txt").write_bytes(b"content")
+
+    model.rename("old.txt", "/directory/new.txt")
+
+    assert not (remoteDirectory / "old.txt").exists()
+    assert (remoteDirectory / "directory" / "new.txt").read_bytes() == b"content"
+    with pytest.raises(FTPError):
+        model.rename("missing.txt", "other.txt")
+
+
+def testDroppedDownload(
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+) -> None:
+    """
+    A dropped download is reported and leaves no partial file.
+    """
+
+    data = os.urandom(500_000)
+    (remoteDirectory / "file.bin").write_bytes(data)
+    faults.dropAfter = 100_000
+
+    with pytest.raises(ftplib.error_temp, match="426"):
+        model.downloadFile("file.bin")
+    assert not (localDirectory / "file.bin").exists()
+
+    model.downloadFile("file.bin")
+    assert (localDirectory / "file.bin").read_bytes() == data
+
+
+def testDroppedUpload(
+    model: FTPConnectionModel, faults: FaultProfile, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    A dropped upload is reported, the session stores again.
+    """
+
+    data = os.urandom(3_000_000)
+    faults.dropAfter = 100_000
+
+    # the server closes the data connection, the client gets a broken pipe or the 426 reply
+    with pytest.raises((FTPError, ftplib.error_temp)):
+        model.store("/file.bin", io.BytesIO(data))
+    assert (remoteDirectory / "file.bin").stat().st_size == 100_000
+
+    model.store("/file.bin", io.BytesIO(data))
+    assert (remoteDirectory / "file.bin").read_bytes() == data
+
+
+def testDroppedUploadIsRetried(
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+) -> None:
+    """
+    An upload whose connection breaks is retried once.
+    """
+
+    data = os.urandom(3_000_000)
+    (localDirectory / "file.bin").write_bytes(data)
+    faults.dropAfter = 100_000
+
+    model.uploadFile("file.bin")
+
+    assert faults.drops == 0
+    assert (remoteDirectory / "file.bin").read_bytes() == data
+
+
+def testReconnectToWorkingDirectory(
+    model: FTPConnectionModel, faults: FaultProfile, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    A dropped session reconnects to its working directory.
+    """
+
+    (remoteDirectory / "directory").mkdir()
+    (remoteDirectory / "directory" / "file.txt").write_bytes(b"content")
+    model.changeDirectory("directory")
+    socket = model.ftp.sock
+
+    # the server drops the connection instead of replying to the next command
+    faults.disconnectAfter = faults.commands + 1
+    facts = model.fileFacts("file.txt")
+
+    assert facts["size"] == "7"
+    assert model.ftp.sock is not socket
+    assert model.workingDirectory == "/directory"
+
+
+def testPipelinedCommandsCostOneRoundTrip(
+    model: FTPConnectionModel, faults: FaultProfile, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    Pipelined commands wait a single round trip.
+    """
+
+    faults.rtt = 0.05
+
+    start = time.perf_counter()
+    replies = model.pipeline([f"MKD directory{index}" for index in range(20)])
+    elapsed = time.perf_counter() - start
+
+    assert all(isinstance(reply, str) for reply in replies)
+    assert len(list(remoteDirectory.iterdir())) == 20
+    assert elapsed < 5 * faults.rtt
+
+
+def testPipelinedRefusalsKeepRepliesInOrder(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    Refused commands of a window get their error, the other replies stay matched.
+    """
+
+    (remoteDirectory / "directory1").mkdir()
+    commands = [f"MKD directory{index}" for index in range(5)]
+
+    replies = model.pipeline(commands, window=2)
+
+    assert [isinstance(reply, FTPError) for reply in replies] == [
+        False,
+        True,
+        False,
+        False,
+        False,
+    ]
+    assert str(model.pipeline(["NOOP"])[0]).startswith("200")
@@ -0,0 +1,242 @@
+"""
+Tests of FTPClientPresenter against the local server, with a view recording what it shows.
+"""
+import os
+import pathlib
+from typing import Any, List, Optional, Sequence, Union
+
+import pytest
+
+from src.cipher.engine import Buffer
+from src.file_handler.container import CONTAINER_EXTENSION, LEGACY_EXTENSION, LEGACY_KEY_EXTENSION
+from src.file_handler.container_stream import ContainerDecryptor
+from src.file_handler.file_cryptographer import FileCryptographer
+from src.file_handler.integrity import SEGMENT_SIZE
+from src.model import FTPConnectionModel, FTPError
+from src.presenter import FTPClientPresenter
+from src.transfer_control import DOWNLOAD, TransferDecision
+
+
+class FakeView:
+    """
+    View of the presenter without window: the inputs are attributes set by the tests, the
+    responses are recorded.
+    """
+
+    # pylint: disable=C0116,W0613,R0902
+
+    def __init__(self) -> None:
+        self.mainInput = ""
+        self.ipAddress = ""
+        self.portNumber = ""
+        self.useTls = False
+        self.username = ""
+        self.password = ""
+        self.rsaKey = ""
+        self.encryptedKeyFilePath = ""
+        self.cipherEngine = "hybrid"
+        self.searchQuery = ""
+        self.responses: List[str] = []
+        self.fileList: List[str] = []
+
+    def buildGUI(self, presenter: Any) -> None:
+        pass
+
+    def updateServerResponse(self, response: str) -> None:
+        self.responses.append(response)
+
+    def updateDirectoryResponse(self, fileList: List[str]) -> None:
+        self.fileList = fileList
+
+    def toggleLoginButton(self, state: str) -> None:
+        pass
+
+    def toggleControlButtons(self, state: str) -> None:
+        pass
+
+    def scrollDownServerResponse(self) -> None:
+        pass
+
+    def mainloop(self) -> None:
+        pass
+
+
+@pytest.fixture(name="view")
+def viewFixture() -> FakeView:
+    """
+    View recording the responses of the presenter.
+    """
+
+    return FakeView()
+
+
+@pytest.fixture(name="presenter")
+def presenterFixture(model: FTPConnectionModel, view: FakeView) -> FTPClientPresenter:
+    """
+    Presenter of the logged in session.
+    """
+
+    return FTPClientPresenter(model, view)
+
+
+def testOnlyExistingObjectsAreDeleted(
+    presenter: FTPClientPresenter,
+    view: FakeView,
+    remoteDirectory: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    A file is deleted with a DELE per object the listings show, none is sent for a missing
+    file, in the working directory or another one.
+    """
+
+    (remoteDirectory / "directory").mkdir()
+    for name in (f"new.txt{CONTAINER_EXTENSION}", f"directory/other.txt{CONTAINER_EXTENSION}"):
+        (remoteDirectory / name).write_bytes(b"container")
+    for extension in (LEGACY_EXTENSION, LEGACY_KEY_EXTENSION):
+        (remoteDirectory / f"old.txt{extension}").write_bytes(b"legacy")
+    presenter._displayDirectory()  # pylint: disable=W0212
+    sent: List[str] = []
+    pipeline = presenter.model.pipeline
+
+    def recordingPipeline(commands: Sequence[str]) -> List[Union[str, FTPError]]:
+        sent.extend(commands)
+        return pipeline(commands)
+
+    monkeypatch.setattr(presenter.model, "pipeline", recordingPipeline)
+    view.mainInput = "new.txt; old.txt; missing.txt; /directory/other.txt"
+    presenter.handleDeleteFile(None)
+
+    assert sent == [
+        f"DELE new.txt{CONTAINER_EXTENSION}",
+        f"DELE old.txt{LEGACY_EXTENSION}",
+        f"DELE old.txt{LEGACY_KEY_EXTENSION}",
+        f"DELE /directory/other.txt{CONTAINER_EXTENSION}",
+    ]
+    assert sorted(path.name for path in remoteDirectory.rglob("*")) == ["directory"]
+    assert "missing.txt: 550 missing.txt: No such file.\n" in view.responses
+    assert "Deleted 3 of 4: " in view.responses
+    assert view.fileList == ["directory"]
+
+
+def _recordTransfers(model: FTPConnectionModel, monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    # data transfers of the session and of the sessions opened for a segmented download
+    sent: List[str] = []
+    ftpClass = type(model.ftp)
+    transfercmd = ftpClass.transfercmd
+
+    def recordingTransfercmd(self: Any, cmd: str, rest: Optional[int] = None) -> Any:
+        sent.append(cmd)
+        return transfercmd(self, cmd, rest)
+
+    monkeypatch.setattr(ftpClass, "transfercmd", recordingTransfercmd)
+    monkeypatch.setattr("src.presenter._openExplorer", lambda filePath: None)
+    return sent
+
+
+def _storeContainer(
+    presenter: FTPClientPresenter,
+    remoteDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+    size: int,
+) -> bytes:
+    plaintext = os.urandom(size)
+    source = remoteDirectory.parent / "file.bin"
+    source.write_bytes(plaintext)
+    FileCryptographer.encryptToContainer(
+        str(source),
+        [publicKey],
+        containerPath=str(remoteDirectory / f"file.bin{CONTAINER_EXTENSION}"),
+    )
+    presenter.keyring.addKey(privateKey)
+    return plaintext
+
+
+def testContainerIsDownloadedInOneTransfer(
+    presenter: FTPClientPresenter,
+    view: FakeView,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    A container is decrypted and verified while it is received, its header is not read first.
+    """
+
+    plaintext = _storeContainer(
+        presenter, remoteDirectory, privateKey, publicKey, 3 * SEGMENT_SIZE + 17
+    )
+    sent = _recordTransfers(presenter.model, monkeypatch)
+    view.mainInput = "file.bin"
+    presenter.handleDownloadFile(None)
+
+    assert sent == [f"RETR file.bin{CONTAINER_EXTENSION}"]
+    assert [path.name for path in localDirectory.iterdir()] == ["file.bin.dec"]
+    assert (localDirectory / "file.bin.dec").read_bytes() == plaintext
+
+
+def testSegmentedContainerDownloadChecksEachRange(
+    presenter: FTPClientPresenter,
+    view: FakeView,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    A container downloaded over parallel sessions has its header read first, to check each
+    range against the hash tree.
+    """
+
+    plaintext = _storeContainer(
+        presenter, remoteDirectory, privateKey, publicKey, 3 * SEGMENT_SIZE + 17
+    )
+    presenter.model.controller.decisions[DOWNLOAD] = TransferDecision(
+        64 * 1024, 256 * 1024, 3, "test"
+    )
+    sent = _recordTransfers(presenter.model, monkeypatch)
+    view.mainInput = "file.bin"
+    presenter.handleDownloadFile(None)
+
+    assert sent == [f"RETR file.bin{CONTAINER_EXTENSION}"] * 4
+    assert [path.name for path in localDirectory.iterdir()] == ["file.bin.dec"]
+    assert (localDirectory / "file.bin.dec").read_bytes() == plaintext
+
+
+def testCorruptedContainerStopsTheDownload(
+    presenter: FTPClientPresenter,
+    view: FakeView,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    The download of a container stops at its first corrupted segment, nothing is left.
+    """
+
+    _storeContainer(presenter, remoteDirectory, privateKey, publicKey, 6 * SEGMENT_SIZE)
+    containerPath = remoteDirectory / f"file.bin{CONTAINER_EXTENSION}"
+    data = bytearray(containerPath.read_bytes())
+    data[-5 * SEGMENT_SIZE] ^= 1
+    containerPath.write_bytes(data)
+    received: List[int] = []
+    update = ContainerDecryptor.update
+
+    def countingUpdate(self: ContainerDecryptor, block: Buffer) -> bytes:
+        received.append(len(block))
+        return update(self, block)
+
+    monkeypatch.setattr(ContainerDecryptor, "update", countingUpdate)
+    _recordTransfers(presenter.model, monkeypatch)
+    view.mainInput = "file.bin"
+    presenter.handleDownloadFile(None)
+
+    assert "Segment 1 is corrupted" in view.responses
+    assert sum(received) < len(data) - 3 * SEGMENT_SIZE
+    assert not list(localDirectory.iterdir())
@@ -0,0 +1,20 @@
+"""
+Tests of the operation profiler.
+"""
+import pathlib
+
+from src.profiling import OperationProfiler
+
+
+def testReportsOfTheSameSecondAreKept(tmp_path: pathlib.Path) -> None:  # pylint: disable=C0103
+    """
+    Operations profiled in a row get a report each.
+    """
+
+    profiler = OperationProfiler(str(tmp_path))
+
+    results = [profiler.profile("operation", sum, [index, 1]) for index in range(5)]
+
+    assert [result for result, _ in results] == [1, 2, 3, 4, 5]
+    assert len(list(tmp_path.glob("*-operation.txt"))) == 5
+    assert len(list(tmp_path.glob("*-operation.prof"))) == 5
@@ -0,0 +1,162 @@
+"""
+Tests of KeyRotation against the local server.
+"""
+import os
+import pathlib
+from typing import BinaryIO, List, Optional
+
+import pytest
+
+from Cryptodome.PublicKey import RSA
+
+from src.file_handler.container import CONTAINER_EXTENSION, SPARE_SLOTS, readHeader
+from src.file_handler.file_cryptographer import FileCryptographer
+from src.file_handler.keyring import Keyring
+from src.model import FTPConnectionModel
+from src.remote_container import KeyRotation, defaultJournalPath
+
+
+def _makeContainer(remoteDirectory: pathlib.Path, publicKey: bytes) -> pathlib.Path:
+    source = remoteDirectory.parent / "file.bin"
+    source.write_bytes(os.urandom(200_000))
+    containerPath = remoteDirectory / f"file.bin{CONTAINER_EXTENSION}"
+    FileCryptographer.encryptToContainer(str(source), [publicKey], containerPath=str(containerPath))
+    return containerPath
+
+
+def _headerLength(containerPath: pathlib.Path) -> int:
+    with open(containerPath, "rb") as file:
+        readHeader(file)
+        return file.tell()
+
+
+def _newKeys(count: int) -> List[bytes]:
+    return [RSA.generate(2048).export_key() for _ in range(count)]
+
+
+def testEnvelopesAreRewrittenInPlace(  # pylint: disable=R0914
+    model: FTPConnectionModel,
+    remoteDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+) -> None:
+    """
+    Rotating to a new key patches the envelope slots, the ciphertext is not transferred.
+    """
+
+    containerPath = _makeContainer(remoteDirectory, publicKey)
+    before = containerPath.read_bytes()
+    inode = containerPath.stat().st_ino
+    keyring = Keyring()
+    retired = [keyring.addKey(privateKey)]
+    newPrivateKey = _newKeys(1)[0]
+    newPublicKeys = [RSA.import_key(newPrivateKey).publickey().export_key()]
+
+    rotation = KeyRotation(model.openSession, keyring, newPublicKeys, retiredKeyIds=retired)
+    progress = rotation.run("/")
+
+    assert (progress.rekeyed, progress.failed) == (1, 0)
+    after = containerPath.read_bytes()
+    assert containerPath.stat().st_ino == inode
+    assert len(after) == len(before)
+    headerLength = _headerLength(containerPath)
+    assert after[headerLength:] == before[headerLength:]
+    assert not list(remoteDirectory.glob("*.rekey"))
+    decrypted = FileCryptographer.decryptContainer(str(containerPath), newPrivateKey)
+    assert (
+        pathlib.Path(decrypted).read_bytes() == (remoteDirectory.parent / "file.bin").read_bytes()
+    )
+
+
+def testFullContainerIsRewritten(
+    model: FTPConnectionModel,
+    remoteDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+) -> None:
+    """
+    A container without enough free slots is streamed through behind a new header with spare
+    slots, the next rotation patches it in place.
+    """
+
+    containerPath = _makeContainer(remoteDirectory, publicKey)
+    keyring = Keyring()
+    keyring.addKey(privateKey)
+    newPrivateKeys = _newKeys(SPARE_SLOTS + 1)
+    newPublicKeys = [
+        RSA.import_key(newPrivateKey).publickey().export_key() for newPrivateKey in newPrivateKeys
+    ]
+
+    KeyRotation(model.openSession, keyring, newPublicKeys).run("/")
+
+    inode = containerPath.stat().st_ino
+    with open(containerPath, "rb") as file:
+        header = readHeader(file)
+    assert len(header.envelopes) == SPARE_SLOTS + 2
+    assert header.slotCount == len(header.envelopes) + SPARE_SLOTS
+    for newPrivateKey in newPrivateKeys:
+        FileCryptographer.decryptContainer(str(containerPath), newPrivateKey)
+
+    keyring.addKey(newPrivateKeys[0])
+    retired = keyring.addKey(privateKey)
+    KeyRotation(model.openSession, keyring, newPublicKeys, retiredKeyIds=[retired]).run("/")
+
+    assert containerPath.stat().st_ino == inode
+    with open(containerPath, "rb") as file:
+        assert len(readHeader(file).envelopes) == SPARE_SLOTS + 1
+
+
+def testTruncatingServerFallsBackToRewrite(  # pylint: disable=R0914
+    model: FTPConnectionModel,
+    remoteDirectory: pathlib.Path,
+    privateKey: bytes,
+    publicKey: bytes,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    A server which truncates a file stored at an offset is detected on the first container,
+    which is left intact and rewritten whole.
+    """
+
+    store = FTPConnectionModel.store
+    offsets: List[int] = []
+
+    def truncatingStore(
+        self: FTPConnectionModel, fileName: str, file: BinaryIO, offset: Optional[int] = None
+    ) -> str:
+        if offset is not None:
+            offsets.append(offset)
+            os.truncate(remoteDirectory / fileName.lstrip("/"), offset)
+        return store(self, fileName, file, offset)
+
+    monkeypatch.setattr(FTPConnectionModel, "store", truncatingStore)
+    containerPath = _makeContainer(remoteDirectory, publicKey)
+    size = containerPath.stat().st_size
+    keyring = Keyring()
+    keyring.addKey(privateKey)
+    newPrivateKey = _newKeys(1)[0]
+
+    progress = KeyRotation(
+        model.openSession, keyring, [RSA.import_key(newPrivateKey).publickey().export_key()]
+    ).run("/")
+
+    assert (progress.rekeyed, progress.failed) == (1, 0)
+    # the probe, then the last byte stored back, no envelope slot
+    assert offsets == [size - 2, size - 1]
+    plaintext = (remoteDirectory.parent / "file.bin").read_bytes()
+    for key in (privateKey, newPrivateKey):
+        decrypted = FileCryptographer.decryptContainer(str(containerPath), key)
+        assert pathlib.Path(decrypted).read_bytes() == plaintext
+
+
+def testJournalDependsOnRetiredKeys() -> None:
+    """
+    Rotations to the same keys retiring other keys do not share their journal.
+    """
+
+    newKeyIds = [b"\1" * 16]
+    journal = defaultJournalPath("user@host:21", "/", newKeyIds, [b"\2" * 16])
+
+    assert journal == defaultJournalPath("user@host:21", "/", newKeyIds, [b"\2" * 16])
+    assert journal != defaultJournalPath("user@host:21", "/", newKeyIds, [b"\3" * 16])
+    assert journal != defaultJournalPath("user@host:21", "/", newKeyIds)
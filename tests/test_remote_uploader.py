@@ -0,0 +1,73 @@
+"""
+Tests of TreeUploader against the local server.
+"""
+import os
+import pathlib
+
+import pytest
+
+from src.file_handler.container import CONTAINER_EXTENSION
+from src.file_handler.file_cryptographer import FileCryptographer
+from src.model import FTPConnectionModel
+from src.remote_uploader import TreeUploader
+
+from .dev_server import FaultProfile
+
+
+def _makeTree(localDirectory: pathlib.Path) -> None:
+    (localDirectory / "tree" / "directory").mkdir(parents=True)
+    for index in range(6):
+        (localDirectory / "tree" / f"file{index}.bin").write_bytes(os.urandom(1000 * index))
+    (localDirectory / "tree" / "directory" / "file.txt").write_bytes(b"content")
+
+
+@pytest.mark.parametrize("maxSessions", [0, 1, 2])
+def testUploadTree(  # pylint: disable=R0913
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    publicKey: bytes,
+    privateKey: bytes,
+    maxSessions: int,
+) -> None:
+    """
+    Every file is uploaded, over fewer sessions when the server refuses more.
+    """
+
+    _makeTree(localDirectory)
+    faults.maxSessions = maxSessions
+
+    created, results = TreeUploader(model, [publicKey], sessions=4).upload("tree", "/")
+
+    assert sorted(created) == ["/tree", "/tree/directory"]
+    assert len(results) == 7
+    assert all(result.error is None for result in results)
+    for result in results:
+        remotePath = remoteDirectory / result.remotePath.lstrip("/")
+        decrypted = FileCryptographer.decryptContainer(str(remotePath), privateKey)
+        with open(decrypted, "rb") as file:
+            assert file.read() == pathlib.Path(result.localPath).read_bytes()
+    # the session of the model is still usable
+    assert model.fileFacts(f"/tree/directory/file.txt{CONTAINER_EXTENSION}")["type"] == "file"
+
+
+def testEveryFileHasAResult(
+    model: FTPConnectionModel,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    publicKey: bytes,
+) -> None:
+    """
+    Files which fail are reported with their error, not dropped.
+    """
+
+    _makeTree(localDirectory)
+    # a directory is in the way of the container of a file
+    (remoteDirectory / "tree" / f"file3.bin{CONTAINER_EXTENSION}").mkdir(parents=True)
+
+    _, results = TreeUploader(model, [publicKey], sessions=3).upload("tree", "/")
+
+    assert len(results) == 7
+    failed = [result for result in results if result.error is not None]
+    assert [pathlib.Path(result.localPath).name for result in failed] == ["file3.bin"]
@@ -0,0 +1,56 @@
+"""
+Tests of RemoteTreeWalker against the local server.
+"""
+import pathlib
+
+import pytest
+
+from src.model import FTPConnectionModel, UnableToConnect
+from src.remote_walker import RemoteTreeWalker
+
+from .dev_server import FaultProfile
+
+
+def _makeTree(remoteDirectory: pathlib.Path) -> None:
+    for directory in ["a", "a/b", "a/b/c", "d"]:
+        (remoteDirectory / "tree" / directory).mkdir(parents=True)
+        (remoteDirectory / "tree" / directory / "file.txt").write_bytes(b"content")
+
+
+@pytest.mark.parametrize("maxSessions", [0, 2])
+def testWalkTree(
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    maxSessions: int,
+) -> None:
+    """
+    The whole tree is walked, by the sessions the server accepts.
+    """
+
+    _makeTree(remoteDirectory)
+    faults.maxSessions = maxSessions
+
+    entries = list(RemoteTreeWalker.forModel(model, sessions=4).walk("/tree"))
+
+    paths = sorted(entry.path for entry in entries)
+    assert paths == sorted(
+        [f"/tree/{directory}" for directory in ["a", "a/b", "a/b/c", "d"]]
+        + [f"/tree/{directory}/file.txt" for directory in ["a", "a/b", "a/b/c", "d"]]
+    )
+    assert sum(entry.isDirectory for entry in entries) == 4
+
+
+def testWalkWithoutSession(
+    model: FTPConnectionModel, faults: FaultProfile, remoteDirectory: pathlib.Path
+) -> None:
+    """
+    The walk fails when no session opens.
+    """
+
+    _makeTree(remoteDirectory)
+    # the session of the model is the only one
+    faults.maxSessions = 1
+
+    with pytest.raises(UnableToConnect):
+        list(RemoteTreeWalker.forModel(model, sessions=3).walk("/tree"))
@@ -0,0 +1,92 @@
+"""
+Tests of StripedStorage against the local server, the servers are directories of it.
+"""
+import os
+import pathlib
+import time
+from typing import List
+
+from src.striped_storage import StripedStorage, StripeServer
+
+from .conftest import PASSWORD, USERNAME
+from .dev_server import DevFTPServer, FaultProfile
+
+
+def _servers(ftpServer: DevFTPServer, remoteDirectory: pathlib.Path) -> List[StripeServer]:
+    servers = []
+    for directory in ["a", "b", "c"]:
+        (remoteDirectory / directory).mkdir()
+        servers.append(
+            StripeServer("127.0.0.1", ftpServer.port, USERNAME, PASSWORD, directory=directory)
+        )
+    return servers
+
+
+def testStripedUploadAndDownload(
+    ftpServer: DevFTPServer, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    Directories of one server hold their own objects.
+    """
+
+    data = os.urandom(300_000 + 17)
+    (localDirectory / "file.sfs").write_bytes(data)
+    storage = StripedStorage(_servers(ftpServer, remoteDirectory), stripeSize=64 * 1024)
+
+    manifest = storage.upload("file.sfs", "file.sfs")
+    assert len(set(manifest.servers)) == 3
+    for index, directory in enumerate(["a", "b", "c"]):
+        assert (remoteDirectory / directory / f"file.sfs.stripe{index}").exists()
+
+    _, rebuilt = storage.download("file.sfs", "downloaded.sfs")
+    assert rebuilt == []
+    assert (localDirectory / "downloaded.sfs").read_bytes() == data
+
+
+def testCorruptedObjectIsRebuilt(
+    ftpServer: DevFTPServer, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    An object whose digest does not match is rebuilt from the parity.
+    """
+
+    data = os.urandom(200_000)
+    (localDirectory / "file.sfs").write_bytes(data)
+    servers = _servers(ftpServer, remoteDirectory)
+    storage = StripedStorage(servers, stripeSize=64 * 1024)
+    storage.upload("file.sfs", "file.sfs")
+
+    with open(remoteDirectory / "a" / "file.sfs.stripe0", "r+b") as stripes:
+        stripes.write(b"corrupted")
+    _, rebuilt = storage.download("file.sfs", "downloaded.sfs")
+
+    assert rebuilt == [servers[0].location]
+    assert (localDirectory / "downloaded.sfs").read_bytes() == data
+
+
+def testRefusedLoginIsClosed(
+    ftpServer: DevFTPServer,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+) -> None:
+    """
+    A server refusing the login is rebuilt from the parity, its session is closed.
+    """
+
+    data = os.urandom(200_000)
+    (localDirectory / "file.sfs").write_bytes(data)
+    servers = _servers(ftpServer, remoteDirectory)
+    StripedStorage(servers, stripeSize=64 * 1024).upload("file.sfs", "file.sfs")
+    servers[1] = servers[1]._replace(password="wrong")
+
+    _, rebuilt = StripedStorage(servers, stripeSize=64 * 1024).download(
+        "file.sfs", "downloaded.sfs"
+    )
+
+    assert rebuilt == [servers[1].location]
+    assert (localDirectory / "downloaded.sfs").read_bytes() == data
+    deadline = time.monotonic() + 5
+    while faults.sessions and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert faults.sessions == 0
@@ -0,0 +1,55 @@
+"""
+Tests of the adaptive transfer controller.
+"""
+from src.transfer_control import DOWNLOAD, MIB, UPLOAD, AdaptiveTransferController
+
+
+def testDirectionsAreAdaptedApart() -> None:
+    """
+    A fast upload is not the reference of the next download.
+    """
+
+    controller = AdaptiveTransferController()
+    controller.record(10 * MIB, 1.0, direction=DOWNLOAD)
+    connections = controller.decision(DOWNLOAD).connections
+
+    controller.record(100 * MIB, 1.0, direction=UPLOAD)
+    decision = controller.record(10 * MIB, 1.0, direction=DOWNLOAD)
+
+    assert decision.connections == connections
+    assert decision.reason == "goodput stable, kept"
+    assert controller.lastThroughputs == {DOWNLOAD: 10 * MIB, UPLOAD: 100 * MIB}
+
+
+def testUploadsKeepOneConnection() -> None:
+    """
+    Uploads grow their block size, not their connections.
+    """
+
+    controller = AdaptiveTransferController()
+    initial = controller.decision(UPLOAD)
+
+    for seconds in [4.0, 2.0, 1.0]:
+        decision = controller.record(10 * MIB, seconds, direction=UPLOAD)
+
+    assert decision.connections == 1
+    assert decision.blockSize == 8 * initial.blockSize
+    assert controller.decision(DOWNLOAD) == initial
+
+
+def testFailureHalvesItsDirection() -> None:
+    """
+    A failed download relieves the server of its connections, uploads are not changed.
+    """
+
+    controller = AdaptiveTransferController()
+    for seconds in [4.0, 2.0, 1.0]:
+        controller.record(10 * MIB, seconds, direction=DOWNLOAD)
+    upload = controller.record(10 * MIB, 1.0, direction=UPLOAD)
+
+    decision = controller.record(0, 1.0, 4, failed=True, direction=DOWNLOAD)
+
+    assert decision.connections == 2
+    assert controller.lastThroughputs[DOWNLOAD] is None
+    assert controller.decision(UPLOAD) == upload
+    assert controller.snapshot()["measurements"][-1]["direction"] == DOWNLOAD
@@ -0,0 +1,141 @@
+"""
+Tests of TransferScheduler against the local server.
+"""
+import os
+import pathlib
+import time
+from typing import Any, Callable, List, Tuple
+
+import pytest
+
+from src.model import FTPConnectionModel
+from src.transfer_control import DOWNLOAD, UPLOAD
+from src.transfer_scheduler import BULK, INTERACTIVE, NORMAL, TransferScheduler
+
+from .dev_server import FaultProfile
+
+
+def _recorder(finished: List[str], name: str) -> Callable[[Any], None]:
+    def record(_: Any) -> None:
+        finished.append(name)
+
+    return record
+
+
+def testGlobalAndJobRates(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    Transfers are held to the global rate and to their own, whichever is lower.
+    """
+
+    data = os.urandom(150_000)
+    (remoteDirectory / "file.bin").write_bytes(data)
+    (localDirectory / "upload.bin").write_bytes(data)
+    scheduler = TransferScheduler(model.openSession, workers=1, rate=100_000)
+
+    try:
+        start = time.perf_counter()
+        scheduler.submit(DOWNLOAD, "file.bin").future.result(timeout=30)
+        downloadSeconds = time.perf_counter() - start
+
+        scheduler.setRate(0)
+        start = time.perf_counter()
+        scheduler.submit(UPLOAD, "upload.bin", rate=100_000).future.result(timeout=30)
+        uploadSeconds = time.perf_counter() - start
+    finally:
+        scheduler.shutdown()
+
+    # the buckets start empty, 150 kB at 100 kB/s take 1.5 s
+    assert downloadSeconds > 1.2
+    assert uploadSeconds > 1.2
+    assert (localDirectory / "file.bin").read_bytes() == data
+    assert (remoteDirectory / "upload.bin").read_bytes() == data
+
+
+def testJobsRunByPriorityThenSize(
+    model: FTPConnectionModel, remoteDirectory: pathlib.Path, localDirectory: pathlib.Path
+) -> None:
+    """
+    Jobs queued behind a running one start by priority, then shortest first.
+    """
+
+    for name, size in (("running", 200_000), ("large", 20_000), ("small", 10_000), ("bulk", 1)):
+        (remoteDirectory / f"{name}.bin").write_bytes(os.urandom(size))
+    scheduler = TransferScheduler(model.openSession, workers=1)
+    finished: List[str] = []
+
+    try:
+        running = scheduler.submit(DOWNLOAD, "running.bin", rate=200_000)
+        time.sleep(0.2)
+        jobs = [
+            scheduler.submit(DOWNLOAD, "bulk.bin", priority=BULK, size=1),
+            scheduler.submit(DOWNLOAD, "large.bin", priority=NORMAL, size=20_000),
+            scheduler.submit(DOWNLOAD, "small.bin", priority=NORMAL, size=10_000),
+        ]
+        for job in [running, *jobs]:
+            job.future.add_done_callback(_recorder(finished, job.fileName))
+        for job in [running, *jobs]:
+            job.future.result(timeout=30)
+    finally:
+        scheduler.shutdown()
+
+    assert finished == ["running.bin", "small.bin", "large.bin", "bulk.bin"]
+    assert all((localDirectory / name).exists() for name in finished)
+
+
+def testPausedJobHoldsNoDataConnection(  # pylint: disable=R0914
+    model: FTPConnectionModel,
+    faults: FaultProfile,
+    remoteDirectory: pathlib.Path,
+    localDirectory: pathlib.Path,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """
+    An interactive job overtakes a bulk one on a server allowing one session per job: the
+    bulk job pauses between two pieces, without a data connection.
+    """
+
+    bulkData, interactiveData = os.urandom(400_000), os.urandom(100_000)
+    (remoteDirectory / "bulk.bin").write_bytes(bulkData)
+    (remoteDirectory / "interactive.bin").write_bytes(interactiveData)
+    # the session of the model, a worker and the extra session of the interactive job
+    faults.maxSessions = 3
+    pieces: List[Tuple[float, float]] = []
+    interactive: List[float] = []
+    downloadRange = FTPConnectionModel.downloadRange
+    downloadFile = FTPConnectionModel.downloadFile
+
+    def recordedRange(self: FTPConnectionModel, *args: Any, **kwargs: Any) -> int:
+        start = time.perf_counter()
+        count = downloadRange(self, *args, **kwargs)
+        pieces.append((start, time.perf_counter()))
+        return count
+
+    def recordedFile(self: FTPConnectionModel, *args: Any, **kwargs: Any) -> str:
+        interactive.append(time.perf_counter())
+        response = downloadFile(self, *args, **kwargs)
+        interactive.append(time.perf_counter())
+        return response
+
+    monkeypatch.setattr(FTPConnectionModel, "downloadRange", recordedRange)
+    monkeypatch.setattr(FTPConnectionModel, "downloadFile", recordedFile)
+    scheduler = TransferScheduler(model.openSession, workers=1, pieceSize=50_000)
+
+    try:
+        bulk = scheduler.submit(DOWNLOAD, "bulk.bin", priority=BULK, rate=200_000)
+        time.sleep(0.5)
+        urgent = scheduler.submit(DOWNLOAD, "interactive.bin", priority=INTERACTIVE, rate=200_000)
+        urgent.future.result(timeout=30)
+        assert not bulk.future.done()
+        bulk.future.result(timeout=30)
+    finally:
+        scheduler.shutdown()
+
+    assert len(pieces) == 8
+    interactiveStart, interactiveEnd = interactive[0], interactive[-1]
+    # the piece running when the interactive job was submitted ends, no other one starts
+    assert not any(interactiveStart < start < interactiveEnd for start, _ in pieces)
+    assert sum(interactiveStart < end < interactiveEnd for _, end in pieces) <= 1
+    assert (localDirectory / "bulk.bin").read_bytes() == bulkData
+    assert (localDirectory / "interactive.bin").read_bytes() == interactiveData